@@ -166,3 +166,87 @@ class PqlAggregationErrorsTest(PqlAggregationTest):
     def test_invalid_comparators(self):
         with self.assertRaises(pql.ParseError):
             self.compare('1 < a < 3', None)
+
+class PqlAggregationOptimizeTest(PqlAggregationTest):
+
+    def compare(self, expression, expected):
+        self.assertEqual(pql.AggregationParser(optimize=True).parse(expression), expected)
+
+    def test_flatten(self):
+        self.compare('a + b + c + d', {'$add': ['$a', '$b', '$c', '$d']})
+        self.compare('a * (b * c)', {'$multiply': ['$a', '$b', '$c']})
+        self.compare('a and b and (c and d)', {'$and': ['$a', '$b', '$c', '$d']})
+        self.compare('a - b - c', {'$subtract': [{'$subtract': ['$a', '$b']}, '$c']})
+
+    def test_fold(self):
+        self.compare('price * 3.7 * 2', {'$multiply': ['$price', 7.4]})
+        self.compare('1 + a + 2', {'$add': [3, '$a']})
+        self.compare('3 * 4 - 2', {'$literal': 10})
+        self.compare('a / (6 / 3)', {'$divide': ['$a', 2.0]})
+        self.compare('(0 - 7) % 3', {'$literal': -1})
+        self.compare('a / 0', {'$divide': ['$a', 0]})
+        self.compare('1 + 2 > 2', {'$literal': True})
+        self.compare('concat("a", "b", c, "d", "e")', {'$concat': ['ab', '$c', 'de']})
+        self.compare('ifnull(None, a)', '$a')
+
+    def test_logic(self):
+        self.compare('a and 1 > 2', {'$literal': False})
+        self.compare('a and True', {'$and': ['$a']})
+        self.compare('a or 0 or 3', {'$literal': True})
+        self.compare('not 0', {'$literal': True})
+        self.compare('1', 1) # not folded
+        self.assertEqual(pql.AggregationParser().optimize({'$add': [1, 2]}), 3)
+
+    def test_cond(self):
+        self.compare('a if 1 < 2 else b', '$a')
+        self.compare('a if None else b + 1 + 1', {'$add': ['$b', 2]})
+        self.compare('a if b else c', {'$cond': ['$b', '$a', '$c']})
+
+    def test_sanity(self):
+        self.compare('a + b / c - 3 * 4 == 1',
+                     {'$eq': [{'$subtract': [{'$add': ['$a', {'$divide': ['$b', '$c']}]}, 12]}, 1]})
+
+    def test_group(self):
+        self.assertEqual(pql.AggregationGroupParser(optimize=True).parse('sum(a * 2 * 3)'),
+                         {'$sum': {'$multiply': ['$a', 6]}})
+
+class PqlPipelineOptimizeTest(TestCase):
+
+    def test_merge_matches(self):
+        self.assertEqual((pql.match('a > 1') | pql.match('a < 5')).optimize(),
+                         [{'$match': {'a': {'$gt': 1, '$lt': 5}}}])
+
+    def test_push_match_before_project(self):
+        pipeline = pql.project(model='model', price='price * 3.7 * 2') | pql.match('model == "kia"')
+        self.assertEqual(pipeline.optimize(),
+                         [{'$match': {'model': 'kia'}},
+                          {'$project': {'model': '$model', 'price': {'$multiply': ['$price', 7.4]}}}])
+
+    def test_constant_projections(self):
+        pipeline = pql.project(total='1 + 2', flag='1 < 2', c='true if 1 else a', model=1)
+        self.assertEqual(pipeline.optimize(),
+                         [{'$project': {'total': {'$literal': 3}, 'flag': {'$literal': True},
+                                        'c': {'$literal': True}, 'model': 1}}])
+
+    def test_keep_match_after_rewriting_project(self):
+        pipeline = pql.project(made_on='year(made_on)') | pql.match('made_on > 1975')
+        self.assertEqual(pipeline.optimize(), pipeline)
+
+    def test_push_match_before_unwind(self):
+        self.assertEqual((pql.unwind('tags') | pql.match('a == 1')).optimize(),
+                         [{'$match': {'a': 1}}, {'$unwind': '$tags'}])
+        pipeline = pql.unwind('tags') | pql.match('tags.name == 1')
+        self.assertEqual(pipeline.optimize(), pipeline)
+
+    def test_skip_and_limit(self):
+        self.assertEqual((pql.skip(2) | pql.skip(3) | pql.limit(10) | pql.limit(5)).optimize(),
+                         [{'$skip': 5}, {'$limit': 5}])
+
+    def test_limit_next_to_sort(self):
+        pipeline = pql.sort('-price') | pql.project(price='price') | pql.limit(3)
+        self.assertEqual(pipeline.optimize(),
+                         [pipeline[0], {'$limit': 3}, {'$project': {'price': '$price'}}])
+
+    def test_group_is_a_barrier(self):
+        pipeline = pql.group(_id='model', total='sum(price)') | pql.match('total > 1') | pql.limit(1)
+        self.assertEqual(pipeline.optimize(), pipeline)
@@ -0,0 +1,59 @@
+from datetime import datetime
+import json
+import os
+import pickle
+import subprocess
+import sys
+from unittest import TestCase
+import pql
+
+SCHEMA = {'a': pql.IntField(), 'b': pql.DateTimeField(), 'c': pql.ListField(pql.StringField())}
+
+class PqlFindManyTestCase(TestCase):
+
+    def test_in_order(self):
+        expressions = ['a == {0}'.format(i) for i in range(1000)]
+        for workers in (1, 2):
+            translations = pql.find_many(expressions, workers=workers, chunksize=7)
+            self.assertEqual([t.query for t in translations], [{'a': i} for i in range(1000)])
+            self.assertEqual([t.expression for t in translations], expressions)
+
+    def test_errors(self):
+        for workers in (1, 2):
+            translations = pql.find_many(['a > 1', 'a == "x"', 'a ==', 'd == 1', 'b < date("2020-1-1")'],
+                                         schema=SCHEMA, workers=workers)
+            self.assertEqual([t.query for t in translations],
+                             [{'a': {'$gt': 1}}, None, None, None, {'b': {'$lt': datetime(2020, 1, 1)}}])
+            self.assertIsInstance(translations[1].error, pql.ParseError)
+            self.assertIsInstance(translations[2].error, SyntaxError)
+            self.assertEqual(translations[3].error.message, 'Field not found: d.')
+            self.assertEqual(sorted(translations[3].error.options), sorted(SCHEMA))
+
+    def test_generator_input(self):
+        translations = pql.find_many(('c == ["{0}"]'.format(i) for i in range(100)), schema=SCHEMA, workers=2, chunksize=3)
+        self.assertEqual(translations[42].query, {'c': ['42']})
+
+    def test_pickle_parse_error(self):
+        error = pickle.loads(pickle.dumps(pql.ParseError('Field not found: d.', 3, options=['a', 'b'])))
+        self.assertEqual((error.message, error.col_offset, error.options), ('Field not found: d.', 3, ['a', 'b']))
+
+class PqlCommandLineTestCase(TestCase):
+
+    def run_pql(self, input, *args):
+        process = subprocess.run([sys.executable, '-m', 'pql'] + list(args), input=input.encode(),
+                                 stdout=subprocess.PIPE, cwd=os.path.dirname(os.path.abspath(__file__)))
+        return process.returncode, [json.loads(line) for line in process.stdout.decode().splitlines()]
+
+    def test_extended_json(self):
+        status, records = self.run_pql('a > 1\nb == date("2020-1-1")\n_id == id("5f0000000000000000000000")\n',
+                                       '--workers', '2')
+        self.assertEqual(status, 0)
+        self.assertEqual([r['query'] for r in records],
+                         [{'a': {'$gt': 1}}, {'b': {'$date': '2020-01-01T00:00:00Z'}}, {'_id': {'$oid': '5f0000000000000000000000'}}])
+
+    def test_errors(self):
+        status, records = self.run_pql('a > 1\nd == "x"\n', '--schema', 'batch_tests:SCHEMA', '--format', 'json')
+        self.assertEqual(status, 1)
+        self.assertEqual(records[0], {'expression': 'a > 1', 'query': {'a': {'$gt': 1}}})
+        self.assertEqual(records[1]['expression'], 'd == "x"')
+        self.assertIn('Field not found: d.', records[1]['error'])
@@ -0,0 +1,41 @@
+"""
+Measures the memory allocated while translating a wide query, compared with
+the size of the translated query itself.
+
+    python benchmarks/allocations.py
+"""
+import ast
+import copy
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pql.matching import SchemaFreeParser
+
+def wide_expression(clauses):
+    templates = ['a{0} == {0}', 'b{0} > {0}', 'c{0} in [1, 2, 3]',
+                 'd{0} == regex("x{0}")', 'e{0} == near(Point(1, 2), 10)']
+    return ' or '.join(templates[i % len(templates)].format(i) for i in range(clauses))
+
+def traced(function):
+    tracemalloc.start()
+    try:
+        result = function()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current, peak
+
+def main(clauses=1000):
+    parser = SchemaFreeParser()
+    tree = ast.parse(wide_expression(clauses), mode='eval').body
+    parser.handle(tree) # warm up lazily created operators
+    result, retained, peak = traced(lambda: parser.handle(tree))
+    _, output, _ = traced(lambda: copy.deepcopy(result))
+    print('{0} clauses: output {1} bytes, retained {2} bytes, peak {3} bytes ({4:.2f}x output)'.format(
+        clauses, output, retained, peak, float(peak) / output))
+
+if __name__ == '__main__':
+    main()
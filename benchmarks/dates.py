@@ -0,0 +1,30 @@
+"""
+Compares parsing date literals with dateutil, the regex fast path and the memo.
+
+    python benchmarks/dates.py
+"""
+import os
+import sys
+import timeit
+import dateutil.parser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pql.matching import parse_date_string
+
+STRINGS = ['2012-3-4', '2012-03-04 12:34:56', '2012-03-04T12:34:56.123', '2019-12-31T23:59']
+
+def measure(function, number):
+    return min(timeit.repeat(lambda: [function(string) for string in STRINGS],
+                             number=number, repeat=5)) / number / len(STRINGS)
+
+def main(number=2000):
+    results = [('dateutil', measure(dateutil.parser.parse, number)),
+               ('fast path', measure(parse_date_string.__wrapped__, number)),
+               ('memoized', measure(parse_date_string, number))]
+    baseline = results[0][1]
+    for name, seconds in results:
+        print('{0:10} {1:.2f}us ({2:.1f}x)'.format(name, seconds * 1e6, baseline / seconds))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Compares the class-level dispatch tables with the old per-node getattr dispatch
+on deep expressions.
+
+    python benchmarks/dispatch.py
+"""
+import ast
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pql.matching import AstHandler, Func, ParseError, SchemaFreeParser
+
+def legacy_resolve(self, thing):
+    try:
+        return getattr(self, 'handle_' + thing.__class__.__name__)
+    except AttributeError:
+        self.unsupported(thing)
+
+def legacy_handle(self, thing):
+    return legacy_resolve(self, thing)(thing)
+
+def legacy_func_handle(self, node):
+    try:
+        handler = getattr(self, 'handle_' + node.func.id)
+    except AttributeError:
+        raise ParseError('Unsupported function ({0}).'.format(node.func.id),
+                         col_offset=node.col_offset,
+                         options=self.get_options())
+    return handler(node)
+
+def deep_expression(depth):
+    clauses = ['a{0} == regex("x") or b{0} in [1, 2, 3]'.format(i) for i in range(depth)]
+    expression = 'c == 1'
+    for index, clause in enumerate(clauses):
+        op = 'and' if index % 2 else 'or'
+        expression = '{0} {1} ({2})'.format(clause, op, expression)
+    return expression
+
+def measure(tree, number):
+    parser = SchemaFreeParser()
+    return min(timeit.repeat(lambda: parser.handle(tree), number=number, repeat=5)) / number
+
+def main(depth=40, number=200):
+    tree = ast.parse(deep_expression(depth), mode='eval').body
+    current = measure(tree, number)
+    patched = {(AstHandler, 'resolve'): legacy_resolve,
+               (AstHandler, 'handle'): legacy_handle,
+               (Func, 'handle'): legacy_func_handle}
+    originals = dict((key, key[0].__dict__[key[1]]) for key in patched)
+    for (cls, name), function in patched.items():
+        setattr(cls, name, function)
+    try:
+        legacy = measure(tree, number)
+    finally:
+        for (cls, name), function in originals.items():
+            setattr(cls, name, function)
+    print('depth {0}: getattr {1:.1f}us, table {2:.1f}us ({3:.2f}x)'.format(
+        depth, legacy * 1e6, current * 1e6, legacy / current))
+
+if __name__ == '__main__':
+    main()
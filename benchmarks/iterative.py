@@ -0,0 +1,48 @@
+"""
+Compares the recursive and the iterative translators on wide and deeply
+nested expressions. The time per term should stay flat for the iterative one,
+which translates the shallow wide expressions recursively.
+
+    python benchmarks/iterative.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pql
+
+def wide_or(terms):
+    return ' or '.join('a{0} == {0}'.format(i) for i in range(terms))
+
+def nested(depth):
+    expression = 'c == 1'
+    for i in range(depth):
+        expression = 'a{0} > {0} {1} ({2})'.format(i, 'and' if i % 2 else 'or', expression)
+    return expression
+
+def measure(expression, iterative):
+    start = time.perf_counter()
+    try:
+        pql.find(expression, iterative=iterative, cache=None)
+    except (RecursionError, MemoryError, SyntaxError) as e:
+        return '{0}: {1}'.format(e.__class__.__name__, e)
+    return time.perf_counter() - start
+
+def main():
+    cases = [('wide or', wide_or, [1000, 10000, 100000]),
+             ('nested', nested, [50, 500, 5000])]
+    for name, generate, sizes in cases:
+        for size in sizes:
+            expression = generate(size)
+            for iterative in (False, True):
+                seconds = measure(expression, iterative)
+                if isinstance(seconds, str):
+                    result = seconds
+                else:
+                    result = '{0:.3f}s ({1:.1f}us per term)'.format(seconds, seconds / size * 1e6)
+                print('{0} {1:>6} {2:9}: {3}'.format(name, size, 'iterative' if iterative else 'recursive', result))
+
+if __name__ == '__main__':
+    main()
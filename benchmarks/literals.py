@@ -0,0 +1,37 @@
+"""
+Compares translating large `in` lists element by element with the bulk literal
+fast path, and with binding the list to a prepared query instead of parsing it.
+
+    python benchmarks/literals.py
+"""
+import ast
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pql
+from pql.matching import ID_FIELD, INT_FIELD
+
+SIZE = 50000
+
+def measure(function, number=5):
+    return min(timeit.repeat(function, number=number, repeat=3)) / number
+
+def main():
+    numbers = list(range(SIZE))
+    ids = ['{0:024x}'.format(i) for i in range(SIZE)]
+    cases = [('numbers', INT_FIELD, numbers, {'a': pql.IntField()}),
+             ('ids', ID_FIELD, ids, {'a': pql.IdField()})]
+    for name, field, values, schema in cases:
+        nodes = ast.parse(repr(values), mode='eval').body.elts
+        per_element = measure(lambda: list(map(field.handle, nodes)))
+        bulk = measure(lambda: field.translate_elements(nodes))
+        query = pql.prepare('a in :values', schema)
+        bound = measure(lambda: query.bind(values=values))
+        print('{0} x {1}: per element {2:.1f}ms, bulk {3:.1f}ms ({4:.1f}x), bound {5:.1f}ms'.format(
+            SIZE, name, per_element * 1e3, bulk * 1e3, per_element / bulk, bound * 1e3))
+
+if __name__ == '__main__':
+    main()
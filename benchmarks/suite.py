@@ -0,0 +1,190 @@
+"""
+Times find() and aggregation translation on the README examples and on
+generated stress cases, and writes the results as JSON so runs of different
+versions can be compared:
+
+    python benchmarks/suite.py --output before.json
+    python benchmarks/suite.py --output after.json --compare before.json
+
+Each case reports the best time per call out of --repeat runs (the number of
+calls per run is calibrated with timeit). Caching is disabled. --compare exits
+with status 1 when a case got slower than --threshold times its baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pql
+
+README = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'README.md')
+
+def readme_examples():
+    '''
+    Returns the (kind, expression) pairs of the README's pql | mongo tables.
+    kind is 'find' before the "Aggregation Queries" title and 'aggregation' after it.
+    The find section's field references aren't queries and are left out.
+    '''
+    kind = 'find'
+    in_table = False
+    examples = []
+    section = previous = None
+    with open(README) as readme:
+        for line in readme:
+            line = line.rstrip('\n')
+            if line.startswith('Aggregation Queries'):
+                kind = 'aggregation'
+            if line and set(line) == set('-'): # a title's underline
+                section = previous
+            previous = line
+            if kind == 'find' and section == 'Referencing Fields':
+                continue
+            if line.startswith('pql | mongo'):
+                in_table = True
+            elif in_table and line.startswith('---'):
+                continue
+            elif in_table and ' | ' in line:
+                examples.append((kind, line.split(' | ')[0]))
+            else:
+                in_table = False
+    return examples
+
+def wide_or(clauses):
+    return ' or '.join('a{0} == {0}'.format(i) for i in range(clauses))
+
+def deep_nesting(depth):
+    expression = 'c == 1'
+    for i in range(depth):
+        expression = 'a{0} > {0} {1} ({2})'.format(i, 'and' if i % 2 else 'or', expression)
+    return expression
+
+def large_in(size):
+    return 'a in [{0}]'.format(', '.join(map(str, range(size))))
+
+def polygon(vertices):
+    ring = ', '.join('[{0}, {1}]'.format(i % 180, i % 90) for i in range(vertices))
+    return 'location == geoWithin(Polygon([[{0}]]))'.format(ring)
+
+def wide_schema(fields):
+    return dict(('f{0}'.format(i), pql.IntField()) for i in range(fields))
+
+def pipeline():
+    # the $match stage of match(), translated without the cache (match() has no cache argument)
+    match = pql.pipe_element([{'$match': pql.find('made_on > date("2000-1-1") and model in ["kia", "fiat"]',
+                                                  cache=None)}])
+    return (match |
+            pql.project(model='model', year='year(made_on)', price='price * 3.7') |
+            pql.unwind('tags') |
+            pql.group(_id=pql.project(model='model', decade='year - (year % 10)'),
+                      count='sum(1)', total='sum(price)', tags='addToSet(tags)') |
+            pql.sort(['-total', '_id.model']) |
+            pql.skip(10) |
+            pql.limit(10))
+
+def cases():
+    '''
+    Returns (name, function) pairs. Names are stable across versions so results can be
+    compared. Inputs are generated once so only translation is timed.
+    '''
+    result = []
+    errors = []
+    aggregation_parser = pql.AggregationParser()
+    for kind, expression in readme_examples():
+        if kind == 'find':
+            function = lambda expression=expression: pql.find(expression, cache=None)
+        else:
+            function = lambda expression=expression: aggregation_parser.parse(expression)
+        try:
+            function()
+        except pql.ParseError as e:
+            errors.append('{0} {1!r}: {2}'.format(kind, expression, e))
+            continue
+        result.append(('readme.{0}: {1}'.format(kind, expression), function))
+    if errors:
+        raise ValueError('README examples that fail to translate:\n' + '\n'.join(errors))
+
+    for clauses in (1000, 10000):
+        result.append(('wide_or.{0}'.format(clauses),
+                       lambda expression=wide_or(clauses): pql.find(expression, cache=None)))
+    for depth in (20, 50):
+        result.append(('deep_nesting.{0}'.format(depth),
+                       lambda expression=deep_nesting(depth): pql.find(expression, cache=None)))
+    result.append(('iterative.wide_or.100000',
+                   lambda expression=wide_or(100000): pql.find(expression, cache=None, iterative=True)))
+    result.append(('iterative.deep_nesting.5000',
+                   lambda expression=deep_nesting(5000): pql.find(expression, cache=None, iterative=True)))
+    result.append(('large_in.100000', lambda expression=large_in(100000): pql.find(expression, cache=None)))
+    result.append(('geo_polygon.10000', lambda expression=polygon(10000): pql.find(expression, cache=None)))
+    schema = wide_schema(5000)
+    result.append(('wide_schema.5000',
+                   lambda: pql.find('f10 == 1 and f2500 > 3 and f4999 in [1, 2]', schema, cache=None)))
+    compiled = pql.Schema(schema)
+    result.append(('compiled_schema.5000',
+                   lambda: pql.find('f10 == 1 and f2500 > 3 and f4999 in [1, 2]', compiled, cache=None)))
+    result.append(('pipeline', pipeline))
+    return result
+
+def measure(function, repeat):
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number, number
+
+def metadata():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(README)).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'commit': commit}
+
+def compare(results, baseline, threshold):
+    '''
+    Prints the ratio of each case to <baseline>; returns the names of the regressions.
+    '''
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        ratio = result['seconds'] / baseline[name]['seconds']
+        flag = ''
+        if ratio > threshold:
+            regressions.append(name)
+            flag = ' REGRESSION'
+        print('{0:60.60} {1:6.2f}x{2}'.format(name, ratio, flag))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='a previous JSON result to compare with')
+    parser.add_argument('--threshold', type=float, default=1.25, help='slowdown ratio considered a regression')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--filter', default='', help='only run cases whose name contains this')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, function in cases():
+        if args.filter not in name:
+            continue
+        seconds, number = measure(function, args.repeat)
+        results[name] = {'seconds': seconds, 'number': number, 'repeat': args.repeat}
+        print('{0:60.60} {1:12.1f}us'.format(name, seconds * 1e6))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'metadata': metadata(), 'results': results}, output, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as baseline:
+            if compare(results, json.load(baseline)['results'], args.threshold):
+                return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
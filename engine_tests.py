@@ -0,0 +1,104 @@
+from datetime import datetime
+from unittest import TestCase
+import pql
+
+CARS = [{'_id': 1, 'made_on': datetime(1971, 4, 7), 'model': 'fiat', 'price': 3, 'tags': ['old']},
+        {'_id': 2, 'made_on': datetime(1980, 10, 19), 'model': 'subaru', 'price': 5, 'tags': []},
+        {'_id': 3, 'made_on': datetime(1983, 2, 27), 'model': 'kia', 'price': 4, 'tags': ['red', 'cheap']},
+        {'_id': 4, 'made_on': datetime(1988, 1, 23), 'model': 'kia', 'price': 7}]
+
+class PqlEngineTestCase(TestCase):
+
+    def run_pipeline(self, pipeline, documents=CARS):
+        return list(pql.aggregate(pipeline, documents))
+
+    def test_readme_example(self):
+        pipeline = (pql.project(model='model', made_on='year(made_on)', price='price * 3.7') |
+                    pql.match('made_on > 1975 and made_on < 1990') |
+                    pql.group(_id=pql.project(model='model', decade='made_on - (made_on % 10)'),
+                              count='sum(1)', total='sum(price)') |
+                    pql.sort('_id.model'))
+        result = self.run_pipeline(pipeline)
+        self.assertEqual([(group['_id'], group['count']) for group in result],
+                         [({'model': 'kia', 'decade': 1980}, 2), ({'model': 'subaru', 'decade': 1980}, 1)])
+        self.assertAlmostEqual(result[0]['total'], 40.7)
+
+    def test_project(self):
+        self.assertEqual(self.run_pipeline(pql.project(model=1, double='price * 2') | pql.limit(1)),
+                         [{'_id': 1, 'model': 'fiat', 'double': 6}])
+        self.assertEqual(self.run_pipeline(pql.project(_id=0, tags=0, made_on=0) | pql.limit(1)),
+                         [{'model': 'fiat', 'price': 3}])
+
+    def test_project_missing(self):
+        documents = [{'_id': 1, 'a': None}, {'_id': 2}]
+        self.assertEqual(self.run_pipeline(pql.project(a=1, b='a', c='missing'), documents),
+                         [{'_id': 1, 'a': None, 'b': None}, {'_id': 2}])
+
+    def test_accumulators(self):
+        pipeline = pql.group(_id='model', total='sum(price)', average='avg(price)', low='min(price)',
+                             high='max(price)', first='first(_id)', last='last(_id)',
+                             ids='push(_id)', prices='addToSet(price)') | pql.sort('_id')
+        self.assertEqual(self.run_pipeline(pipeline)[1],
+                         {'_id': 'kia', 'total': 11, 'average': 5.5, 'low': 4, 'high': 7,
+                          'first': 3, 'last': 4, 'ids': [3, 4], 'prices': [4, 7]})
+
+    def test_push_nulls(self):
+        documents = [{'a': 1}, {'a': None}, {}, {'a': None}]
+        pipeline = [{'$group': {'_id': None, 'pushed': {'$push': '$a'}, 'set': {'$addToSet': '$a'}}}]
+        self.assertEqual(self.run_pipeline(pipeline, documents),
+                         [{'_id': None, 'pushed': [1, None, None], 'set': [1, None]}])
+
+    def test_sort_skip_limit(self):
+        pipeline = pql.sort(['model', '-price']) | pql.skip(1) | pql.limit(2) | pql.project(price=1)
+        self.assertEqual(self.run_pipeline(pipeline), [{'_id': 4, 'price': 7}, {'_id': 3, 'price': 4}])
+        self.assertEqual(self.run_pipeline(pql.sort('-price') | pql.limit(2) | pql.project(_id=1)),
+                         [{'_id': 4}, {'_id': 2}])
+
+    def test_unwind(self):
+        self.assertEqual([(car['_id'], car['tags']) for car in self.run_pipeline(pql.unwind('tags'))],
+                         [(1, 'old'), (3, 'red'), (3, 'cheap')])
+        self.assertEqual(CARS[2]['tags'], ['red', 'cheap'])
+
+    def test_unwind_nested(self):
+        documents = [{'_id': 1, 'a': {'b': [1, 2]}}]
+        self.assertEqual(self.run_pipeline(pql.unwind('a.b'), documents),
+                         [{'_id': 1, 'a': {'b': 1}}, {'_id': 1, 'a': {'b': 2}}])
+        with self.assertRaises(pql.ParseError):
+            self.run_pipeline(pql.unwind('a.b'), [{'_id': 1, 'a': [{'b': [1, 2]}]}])
+
+    def test_streaming(self):
+        def documents():
+            for index in range(10):
+                yield {'a': index}
+            raise AssertionError('consumed too much')
+        self.assertEqual(self.run_pipeline(pql.match('a > 2') | pql.limit(2), documents()),
+                         [{'a': 3}, {'a': 4}])
+
+    def test_lazy_sort(self):
+        def documents():
+            yield {'a': 1}
+            raise AssertionError('read before iterating')
+        pql.aggregate(pql.sort('a'), documents())
+        pql.aggregate(pql.sort('a') | pql.limit(1), documents())
+
+    def test_expressions(self):
+        pipeline = pql.project(_id=0, a='concat(model, "!")', b='toUpper(model)', c='dayOfWeek(made_on)',
+                               d='price if price > 4 else 0', e='ifnull(missing, 1)',
+                               f='cmp(price, 4)', g='made_on - made_on') | pql.limit(1)
+        self.assertEqual(self.run_pipeline(pipeline),
+                         [{'a': 'fiat!', 'b': 'FIAT', 'c': 4, 'd': 0, 'e': 1, 'f': -1, 'g': 0}])
+
+    def test_string_conversion(self):
+        documents = [{'a': 0, 'b': None}]
+        pipeline = pql.project(_id=0, lower='toLower(a)', upper='toUpper(b)', missing='toUpper(c)',
+                               cmp='strcasecmp(a, "0")', sub='substr(a, 0, 1)')
+        self.assertEqual(self.run_pipeline(pipeline, documents),
+                         [{'lower': '0', 'upper': '', 'missing': '', 'cmp': 0, 'sub': '0'}])
+
+    def test_literals(self):
+        projection = {'_id': 0, 'a': pql.AggregationParser(optimize=True).parse('1 + 2')}
+        self.assertEqual(self.run_pipeline([{'$project': projection}, {'$limit': 1}]), [{'a': 3}])
+
+    def test_mixed_type_order(self):
+        documents = [{'a': 'x'}, {'a': 1}, {}, {'a': 2.5}]
+        self.assertEqual(self.run_pipeline(pql.sort('a'), documents), [{}, {'a': 1}, {'a': 2.5}, {'a': 'x'}])
@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from datetime import datetime
 from unittest import TestCase
 import bson
@@ -107,6 +108,16 @@ class PqlSchemaLessTestCase(BasePqlTestCase):
         self.compare('a == date("2012-3-4 12:34:56.123")',
                      {'a': datetime(2012, 3, 4, 12, 34, 56, 123000)})
 
+    def test_date_fast_path_matches_dateutil(self):
+        import dateutil.parser
+        from pql.matching import parse_date_string
+        for string in ['2012-3-4', '2012-03-04T12:34', '2012-3-4 1:02:03', '2012-03-04T12:34:56.5',
+                       '2012-03-04 12:34:56.123456', '2012-03-04T12:34:56Z', '2012-03-04 12:34:56+02:00',
+                       'March 4 2012', '4/3/2012']:
+            self.assertEqual(parse_date_string(string), dateutil.parser.parse(string), string)
+        with self.assertRaises(ValueError):
+            parse_date_string('2012-02-30')
+
     def test_epoch(self):
         self.compare('a == epoch(10)', {'a': 10})
         self.compare('a == epoch("2012/1/1")', {'a': 1325372400.0})
@@ -190,6 +201,12 @@ class PqlSchemaAwareTestCase(BasePqlTestCase):
         self.assertEqual(sorted(context.exception.options),
                          sorted(['a', 'd', 'foo.bar']))
 
+    def test_syntax_options(self):
+        with self.assertRaises(pql.ParseError) as context:
+            pql.find('a == {1: 2}')
+        self.assertNotIn('elements', context.exception.options)
+        self.assertNotIn('Parameter', context.exception.options)
+
     def test_type_error(self):
         with self.assertRaises(pql.ParseError):
             self.compare('a == "foo"', None)
@@ -211,3 +228,291 @@ class PqlSchemaAwareTestCase(BasePqlTestCase):
     def test_nested(self):
         self.compare('foo.bar == ["spam"]', {'foo.bar': ['spam']})
         #self.compare('foo.bar == "spam"', {'foo.bar': 'spam'}) # currently broken
+
+    def test_literal_lists(self):
+        self.compare('a in [1, 2, 3.5]', {'a': {'$in': [1, 2, 3.5]}})
+        self.compare('a not in [1, None]', {'a': {'$nin': [1, None]}})
+        self.compare('d in ["2012-03-02", 0]', {'d': {'$in': [datetime(2012, 3, 2), datetime.fromtimestamp(0)]}})
+        with self.assertRaises(pql.ParseError):
+            self.compare('a in ["1", "2"]', None)
+        with self.assertRaises(pql.ParseError):
+            self.compare('foo.bar == ["spam", 1]', None)
+
+    def test_large_literal_lists(self):
+        ids = ['{0:024x}'.format(i) for i in range(1000)]
+        self.assertEqual(pql.find('_id in {0!r}'.format(ids), schema={'_id': pql.IdField()}),
+                         {'_id': {'$in': list(map(bson.ObjectId, ids))}})
+
+class PqlCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.cache = pql.QueryCache(maxsize=2)
+
+    def test_hit_and_miss(self):
+        self.assertEqual(pql.find('a == 1', cache=self.cache), {'a': 1})
+        self.assertEqual(pql.find('a == 1', cache=self.cache), {'a': 1})
+        stats = self.cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.size), (1, 1, 1))
+
+    def test_defensive_copy(self):
+        pql.find('a in [1, 2]', cache=self.cache)['a']['$in'].append(3)
+        self.assertEqual(pql.find('a in [1, 2]', cache=self.cache), {'a': {'$in': [1, 2]}})
+        pql.find('a == near([1, 2], 3)', cache=self.cache)['a']['$near'][0] = 5
+        query = pql.find('a == near([1, 2], 3)', cache=self.cache)
+        self.assertEqual(repr(query), repr({'a': bson.SON([('$near', [1, 2]), ('$maxDistance', 3)])}))
+
+    def test_eviction(self):
+        for expression in ['a == 1', 'a == 2', 'a == 3']:
+            pql.find(expression, cache=self.cache)
+        self.assertEqual(self.cache.stats().evictions, 1)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_schema_identity(self):
+        pql.find('a == 1', schema={'a': pql.IntField()}, cache=self.cache)
+        with self.assertRaises(pql.ParseError):
+            pql.find('a == 1', schema={'a': pql.StringField()}, cache=self.cache)
+
+    def test_schema_key_size(self):
+        schema = dict(('f{0}'.format(i), pql.IntField()) for i in range(1000))
+        pql.find('f1 == 1', schema=schema, cache=self.cache)
+        key, = self.cache._entries
+        self.assertEqual(key[1], id(schema)) # the key doesn't grow with the schema
+
+    def test_schema_version(self):
+        schema = {'a': pql.IntField()}
+        pql.find('a == 1', schema=schema, cache=self.cache)
+        schema['a'] = pql.StringField()
+        with self.assertRaises(pql.ParseError):
+            pql.find('a == 1', schema=schema, schema_version=2, cache=self.cache)
+
+    def test_errors_not_cached(self):
+        for _ in range(2):
+            with self.assertRaises(pql.ParseError):
+                pql.find('a == foo', cache=self.cache)
+        self.assertEqual(len(self.cache), 0)
+
+class PqlPreparedTestCase(TestCase):
+
+    def test_bind(self):
+        query = pql.prepare('price > :min and model in :models')
+        self.assertEqual(query.parameters, frozenset(['min', 'models']))
+        self.assertEqual(query.bind(min=3, models=('kia', 'fiat')),
+                         {'$and': [{'price': {'$gt': 3}}, {'model': {'$in': ['kia', 'fiat']}}]})
+        self.assertEqual(query.bind(min=5, models=[]),
+                         {'$and': [{'price': {'$gt': 5}}, {'model': {'$in': []}}]})
+
+    def test_functions_and_not(self):
+        self.assertEqual(pql.prepare('not a == regex(:pattern, "i")').bind(pattern='^foo'),
+                         {'a': {'$not': {'$regex': '^foo', '$options': 'i'}}})
+        self.assertEqual(pql.prepare('a not in :values').bind(values=[1]), {'a': {'$nin': [1]}})
+        query = pql.prepare('a > date(:since)')
+        self.assertEqual(query.bind(since='2020-1-2'), {'a': {'$gt': datetime(2020, 1, 2)}})
+        self.assertEqual(query.bind(since=datetime(2021, 3, 4)), {'a': {'$gt': datetime(2021, 3, 4)}})
+        with self.assertRaises(pql.ParseError):
+            query.bind(since=[1])
+
+    def test_dict_and_slice_colons(self):
+        self.assertEqual(pql.prepare('a == match({"foo":null}) and b == :b').bind(b=1),
+                         {'$and': [{'a': {'$elemMatch': {'foo': None}}}, {'b': 1}]})
+
+    def test_bound_values_are_copied(self):
+        query = pql.prepare('a == [1, 2] and b == :b')
+        query.bind(b=1)['$and'][0]['a'].append(3)
+        self.assertEqual(query.bind(b=1), {'$and': [{'a': [1, 2]}, {'b': 1}]})
+
+    def test_schema(self):
+        schema = {'a': pql.IntField(), 'd': pql.DateTimeField(), '_id': pql.IdField()}
+        query = pql.prepare('a > :a and d < :d and _id in :ids', schema=schema)
+        self.assertEqual(query.bind(a=1, d='2012-03-04', ids=['abcdeabcdeabcdeabcdeabcd']),
+                         {'$and': [{'a': {'$gt': 1}},
+                                   {'d': {'$lt': datetime(2012, 3, 4)}},
+                                   {'_id': {'$in': [bson.ObjectId('abcdeabcdeabcdeabcdeabcd')]}}]})
+        with self.assertRaises(pql.ParseError) as context:
+            query.bind(a='foo', d='2012-03-04', ids=[])
+        self.assertIn('parameter :a', str(context.exception))
+        with self.assertRaises(pql.ParseError):
+            query.bind(a=1, d='2012-03-04', ids=['foo'])
+        with self.assertRaises(pql.ParseError):
+            pql.prepare('b > :b', schema=schema)
+
+    def test_bound_sequences(self):
+        query = pql.prepare('a in :a and b not in :b', schema={'a': pql.IntField(), 'b': pql.IdField()})
+        oid = bson.ObjectId()
+        self.assertEqual(query.bind(a=range(3), b=(oid, str(oid))),
+                         {'$and': [{'a': {'$in': [0, 1, 2]}}, {'b': {'$nin': [oid, oid]}}]})
+        for a, b in [([1, '2'], []), ([True], []), ([], ['foo']), ([], [1])]:
+            with self.assertRaises(pql.ParseError):
+                query.bind(a=a, b=b)
+
+    def test_missing_and_unknown(self):
+        query = pql.prepare('a == :a')
+        with self.assertRaises(pql.ParseError) as context:
+            query.bind()
+        self.assertIn('Missing value', str(context.exception))
+        with self.assertRaises(pql.ParseError) as context:
+            query.bind(a=1, b=2)
+        self.assertIn('Unknown parameters', str(context.exception))
+
+class PqlOptimizeTestCase(TestCase):
+
+    def compare(self, string, expected):
+        self.assertEqual(pql.find(string, optimize=True), expected)
+
+    def test_merge_ranges(self):
+        self.compare('a > 1 and a < 5 and b == 2', {'a': {'$gt': 1, '$lt': 5}, 'b': 2})
+
+    def test_flatten(self):
+        self.compare('a == 1 and (b == 2 and (c == 3 or (d == 4 or e == 5)))',
+                     {'a': 1, 'b': 2, '$or': [{'c': 3}, {'d': 4}, {'e': 5}]})
+
+    def test_or_to_in(self):
+        self.compare('x == 1 or x == 2 or x == 3', {'x': {'$in': [1, 2, 3]}})
+        self.compare('x == 1 or y == 2 or x in [3, 1]',
+                     {'$or': [{'x': {'$in': [1, 3]}}, {'y': 2}]})
+
+    def test_duplicates(self):
+        self.compare('a == 1 and a == 1', {'a': 1})
+        self.compare('a == 1 or a == 1 or b == 2', {'$or': [{'a': 1}, {'b': 2}]})
+        self.compare('a == 1 or a == True', {'a': {'$in': [1, True]}})
+
+    def test_colliding_fields(self):
+        self.compare('a == 1 and a > 0', {'$and': [{'a': 1}, {'a': {'$gt': 0}}]})
+        self.compare('a > 1 and a > 2', {'$and': [{'a': {'$gt': 1}}, {'a': {'$gt': 2}}]})
+        self.compare('(a == 1 or b == 1) and (c == 1 or d == 1)',
+                     {'$and': [{'$or': [{'a': 1}, {'b': 1}]}, {'$or': [{'c': 1}, {'d': 1}]}]})
+
+    def test_input_not_mutated(self):
+        query = {'$and': [{'a': {'$gt': 1}}, {'a': {'$lt': 5}}]}
+        pql.optimizer.optimize(query)
+        self.assertEqual(query, {'$and': [{'a': {'$gt': 1}}, {'a': {'$lt': 5}}]})
+
+class PqlFingerprintTestCase(TestCase):
+
+    def assertSameShape(self, first, second):
+        self.assertEqual(pql.fingerprint(first), pql.fingerprint(second))
+
+    def assertDifferentShape(self, first, second):
+        self.assertNotEqual(pql.fingerprint(first).hash, pql.fingerprint(second).hash)
+
+    def test_shape(self):
+        self.assertEqual(pql.fingerprint('price > 3 and model == "kia"').shape,
+                         {'model': '?str', 'price': {'$gt': '?int'}})
+        self.assertEqual(pql.fingerprint('a in [1, "x", 2] and b == date(10)').shape,
+                         {'a': {'$in': ['?int', '?str']}, 'b': '?datetime'})
+        self.assertEqual(pql.fingerprint('a == match({"b": 1, "c": {"$gt": 2}})').shape,
+                         {'a': {'$elemMatch': {'b': '?int', 'c': {'$gt': '?int'}}}})
+
+    def test_values_ignored(self):
+        self.assertSameShape('price > 3 and model == "kia"', 'model == "fiat" and price > 10')
+        self.assertSameShape('a in [1, 2]', 'a in [3, 4, 5]')
+        self.assertSameShape('a == regex("^x")', 'a == regex("^y")')
+
+    def test_order_and_nesting_ignored(self):
+        self.assertSameShape('a == 1 or b == 2', 'b == 3 or a == 4')
+        self.assertSameShape('a == 1 and (b == 2 and c == 3)', '(c == 1 and b == 1) and a == 1')
+        self.assertSameShape('a == 1 or (b == 2 or c == 3)', 'c == 1 or b == 1 or a == 1')
+
+    def test_duplicates_kept(self):
+        self.assertSameShape('a == 1 or a == 1', 'a == 1 or a == 2')
+        self.assertSameShape('a == 1 and a == 1', 'a == 1 and a == 2')
+        self.assertEqual(pql.fingerprint('a == 1 or a == 1').shape, {'$or': [{'a': '?int'}, {'a': '?int'}]})
+
+    def test_structure_matters(self):
+        self.assertDifferentShape('a == 1', 'a == "1"')
+        self.assertDifferentShape('a > 1', 'a >= 1')
+        self.assertDifferentShape('a == 1', 'b == 1')
+        self.assertDifferentShape('a == 1 and b == 1', 'a == 1 or b == 1')
+
+    def test_stable_hash(self):
+        self.assertEqual(pql.fingerprint('a == 1').hash, '4ce893eb73c9526e24959d876284ef7fb657a842')
+
+class PqlIterativeTestCase(TestCase):
+
+    def find(self, expression, **kwargs):
+        return pql.find(expression, iterative=True, cache=None, **kwargs)
+
+    def stacked(self, expression):
+        # with a memo (as sessions use) even shallow expressions are walked with the explicit stack
+        return pql.iterative.parse(pql.matching.SchemaFreeParser(), expression, OrderedDict())
+
+    def test_same_as_recursive(self):
+        for expression in ['a == 1', 'a == 1 or b == 2 or c == 3', 'a == 1 and b == 2 or c == 3',
+                           'a == 1 or b == 2 and c == 3', 'not a == 1', 'a == 1 and not (b > 2)',
+                           'a not in [1, 2] and b == match({"x": 1})', 'x == (1)',
+                           'a == 1 and (b == 2 or (c == 3 and d == 4))',
+                           'a == "x and (y" or b == \'or )\'', 'a == """not ("""',
+                           'a == date("2012-1-1") and b in [1,\n 2] # and c == 1']:
+            self.assertEqual(self.find(expression), pql.find(expression, cache=None), expression)
+            self.assertEqual(self.stacked(expression), pql.find(expression, cache=None), expression)
+
+    def test_flattens_chains(self):
+        expression = '(a == 1 or b == 1) or (c == 1 or (d == 1 or e == 1))'
+        expected = {'$or': [{'a': 1}, {'b': 1}, {'c': 1}, {'d': 1}, {'e': 1}]}
+        self.assertEqual(self.find(expression), expected)
+        self.assertEqual(self.stacked(expression), expected)
+
+    def test_schema(self):
+        schema = {'a': pql.IntField()}
+        self.assertEqual(self.find('a == 1 or a == 2', schema=schema), {'$or': [{'a': 1}, {'a': 2}]})
+        with self.assertRaises(pql.ParseError) as context:
+            self.find('a == 1 or b == 2', schema=schema)
+        self.assertIn('Field not found: b', str(context.exception))
+
+    def test_errors(self):
+        for expression, col_offset in [('', None), ('a == 1 and', None), ('(a == 1', 0), ('a == 1)', 6),
+                                       ('a == 1 or or b == 2', 10), ('a == 1 and b === 2', 15),
+                                       ('a == 1 and b == foo(1)', 16)]:
+            for find in (self.find, self.stacked):
+                with self.assertRaises(pql.ParseError) as context:
+                    find(expression)
+                self.assertEqual(context.exception.col_offset, col_offset, expression)
+
+    def test_huge(self):
+        query = self.find(' or '.join('a == {0}'.format(i) for i in range(100000)))
+        self.assertEqual(len(query['$or']), 100000)
+        self.assertEqual(query['$or'][-1], {'a': 99999})
+
+        expression = 'c == 1'
+        for i in range(5000): # far beyond what ast.parse and the recursive parser can nest
+            expression = 'a{0} > {0} {1} ({2})'.format(i, 'and' if i % 2 else 'or', expression)
+        query = self.find(expression)
+        depth = 0
+        while query != {'c': 1}:
+            query = query[next(iter(query))][-1]
+            depth += 1
+        self.assertEqual(depth, 5000)
+
+class PqlEncodedOutputTestCase(TestCase):
+
+    def setUp(self):
+        self.cache = pql.QueryCache()
+
+    def test_bytes(self):
+        expression = 'a > 1 and b == date("2020-1-1")'
+        encoded = pql.find(expression, cache=self.cache, output='bytes')
+        self.assertIsInstance(encoded, bytes)
+        self.assertEqual(bson.decode(encoded), pql.find(expression, cache=None))
+        self.assertIs(pql.find(expression, cache=self.cache, output='bytes'), encoded) # cached encoded
+        self.assertEqual(self.cache.stats().hits, 1)
+
+    def test_raw(self):
+        from bson.raw_bson import RawBSONDocument
+        query = pql.find('a in [1, 2]', cache=self.cache, output='raw')
+        self.assertIsInstance(query, RawBSONDocument)
+        self.assertEqual(query['a']['$in'], [1, 2])
+        self.assertEqual(pql.find('a in [1, 2]', cache=None, output='raw').raw, query.raw)
+
+    def test_dict_and_encoded_are_cached_apart(self):
+        pql.find('a == 1', cache=self.cache, output='bytes')
+        self.assertEqual(pql.find('a == 1', cache=self.cache), {'a': 1})
+        self.assertEqual(self.cache.stats().misses, 2)
+
+    def test_key_order(self):
+        query = pql.find('location == near([1, 2], 10)', output='raw')
+        self.assertEqual(list(query['location']), ['$near', '$maxDistance'])
+        stage = bson.decode(pql.encode(pql.sort(['-b', 'a'])[0]), bson.CodecOptions(document_class=bson.SON))
+        self.assertEqual(list(stage['$sort'].items()), [('b', -1), ('a', 1)])
+
+    def test_invalid_output(self):
+        with self.assertRaises(ValueError):
+            pql.find('a == 1', output='json')
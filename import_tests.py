@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+# microseconds, generous enough for slow machines but far below loading bson/pymongo
+IMPORT_BUDGET = int(os.environ.get('PQL_IMPORT_BUDGET', 60000))
+
+LAZY_MODULES = ['bson', 'pymongo', 'dateutil', 'numpy', 'sqlite3']
+
+class PqlImportTestCase(TestCase):
+
+    def import_times(self):
+        '''
+        Returns the cumulative import time (microseconds) of each module imported by `import pql`.
+        '''
+        output = subprocess.check_output([sys.executable, '-X', 'importtime', '-c', 'import pql'],
+                                         cwd=os.path.dirname(os.path.abspath(__file__)),
+                                         stderr=subprocess.STDOUT).decode()
+        times = {}
+        for line in output.splitlines():
+            if line.startswith('import time:') and '|' in line:
+                _, cumulative, name = line.split('|')
+                if cumulative.strip().isdigit():
+                    times[name.strip()] = int(cumulative)
+        return times
+
+    def test_heavy_dependencies_are_lazy(self):
+        times = self.import_times()
+        for module in LAZY_MODULES:
+            self.assertNotIn(module, times)
+
+    def test_import_budget(self):
+        self.assertLess(min(self.import_times()['pql'] for _ in range(3)), IMPORT_BUDGET)
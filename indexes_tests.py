@@ -0,0 +1,72 @@
+from unittest import TestCase
+import pql
+from pql.indexes import IndexAdvisor, classify, sort_keys
+
+class PqlIndexAdvisorTestCase(TestCase):
+
+    def advise(self, *queries):
+        return pql.advise_indexes(queries)
+
+    def test_classify(self):
+        self.assertEqual(classify(pql.find('a == 1 and b > 2 and c in [1, 2] and d == regex("^x") and '
+                                           'e == regex("x") and f != 1 and g == near([1, 2])')),
+                         [[('a', 'equality'), ('b', 'range'), ('c', 'in'), ('d', 'prefix'),
+                           ('e', 'unindexable'), ('f', 'unindexable'), ('g', 'legacy geo')]])
+        self.assertEqual(classify(pql.find('a == 1 and (b == 2 or c > 3)')),
+                         [[('a', 'equality'), ('b', 'equality')], [('a', 'equality'), ('c', 'range')]])
+
+    def test_sort_keys(self):
+        self.assertEqual(sort_keys(['a', '-b']), [('a', 1), ('b', -1)])
+        self.assertEqual(sort_keys(pql.sort('-b')), [('b', -1)])
+        self.assertEqual(sort_keys({'a': 1}), [('a', 1)])
+
+    def test_equality_sort_range(self):
+        advice = self.advise(('price > 3 and model == "kia"', '-made_on', 10))
+        self.assertEqual(advice.recommendations,
+                         [pql.indexes.IndexRecommendation([('model', 1), ('made_on', -1), ('price', 1)],
+                                                          ['price > 3 and model == "kia"'], 10)])
+
+    def test_in_is_range_when_sorting(self):
+        self.assertEqual(self.advise('a in [1, 2] and b == 1').recommendations[0].keys, [('a', 1), ('b', 1)])
+        self.assertEqual(self.advise(('a in [1, 2] and b == 1', 'c')).recommendations[0].keys,
+                         [('b', 1), ('c', 1), ('a', 1)])
+
+    def test_merges_prefixes(self):
+        advice = self.advise('a == 1', ('b == 2 and a == 1', None, 5), 'a == 1 and b == 2 and c > 3')
+        self.assertEqual([(index.keys, index.frequency) for index in advice.recommendations],
+                         [([('a', 1), ('b', 1), ('c', 1)], 7)])
+        advice = self.advise('b == 1', 'a == 1 and c == 1')
+        self.assertEqual(len(advice.recommendations), 2)
+
+    def test_or_branches(self):
+        advice = self.advise('a == 1 or b > 2')
+        self.assertEqual(sorted(index.keys for index in advice.recommendations), [[('a', 1)], [('b', 1)]])
+        advice = self.advise('a == 1 or b != 2')
+        self.assertEqual(advice.recommendations, [])
+        self.assertEqual(advice.unindexable[0].query, 'a == 1 or b != 2')
+
+    def test_unindexable(self):
+        advice = self.advise('a != 1', 'a not in [1]', 'not a > 1', 'a == regex("x")', 'a == regex("^x", "i")',
+                             'a == 1 and b != 1')
+        self.assertEqual([query.query for query in advice.unindexable],
+                         ['a != 1', 'a not in [1]', 'not a > 1', 'a == regex("x")', 'a == regex("^x", "i")'])
+        self.assertEqual(advice.unindexable[3].reasons, ['unanchored regex'])
+        self.assertEqual(advice.recommendations[0].keys, [('a', 1)])
+
+    def test_sort_only(self):
+        advice = self.advise(('a != 1', '-b'))
+        self.assertEqual(advice.recommendations[0].keys, [('b', -1)])
+        self.assertEqual(advice.unindexable, [])
+
+    def test_geo(self):
+        for expression, index in [('location == near([1, 2])', '2d'),
+                                  ('location == geoWithin(box([[1, 2], [3, 4]]))', '2d'),
+                                  ('location == near(Point(1, 2), 10)', '2dsphere'),
+                                  ('location == geoWithin(Polygon([[[1, 2], [3, 4], [5, 6], [1, 2]]]))', '2dsphere')]:
+            advice = self.advise('category == 1 and ' + expression)
+            self.assertEqual(advice.recommendations[0].keys, [('category', 1), ('location', index)], expression)
+
+    def test_advisor(self):
+        advisor = IndexAdvisor()
+        advisor.add({'a': 1, 'b': {'$gte': 1}}, sort=[('c', -1)])
+        self.assertEqual(advisor.advise().recommendations[0].queries, [{'a': 1, 'b': {'$gte': 1}}])
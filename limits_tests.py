@@ -0,0 +1,140 @@
+import pickle
+from unittest import TestCase
+import pql
+
+class PqlLimitsTestCase(TestCase):
+
+    def assert_exceeded(self, expression, limit, value, **limits):
+        for iterative in [False, True]:
+            with self.assertRaises(pql.LimitExceeded) as context:
+                pql.find(expression, limits=pql.Limits(**limits), iterative=iterative, cache=None)
+            self.assertEqual((context.exception.limit, context.exception.value), (limit, value), iterative)
+        return context.exception
+
+    def test_within_limits(self):
+        expression = 'model in ["kia", "fiat"] and name == regex("^a")'
+        self.assertEqual(pql.find(expression, limits=pql.Limits(max_in=2, anchored_regex=True)),
+                         {'$and': [{'model': {'$in': ['kia', 'fiat']}}, {'name': {'$regex': '^a'}}]})
+
+    def test_cost(self):
+        self.assertEqual(pql.cost('model in ["kia", "fiat"] and (name == regex("^a") or not price > 3)'),
+                         pql.limits.Cost(nodes=9, depth=3, values=2, branches=2, vertices=0, regexes=1))
+        self.assertEqual(pql.cost('location == geoWithin(Polygon([[[1, 2], [3, 4], [5, 6], [1, 2]]]))').vertices, 4)
+
+    def test_length(self):
+        error = self.assert_exceeded('a == "{0}"'.format('x' * 100), 'max_length', 107, max_length=100)
+        self.assertEqual(error.cost.nodes, 0) # not even parsed
+
+    def test_nodes(self):
+        self.assert_exceeded(' and '.join('a{0} == 1'.format(i) for i in range(20)), 'max_nodes', 11, max_nodes=10)
+
+    def test_depth(self):
+        self.assert_exceeded('not (not (not a == 1))', 'max_depth', 3, max_depth=2)
+        self.assert_exceeded('a == 1 and (b == 1 or (c == 1 and d == 1))', 'max_depth', 3, max_depth=2)
+
+    def test_in(self):
+        error = self.assert_exceeded('a not in {0}'.format(list(range(1001))), 'max_in', 1001)
+        self.assertEqual(error.maximum, 1000)
+        self.assertEqual(error.col_offset, 9)
+        self.assertEqual(str(error), 'Limit exceeded: values in a list (1001 > 1000).')
+
+    def test_list_literals(self):
+        values = list(range(1001))
+        for expression, nodes in [('a == all({0})', 22), ('a == {0}', 21), ('a == match({{"$in": {0}}})', 23)]:
+            self.assert_exceeded(expression.format(values), 'max_in', 1001, max_length=None)
+            self.assert_exceeded(expression.format(values[:20]), 'max_nodes', nodes, max_nodes=10)
+        self.assertEqual(pql.cost('a == match({"b": 1, "c": [1, 2]})'),
+                         pql.limits.Cost(nodes=6, depth=0, values=2, branches=0, vertices=0, regexes=0))
+
+    def test_or(self):
+        error = self.assert_exceeded(' or '.join('a == {0}'.format(i) for i in range(500)), 'max_or', 500, max_or=10)
+        self.assertEqual(error.cost.nodes, 1) # no branch was translated
+
+    def test_optimized_or(self):
+        expression = ' or '.join('({0})'.format(' or '.join('{0}{1} == 1'.format(field, i) for i in range(8)))
+                                 for field in 'abc')
+        self.assertEqual(len(pql.find(expression, limits=pql.Limits(max_or=24), cache=None)['$or']), 3)
+        for iterative in [False, True]:
+            for optimize in [False, True]:
+                with self.assertRaises(pql.LimitExceeded) as context:
+                    pql.find(expression, limits=pql.Limits(max_or=10), optimize=optimize, iterative=iterative,
+                             cache=None)
+                self.assertEqual((context.exception.limit, context.exception.value), ('max_or', 24))
+
+    def test_nested_or(self):
+        self.assert_exceeded('(a == 1 or b == 2) or c == 3', 'max_or', 3, max_or=2)
+        self.assert_exceeded('a == 1 or (b == 2 or c == 3)', 'max_or', 3, max_or=2)
+        self.assert_exceeded('a == 1 or (b == 2 and (c == 3 or d == 4 or e == 5))', 'max_or', 3, max_or=2)
+        self.assertEqual(pql.cost('(a == 1 or b == 2) or c == 3').branches, 3)
+        deep = ' and '.join(['not d == 1'] * pql.iterative.SHALLOW) # walked with the explicit stack
+        self.assert_exceeded('(a == 1 or b == 2) or c == 3 and ' + deep, 'max_or', 3, max_or=2)
+        self.assert_exceeded('a == 1 or (b == 2 or c == 3) or ' + deep, 'max_or', 4, max_or=3)
+
+    def test_regex(self):
+        error = self.assert_exceeded('a == 1 and name == regex("son")', 'anchored_regex', 'son', anchored_regex=True)
+        self.assertEqual(error.options, ['^son'])
+        self.assertEqual(error.col_offset, 19)
+        self.assert_exceeded('name == regex("^(a+)+$")', 'safe_regex', '^(a+)+$')
+        self.assert_exceeded('name == regex("^(a|b*){2,}")', 'safe_regex', '^(a|b*){2,}')
+        self.assert_exceeded('name == regex("^(a)\\\\1")', 'safe_regex', '^(a)\\1')
+        self.assert_exceeded('name == regex("(a|a)*$")', 'safe_regex', '(a|a)*$')
+        error = self.assert_exceeded('name == regex("^((a|ab)c?)+d")', 'safe_regex', '^((a|ab)c?)+d')
+        self.assertEqual(str(error), 'Limit exceeded: unsafe regex, repeated alternation (^((a|ab)c?)+d).')
+        self.assert_exceeded('name == regex("^(a")', 'safe_regex', '^(a')
+        self.assert_exceeded('name == regex("^a{0}")'.format('b' * 20), 'max_regex_length', 22, max_regex_length=10)
+        self.assertEqual(pql.find('name == regex("^(ab)+c*[d-f]{2}")', limits=pql.Limits()),
+                         {'name': {'$regex': '^(ab)+c*[d-f]{2}'}})
+        self.assertEqual(pql.find('name == regex("^(a|b)?[(|)]*x|y")', limits=pql.Limits()),
+                         {'name': {'$regex': '^(a|b)?[(|)]*x|y'}})
+        self.assertEqual(pql.find('name == regex("^([^]|]x)*")', limits=pql.Limits()),
+                         {'name': {'$regex': '^([^]|]x)*'}})
+
+    def test_vertices(self):
+        self.assert_exceeded('location == geoWithin(Polygon([[[1, 2], [3, 4], [5, 6], [1, 2]]]))', 'max_vertices', 4,
+                             max_vertices=3)
+        self.assert_exceeded('location == geoIntersects(LineString([[1, 2], [3, 4]]))', 'max_vertices', 2,
+                             max_vertices=1)
+
+    def test_prepared(self):
+        with self.assertRaises(pql.LimitExceeded):
+            pql.prepare('a in [1, 2, 3]', limits=pql.Limits(max_in=2))
+        query = pql.prepare('name == regex(:pattern) and a in :ids', limits=pql.Limits(max_in=2, anchored_regex=True))
+        self.assertEqual(query.bind(pattern='^a', ids=range(2)),
+                         {'$and': [{'name': {'$regex': '^a'}}, {'a': {'$in': [0, 1]}}]})
+        for values, limit, value in [({'pattern': 'a', 'ids': []}, 'anchored_regex', 'a'),
+                                     ({'pattern': '^(a+)+$', 'ids': []}, 'safe_regex', '^(a+)+$'),
+                                     ({'pattern': '^a', 'ids': range(3)}, 'max_in', 3)]:
+            with self.assertRaises(pql.LimitExceeded) as context:
+                query.bind(**values)
+            self.assertEqual((context.exception.limit, context.exception.value), (limit, value))
+
+    def test_disabled(self):
+        expression = ' or '.join('a == {0}'.format(i) for i in range(200))
+        self.assertEqual(len(pql.find(expression, limits=pql.Limits(max_or=None))['$or']), 200)
+
+    def test_cached_by_limits(self):
+        cache = pql.QueryCache()
+        pql.find('a in [1, 2, 3]', cache=cache)
+        with self.assertRaises(pql.LimitExceeded):
+            pql.find('a in [1, 2, 3]', cache=cache, limits=pql.Limits(max_in=2))
+        pql.find('a in [1, 2, 3]', cache=cache, limits=pql.Limits(max_in=3))
+        pql.find('a in [1, 2, 3]', cache=cache, limits=pql.Limits(max_in=3))
+        self.assertEqual(cache.stats().hits, 1)
+
+    def test_parse_error(self):
+        with self.assertRaises(pql.ParseError):
+            pql.find('a in {0}'.format(list(range(2000))), limits=pql.Limits())
+
+    def test_pickle(self):
+        with self.assertRaises(pql.LimitExceeded) as context:
+            pql.find('a in [1, 2]', limits=pql.Limits(max_in=1))
+        error = pickle.loads(pickle.dumps(context.exception))
+        self.assertIsInstance(error, pql.LimitExceeded)
+        self.assertEqual((error.limit, error.value, error.maximum, error.cost),
+                         ('max_in', 2, 1, context.exception.cost))
+
+    def test_inactive_after_translation(self):
+        with self.assertRaises(pql.LimitExceeded):
+            pql.find('a in [1, 2]', limits=pql.Limits(max_in=1), cache=None)
+        self.assertEqual(pql.limits.active, 0)
+        self.assertEqual(pql.find('a in [1, 2]', cache=None), {'a': {'$in': [1, 2]}})
@@ -0,0 +1,125 @@
+import datetime
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+import bson
+import pql
+from pql import persistent
+
+class PqlPersistentCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'pql.sqlite')
+        self.cache = pql.PersistentCache(self.path, memory_maxsize=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def find(self, expression, cache=None, **kwargs):
+        return pql.find(expression, cache=self.cache if cache is None else cache, **kwargs)
+
+    def assert_round_trip(self, expression, **kwargs):
+        query = pql.find(expression, cache=None, **kwargs)
+        for _ in range(2):
+            result = self.find(expression, cache=pql.PersistentCache(self.path, memory_maxsize=0), **kwargs)
+            self.assertEqual(result, query)
+            self.assertEqual(repr(result), repr(query)) # same types and key order
+        return result
+
+    def test_round_trip(self):
+        self.assert_round_trip('_id == id("abcdeabcdeabcdeabcdeabcd")')
+        self.assert_round_trip('a > date("2012-01-01T10:20:30.123456")')
+        self.assert_round_trip('location == near(Point(1, 2), 10)')
+        self.assert_round_trip('location == geoWithin(Polygon([[[1, 2], [3, 4], [5, 6], [1, 2]]]))')
+        self.assert_round_trip('a in [1, 2.5, None, True, "x"] and b == {"__pql__": "oid", "value": 1}')
+        self.assert_round_trip('a == 1', output='bytes')
+        self.assertEqual(self.cache.stats().hits, 0)
+        self.assertEqual(len(self.cache), 6)
+
+    def test_codec(self):
+        query = bson.SON([('b', [bson.ObjectId('abcdeabcdeabcdeabcdeabcd')]), ('a', {'__pql__': 'son'})])
+        self.assertEqual(repr(persistent.loads(persistent.dumps(query))), repr(query))
+        with self.assertRaises(TypeError):
+            persistent.dumps({'a': object()})
+
+    def test_datetimes(self):
+        for value in [datetime.datetime(2012, 1, 2, 3, 4, 5),
+                      datetime.datetime(2012, 1, 2, 3, 4, 5, 6),
+                      datetime.datetime(2012, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc),
+                      datetime.datetime(2012, 1, 2, 3, 4, 5, 6,
+                                        tzinfo=datetime.timezone(-datetime.timedelta(hours=5, minutes=30)))]:
+            result = persistent.loads(persistent.dumps({'a': value}))['a']
+            self.assertEqual((result, result.utcoffset()), (value, value.utcoffset()))
+
+    def test_hit_and_miss(self):
+        self.assertEqual(self.find('a == 1'), {'a': 1})
+        self.assertEqual(self.find('a == 1'), {'a': 1})
+        stats = self.cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.size), (1, 1, 1))
+
+    def test_shared_by_processes(self):
+        code = 'import pql; pql.find("a == 1", cache=pql.PersistentCache({0!r}))'.format(self.path)
+        subprocess.check_call([sys.executable, '-c', code], env=dict(os.environ, PYTHONPATH=os.getcwd()))
+        self.assertEqual(self.find('a == 1'), {'a': 1})
+        self.assertEqual(self.cache.stats().hits, 1)
+
+    def test_schema_fingerprint(self):
+        self.find('a == 1', schema={'a': pql.IntField()})
+        self.find('a == 1', schema={'a': pql.IntField()}) # another dict, the same fields
+        self.assertEqual(self.cache.stats().hits, 1)
+        with self.assertRaises(pql.ParseError):
+            self.find('a == 1', schema={'a': pql.StringField()})
+        self.find('a == 1', schema=pql.Schema({'a': pql.IntField()}))
+        self.find('a == 1', schema=pql.Schema({'a': pql.IntField()}))
+        self.assertEqual(self.cache.stats().hits, 2)
+        self.assertNotEqual(persistent.schema_fingerprint({'a': pql.ListField(pql.IntField())}),
+                            persistent.schema_fingerprint({'a': pql.ListField(pql.StringField())}))
+        schema = {'a': pql.IntField()}
+        self.find('a == 1', schema=schema)
+        schema['a'] = pql.StringField() # mutated in place
+        with self.assertRaises(pql.ParseError):
+            self.find('a == 1', schema=schema, schema_version=2)
+
+    def test_fingerprints_bounded(self):
+        schemas = [{'a': pql.IntField()} for _ in range(persistent.FINGERPRINTS + 10)]
+        for schema in schemas:
+            self.find('a == 1', schema=schema)
+        self.assertEqual(len(self.cache._fingerprints), persistent.FINGERPRINTS)
+        self.assertEqual(self.cache.stats().hits, len(schemas) - 1)
+
+    def test_version(self):
+        self.find('a == 1')
+        version = pql.__version__
+        persistent.__version__ = version + '.dev'
+        try:
+            self.find('a == 1')
+        finally:
+            persistent.__version__ = version
+        self.assertEqual(self.cache.stats().misses, 2)
+
+    def test_errors_not_cached(self):
+        with self.assertRaises(pql.ParseError):
+            self.find('a == foo')
+        self.assertEqual(len(self.cache), 0)
+
+    def test_eviction(self):
+        cache = pql.PersistentCache(self.path, maxsize=50, memory_maxsize=0)
+        for i in range(200):
+            self.find('a == {0}'.format(i), cache=cache)
+        self.assertLessEqual(len(cache), 50 + persistent.EVICT_EVERY)
+        self.assertGreater(cache.stats().evictions, 0)
+        self.assertEqual(self.find('a == 199', cache=cache), {'a': 199})
+        self.assertEqual(cache.stats().hits, 1)
+
+    def test_unusable_file(self):
+        cache = pql.PersistentCache(self.directory) # a directory isn't a database
+        self.assertEqual(self.find('a == 1', cache=cache), {'a': 1})
+
+    def test_clear(self):
+        self.find('a == 1')
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
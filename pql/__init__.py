@@ -1,22 +1,181 @@
-from functools import wraps
+__version__ = '0.5.0'
+
+from functools import partial, wraps
+from . import optimizer, profiling, pushdown
 from .aggregation import AggregationGroupParser, AggregationParser
-from .matching import (SchemaFreeParser, SchemaAwareParser, ParseError,
+from .cache import QueryCache, CacheStats
+from .indexes import IndexAdvisor
+from .iterative import parse as iterative_parse
+from .limits import Limits, UNLIMITED
+from .matching import (SchemaFreeParser, SchemaAwareParser, ParseError, LimitExceeded,
                        StringField, IntField, BoolField, IdField,
                        ListField, DictField, DateTimeField)
+from .persistent import PersistentCache
+from .predicate import Predicate
+from .prepared import prepare, PreparedQuery
+from .pushdown import Split
+from .schema import Schema
+from .session import Session, Completion
+
+OUTPUTS = ('dict', 'bytes', 'raw')
+
+query_cache = QueryCache(maxsize=1024)
+schema_free_parser = SchemaFreeParser()
 
-def find(expression, schema=None):
+def find(expression, schema=None, schema_version=None, cache=query_cache, optimize=False, iterative=False,
+         output='dict', limits=None):
     '''
     Gets an <expression> and optional <schema>.
     <expression> should be a string of python code.
-    <schema> should be a dictionary mapping field names to types.
+    <schema> should be a dictionary mapping field names to types or a compiled pql.Schema.
+    Translations are cached by expression and schema identity in <cache> (pass None to disable).
+    Bump <schema_version> after mutating a schema in place to avoid stale cached queries.
+    <optimize> normalizes the query (see pql.optimizer).
+    <iterative> translates and/or/not without recursion, for huge generated expressions (see pql.iterative).
+    <output> is 'dict', 'bytes' (the query encoded as BSON) or 'raw' (a bson RawBSONDocument).
+    Encoded queries are cached encoded, so a repeated query is neither parsed nor encoded again.
+    <limits> (a pql.Limits) rejects too complex expressions with LimitExceeded (see pql.limits).
+    Translations are timed per phase while profiling (see pql.profiling).
+    '''
+    if profiling.active and profiling.enabled():
+        return profiling.translate('find', expression, _find, expression, schema, schema_version, cache,
+                                   optimize, iterative, output, limits)
+    return _find(expression, schema, schema_version, cache, optimize, iterative, output, limits)
+
+def _parser(schema):
+    return schema_free_parser if schema is None else SchemaAwareParser(schema)
+
+def _find(expression, schema, schema_version, cache, optimize, iterative, output, limits):
+    if output not in OUTPUTS:
+        raise ValueError('output must be one of {0}, not {1!r}'.format(OUTPUTS, output))
+    encoded = output != 'dict'
+    def translate():
+        parser = _parser(schema)
+        parse = partial(iterative_parse, parser) if iterative else parser.parse
+        if limits is None:
+            query = parse(expression)
+            query = optimizer.optimize(query) if optimize else query
+        else:
+            query, cost = limits.translate(parse, expression)
+            if optimize:
+                query = optimizer.optimize(query)
+                limits.check_query(query, cost)
+        return encode(query) if encoded else query
+    if cache is None:
+        query = translate()
+    else:
+        query = cache.get_or_translate((expression, id(schema), schema_version, optimize, iterative, encoded,
+                                        None if limits is None else limits.key()),
+                                       schema, translate)
+    if output == 'raw':
+        from bson.raw_bson import RawBSONDocument
+        return RawBSONDocument(query)
+    return query
+
+@profiling.timed('encode')
+def encode(query):
+    '''
+    Returns a query (or any document, e.g. a pipeline stage) encoded as BSON bytes, keeping
+    the order of its keys (e.g. of SON documents).
+    '''
+    from bson import BSON
+    return bytes(BSON.encode(query))
+
+def cost(expression, schema=None, limits=None):
+    '''
+    Gets an <expression> and optional <schema> (as in find).
+    Returns the Cost of its translation (see pql.limits), checking the <limits> if given.
+    '''
+    return (UNLIMITED if limits is None else limits).translate(_parser(schema).parse, expression)[1]
+
+def compile_predicate(expression, schema=None):
+    '''
+    Gets an <expression> and optional <schema> (as in find).
+    Returns a Predicate: a callable taking a document and returning whether it matches.
+    '''
+    return Predicate(find(expression, schema))
+
+def split(expression, indexed=(), schema=None, max_cost=pushdown.MAX_COST):
+    '''
+    Gets an <expression>, the names of the <indexed> fields and an optional <schema> (as in find).
+    Returns a Split: the query to send to the server and the residual Predicate filtering
+    its results, for the predicates costing more than <max_cost> (see pql.pushdown).
+    '''
+    return pushdown.split_query(find(expression, schema), indexed, max_cost)
+
+def mask(expression, columns, schema=None):
     '''
-    parser = SchemaFreeParser() if schema is None else SchemaAwareParser(schema)
-    return parser.parse(expression)
+    Gets an <expression>, a mapping of field names to numpy arrays and an optional <schema>.
+    Returns a boolean numpy array of the matching rows. Requires numpy.
+    '''
+    from .vectorized import query_mask
+    return query_mask(find(expression, schema), columns)
+
+def evaluate(expression, columns):
+    '''
+    Evaluates an aggregation <expression> (e.g. 'price * 3.7') column-wise over a mapping
+    of field names to numpy arrays. Requires numpy.
+    '''
+    from . import vectorized
+    return vectorized.evaluate(AggregationParser().parse(expression), columns)
+
+def fingerprint(expression, schema=None):
+    '''
+    Gets an <expression> and optional <schema> (as in find).
+    Returns the Fingerprint (shape, hash) shared by every query differing only in its values.
+    '''
+    from .shapes import fingerprint
+    return fingerprint(find(expression, schema))
+
+def advise_indexes(queries, schema=None):
+    '''
+    Gets an iterable of <queries>: expressions or (expression, sort, frequency) tuples
+    (sort as in pql.sort) and an optional <schema>.
+    Returns an IndexAdvice with the recommended indexes and the queries no index can serve.
+    '''
+    advisor = IndexAdvisor()
+    for query in queries:
+        if isinstance(query, str):
+            query = (query,)
+        expression, sort, frequency = tuple(query) + (None, 1)[len(query) - 1:]
+        advisor.add(find(expression, schema), sort=sort, frequency=frequency, label=expression)
+    return advisor.advise()
+
+def find_many(expressions, schema=None, workers=None, chunksize=256):
+    '''
+    Translates an iterable of <expressions> (with an optional <schema>) in a pool of
+    <workers> processes (default: one per cpu), <chunksize> expressions at a time.
+    Returns a list of Translations (expression, query, error) in order; an invalid
+    expression gets its error instead of aborting the batch.
+    '''
+    from .batch import find_many
+    return find_many(expressions, schema, workers, chunksize)
+
+def autocomplete(expression, cursor=None, schema=None):
+    '''
+    Returns the Completion (kind, start, options) at <cursor> (default: the end) of <expression>.
+    Pass a compiled pql.Schema: a dict <schema> is compiled on every call (see pql.session).
+    '''
+    return Session(schema).autocomplete(expression, cursor)
+
+def aggregate(pipeline, documents):
+    '''
+    Lazily runs an aggregation <pipeline> (e.g. match(...) | group(...)) over an iterable
+    of <documents> in memory.
+    '''
+    from .engine import run
+    return run(pipeline, documents)
 
 class pipe_element(list):
     def __or__(self, other):
         return pipe_element(self + other)
 
+    def optimize(self):
+        '''
+        Returns an equivalent, optimized pipeline (see pql.optimizer.optimize_pipeline).
+        '''
+        return pipe_element(optimizer.optimize_pipeline(self))
+
 def pipe(func):
     @wraps(func)
     def decorated(*a, **k):
@@ -24,7 +183,7 @@ def pipe(func):
     return decorated
 
 def _parse_value(parser, value):
-    if isinstance(value, str) or isinstance(value, unicode):
+    if isinstance(value, str):
         return parser.parse(value)
     elif isinstance(value, int):
         return value
@@ -77,7 +236,6 @@ def sort(fields):
     Reverse sort is supported by appending '-' to the field name.
     Example: sort(['age', '-height']) will sort by ascending age and descending height.
     '''
-    from pymongo import ASCENDING, DESCENDING
     from bson import SON
 
     if isinstance(fields, str):
@@ -89,9 +247,9 @@ def sort(fields):
     for field in fields:
         if field.startswith('-'):
             field = field[1:]
-            sort.append((field, DESCENDING))
+            sort.append((field, -1)) # pymongo.DESCENDING
             continue
         elif field.startswith('+'):
             field = field[1:]
-        sort.append((field, ASCENDING))
+        sort.append((field, 1)) # pymongo.ASCENDING
     return {'$sort': SON(sort)}
@@ -0,0 +1,59 @@
+"""
+Translates expressions, one per line, from a file or stdin to JSON lines:
+
+    $ echo 'a > 1 and b == "x"' | python -m pql
+    {"expression": "a > 1 and b == \\"x\\"", "query": {"$and": [{"a": {"$gt": 1}}, {"b": "x"}]}}
+
+An invalid expression gets {"expression": ..., "error": ..., "col_offset": ...}
+instead, so every input line has an output line. Queries are written as MongoDB
+extended JSON (dates, ObjectIds) with bson's json_util; --format json writes
+plain JSON instead, with such values as strings.
+"""
+import argparse
+import importlib
+import json
+import sys
+from .batch import translate_many
+
+def load_schema(path):
+    '''
+    Imports a schema from a 'module:attribute' <path>.
+    '''
+    module, _, attribute = path.partition(':')
+    if not attribute:
+        raise ValueError("expected 'module:attribute', not {0!r}".format(path))
+    return getattr(importlib.import_module(module), attribute)
+
+def record(translation):
+    if translation.error is None:
+        return {'expression': translation.expression, 'query': translation.query}
+    return {'expression': translation.expression,
+            'error': str(translation.error),
+            'col_offset': getattr(translation.error, 'col_offset', None)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m pql', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', nargs='?', type=argparse.FileType('r'), default=sys.stdin,
+                        help='a file of expressions, one per line (default: stdin)')
+    parser.add_argument('--schema', help="a schema to import, as 'module:attribute'")
+    parser.add_argument('--workers', type=int, default=None, help='translating processes (default: one per cpu)')
+    parser.add_argument('--chunksize', type=int, default=256)
+    parser.add_argument('--format', choices=['extended', 'json'], default='extended')
+    args = parser.parse_args(argv)
+
+    if args.format == 'extended':
+        from bson import json_util
+        dumps = json_util.dumps
+    else:
+        dumps = lambda value: json.dumps(value, default=str)
+    schema = load_schema(args.schema) if args.schema else None
+    expressions = (line.rstrip('\r\n') for line in args.input)
+    failed = False
+    for translation in translate_many(expressions, schema, args.workers, args.chunksize):
+        failed = failed or translation.error is not None
+        sys.stdout.write(dumps(record(translation)) + '\n')
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,63 @@
 '''
 TODO:
 
-optimize adds, multiplies, 'or' and 'and' as they can accept more than two values
 validate type info on specific functions
 '''
-from .matching import AstHandler, ParseError, DateTimeFunc
+import math
+from .matching import AstHandler, ParseError, DATETIME_FUNC
+
+def is_literal(value):
+    '''
+    Strings starting with '$' reference fields, everything else that isn't a document is a literal.
+    '''
+    if isinstance(value, str):
+        return not value.startswith('$')
+    return not isinstance(value, (dict, list))
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def truth(value):
+    '''
+    Mongo's truthiness of a literal: false, null and 0 are false, everything else is true.
+    '''
+    return not (value is None or value is False or (is_number(value) and value == 0))
+
+def same_kind(left, right):
+    return (is_number(left) and is_number(right)) or \
+        (left.__class__ is right.__class__ and left.__class__ in (str, bool))
+
+def mongo_mod(left, right):
+    if isinstance(left, int) and isinstance(right, int):
+        result = abs(left) % abs(right)
+        return -result if left < 0 else result
+    return math.fmod(left, right)
 
 class AggregationParser(AstHandler):
+    '''
+    Translates expressions to aggregation expressions.
+    With <optimize>, associative operators are flattened to their n-ary form,
+    literal-only subexpressions are folded and $cond with constant tests are resolved
+    (an expression folded to a constant is returned as {'$literal': constant}).
+    '''
+    __slots__ = ('_optimize',)
+
+    ASSOCIATIVE = ('$add', '$multiply', '$and', '$or', '$concat')
+
+    COMPARISONS = {'$eq': lambda a, b: a == b,
+                   '$ne': lambda a, b: a != b,
+                   '$gt': lambda a, b: a > b,
+                   '$gte': lambda a, b: a >= b,
+                   '$lt': lambda a, b: a < b,
+                   '$lte': lambda a, b: a <= b,
+                   '$cmp': lambda a, b: (a > b) - (a < b)}
+
+    def __init__(self, optimize=False):
+        self._optimize = optimize
+
+    def parse(self, string):
+        result = super(AggregationParser, self).parse(string)
+        return self.fold(result) if self._optimize else result
 
     FUNC_TO_ARGS = {'concat': '+', # more than 1
                     'strcasecmp': 2,
@@ -64,7 +115,7 @@ class AggregationParser(AstHandler):
     def handle_Call(self, node):
         name = node.func.id
         if name == 'date':
-            return DateTimeFunc().handle_date(node)
+            return DATETIME_FUNC.handle_date(node)
         if name not in self.FUNC_TO_ARGS:
             raise ParseError('Unsupported function ({0}).'.format(name),
                              col_offset=node.col_offset)
@@ -133,9 +184,153 @@ class AggregationParser(AstHandler):
     def handle_Div(self, node):
         return '$divide'
 
+    #---Optimization---#
+
+    def fold(self, expression):
+        '''
+        Returns an optimized copy of a translated aggregation <expression> to be used as
+        a field's value: a constant it's folded to is wrapped in $literal (in a $project,
+        a bare 1 or True would be read as an inclusion flag).
+        '''
+        optimized = self.optimize(expression)
+        if is_literal(optimized) and not is_literal(expression):
+            return {'$literal': optimized}
+        return optimized
+
+    def optimize(self, expression):
+        '''
+        Returns an optimized copy of a translated aggregation <expression>. Constants are
+        folded to bare values, which is only safe for an operator's arguments: use fold
+        for a field's value.
+        '''
+        if isinstance(expression, list):
+            return [self.optimize(item) for item in expression]
+        if not isinstance(expression, dict):
+            return expression
+        if len(expression) != 1 or not next(iter(expression)).startswith('$'):
+            return expression.__class__((key, self.optimize(value)) for key, value in expression.items())
+        (operator, args), = expression.items()
+        args = self.optimize(args)
+        if operator in self.ASSOCIATIVE:
+            args = self._flatten(operator, args)
+        folder = getattr(self, '_fold_' + operator[1:], None)
+        if folder is not None:
+            return folder(operator, args)
+        if operator in self.COMPARISONS:
+            return self._fold_comparison(operator, args)
+        return {operator: args}
+
+    @staticmethod
+    def _flatten(operator, args):
+        result = []
+        for arg in args:
+            if isinstance(arg, dict) and list(arg) == [operator]:
+                result.extend(arg[operator])
+            else:
+                result.append(arg)
+        return result
+
+    @staticmethod
+    def _fold_numbers(operator, args, function):
+        numbers = [arg for arg in args if is_number(arg)]
+        if len(numbers) < 2:
+            return {operator: args}
+        folded = numbers[0]
+        for number in numbers[1:]:
+            folded = function(folded, number)
+        if len(numbers) == len(args):
+            return folded
+        index = next(index for index, arg in enumerate(args) if is_number(arg))
+        rest = [arg for arg in args if not is_number(arg)]
+        return {operator: rest[:index] + [folded] + rest[index:]}
+
+    def _fold_add(self, operator, args):
+        return self._fold_numbers(operator, args, lambda a, b: a + b)
+
+    def _fold_multiply(self, operator, args):
+        return self._fold_numbers(operator, args, lambda a, b: a * b)
+
+    def _fold_subtract(self, operator, args):
+        if all(map(is_number, args)):
+            return args[0] - args[1]
+        return {operator: args}
+
+    def _fold_divide(self, operator, args):
+        if all(map(is_number, args)) and args[1] != 0:
+            return args[0] / args[1]
+        return {operator: args}
+
+    def _fold_mod(self, operator, args):
+        if all(map(is_number, args)) and args[1] != 0:
+            return mongo_mod(args[0], args[1])
+        return {operator: args}
+
+    def _fold_comparison(self, operator, args):
+        if len(args) == 2 and all(map(is_literal, args)) and same_kind(*args):
+            return self.COMPARISONS[operator](*args)
+        return {operator: args}
+
+    def _fold_and(self, operator, args):
+        rest = []
+        for arg in args:
+            if not is_literal(arg):
+                rest.append(arg)
+            elif not truth(arg):
+                return False
+        return {operator: rest} if rest else True
+
+    def _fold_or(self, operator, args):
+        rest = []
+        for arg in args:
+            if not is_literal(arg):
+                rest.append(arg)
+            elif truth(arg):
+                return True
+        return {operator: rest} if rest else False
+
+    def _fold_not(self, operator, args):
+        if is_literal(args):
+            return not truth(args)
+        return {operator: args}
+
+    def _fold_cond(self, operator, args):
+        test, then, otherwise = args
+        if is_literal(test):
+            return then if truth(test) else otherwise
+        return {operator: args}
+
+    def _fold_ifnull(self, operator, args):
+        value, replacement = args
+        if is_literal(value):
+            return replacement if value is None else value
+        return {operator: args}
+
+    def _fold_concat(self, operator, args):
+        result = []
+        for arg in args:
+            if isinstance(arg, str) and is_literal(arg) and result and \
+               isinstance(result[-1], str) and is_literal(result[-1]):
+                result[-1] += arg
+            else:
+                result.append(arg)
+        if len(result) == 1 and isinstance(result[0], str) and is_literal(result[0]):
+            return result[0]
+        return {operator: result}
+
+
 class AggregationGroupParser(AstHandler):
+    __slots__ = ('_parser', '_optimize')
+
     GROUP_FUNCTIONS = ['addToSet', 'push', 'first', 'last',
                        'max', 'min', 'avg', 'sum']
+
+    def __init__(self, optimize=False):
+        self._parser = AGGREGATION_PARSER
+        self._optimize = optimize
+
+    def parse(self, string):
+        result = super(AggregationGroupParser, self).parse(string)
+        return self._parser.optimize(result) if self._optimize else result
     def handle_Call(self, node):
         if len(node.args) != 1:
             raise ParseError('The {0} group aggregation function accepts one argument'.format(node.func.id),
@@ -144,5 +339,6 @@ class AggregationGroupParser(AstHandler):
             raise ParseError('Unsupported group function: {0}'.format(node.func.id),
                              col_offset=node.col_offset,
                              options=self.GROUP_FUNCTIONS)
-        return {'$' + node.func.id: AggregationParser().handle(node.args[0])}
+        return {'$' + node.func.id: self._parser.handle(node.args[0])}
 
+AGGREGATION_PARSER = AggregationParser()
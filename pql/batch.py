@@ -0,0 +1,64 @@
+"""
+Translates large batches of expressions on all cores:
+
+  >>> pql.find_many(['a > 1', 'b ==', 'c in [1, 2]'], workers=4)
+  [Translation(expression='a > 1', query={'a': {'$gt': 1}}, error=None),
+   Translation(expression='b ==', query=None, error=SyntaxError(...)),
+   Translation(expression='c in [1, 2]', query={'c': {'$in': [1, 2]}}, error=None)]
+
+Expressions are sent to a process pool in chunks (the schema is sent once per
+worker) and results come back in order. A failing expression doesn't abort the
+batch: its Translation holds the error instead of the query.
+
+translate_many is the streaming version: it reads its input in windows, so
+memory stays bounded however many expressions it gets (see python -m pql).
+"""
+import itertools
+import multiprocessing
+import os
+from collections import namedtuple
+from .matching import SchemaFreeParser, SchemaAwareParser
+
+Translation = namedtuple('Translation', ['expression', 'query', 'error'])
+
+_parser = None # the worker's parser, set by _initialize
+
+def _initialize(schema):
+    global _parser
+    _parser = SchemaFreeParser() if schema is None else SchemaAwareParser(schema)
+
+def _translate(expression, parser=None):
+    try:
+        return Translation(expression, (parser or _parser).parse(expression), None)
+    except Exception as e:
+        return Translation(expression, None, e.with_traceback(None)) # don't keep the frames alive
+
+def translate_many(expressions, schema=None, workers=None, chunksize=256):
+    '''
+    Lazily yields a Translation per expression of the iterable <expressions>, in order.
+    <workers> defaults to the number of cpus; 1 translates in this process.
+    '''
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        parser = SchemaFreeParser() if schema is None else SchemaAwareParser(schema)
+        for expression in expressions:
+            yield _translate(expression, parser)
+        return
+    expressions = iter(expressions)
+    window = workers * chunksize * 4 # keeps every worker busy while bounding memory
+    pool = multiprocessing.Pool(workers, initializer=_initialize, initargs=(schema,))
+    try:
+        while True:
+            batch = list(itertools.islice(expressions, window))
+            if not batch:
+                break
+            for translation in pool.imap(_translate, batch, chunksize=chunksize):
+                yield translation
+    finally:
+        pool.terminate()
+
+def find_many(expressions, schema=None, workers=None, chunksize=256):
+    '''
+    Returns the list of Translations (expression, query, error) of <expressions>, in order.
+    '''
+    return list(translate_many(expressions, schema, workers, chunksize))
@@ -0,0 +1,79 @@
+"""
+A bounded, thread-safe LRU cache of translated queries.
+
+Entries are keyed by the expression text and the identity of the schema
+(plus an optional schema version for schemas that are mutated in place, so
+a key costs the same however big the schema is). The cache keeps a reference
+to the schema of every live entry so its id can't be reused by another object
+while the entry exists.
+
+Callers get a copy of the cached query's documents and lists (its values are
+immutable) so mutating a result never corrupts the cache.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+CacheStats = namedtuple('CacheStats', ['hits', 'misses', 'evictions', 'size', 'maxsize'])
+
+def copy_query(value):
+    '''
+    Copies the documents and lists of a query (faster than copy.deepcopy, the values are immutable).
+    '''
+    if isinstance(value, dict): # and SON
+        return value.__class__((key, copy_query(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return [copy_query(item) for item in value]
+    return value
+
+class QueryCache(object):
+
+    def __init__(self, maxsize=1024, copy=copy_query):
+        if maxsize < 0:
+            raise ValueError('maxsize must be a non-negative number')
+        self.maxsize = maxsize
+        self._copy = copy
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = self._misses = self._evictions = 0
+
+    def get_or_translate(self, key, schema, translate):
+        '''
+        Returns the cached query for <key> or calls <translate>() and caches its result.
+        Errors raised by <translate> are not cached.
+        '''
+        with self._lock:
+            try:
+                _, result = self._entries[key]
+            except KeyError:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._entries.move_to_end(key)
+                return self._copy(result)
+
+        result = translate() # translate outside the lock so threads don't serialize on parsing
+        if self.maxsize == 0:
+            return result
+        with self._lock:
+            self._entries[key] = (schema, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+        return self._copy(result)
+
+    def stats(self):
+        with self._lock:
+            return CacheStats(hits=self._hits,
+                              misses=self._misses,
+                              evictions=self._evictions,
+                              size=len(self._entries),
+                              maxsize=self.maxsize)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._misses = self._evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
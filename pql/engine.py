@@ -0,0 +1,414 @@
+"""
+Runs aggregation pipelines in memory over any iterable of documents:
+
+  >>> pipeline = pql.match('price > 3') | pql.group(_id='model', total='sum(price)')
+  >>> list(pql.aggregate(pipeline, cars))
+  [{'_id': 'subaru', 'total': 5}, {'_id': 'kia', 'total': 11}]
+
+Stages are chained generators so documents stream through $match, $project,
+$unwind, $skip and $limit. $group uses a hash table keyed by the group _id and
+$sort followed by $limit keeps only the top documents (heapq.nsmallest).
+Values are compared in mongo's type order (null < numbers < strings < ...).
+"""
+import datetime
+import heapq
+import itertools
+from .aggregation import is_literal, is_number, mongo_mod, truth
+from .matching import ParseError
+from .optimizer import freeze
+from .predicate import MISSING, compile_query
+
+def _unsupported(name):
+    return ParseError('Unsupported in-memory aggregation ({0}).'.format(name),
+                      col_offset=None)
+
+#---Ordering---#
+
+TYPE_ORDER = [(type(None), 1), (int, 2), (float, 2), (str, 3), (dict, 4), (list, 5),
+              (bytes, 6), (bool, 8), (datetime.datetime, 9)]
+
+def order_key(value):
+    '''
+    Returns a key that sorts values in mongo's comparison order.
+    '''
+    if isinstance(value, bool):
+        return (8, value)
+    for cls, rank in TYPE_ORDER:
+        if isinstance(value, cls):
+            break
+    else:
+        return (7, str(value)) # ObjectId and other opaque types
+    if rank == 4:
+        return (rank, tuple((key, order_key(item)) for key, item in value.items()))
+    if rank == 5:
+        return (rank, tuple(map(order_key, value)))
+    if rank == 1:
+        return (rank, 0)
+    return (rank, value)
+
+class _Descending(object):
+    __slots__ = ('key',)
+    def __init__(self, key):
+        self.key = key
+    def __lt__(self, other):
+        return other.key < self.key
+    def __eq__(self, other):
+        return self.key == other.key
+
+#---Expressions---#
+
+def get_path(document, path, missing=None):
+    '''
+    Returns the value at the dotted <path>, mapping over arrays (mongo style) or <missing> if missing.
+    '''
+    value = document
+    for part in path.split('.'):
+        if isinstance(value, dict):
+            value = value.get(part, missing)
+            if value is missing:
+                return missing
+        elif isinstance(value, list):
+            value = [element.get(part) for element in value
+                     if isinstance(element, dict) and part in element]
+        else:
+            return missing
+    return value
+
+def set_path(document, path, value):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        document = document.setdefault(part, {})
+    document[parts[-1]] = value
+
+def _add(*args):
+    if any(arg is None for arg in args):
+        return None
+    dates = [arg for arg in args if isinstance(arg, datetime.datetime)]
+    total = sum(arg for arg in args if not isinstance(arg, datetime.datetime))
+    if dates:
+        return dates[0] + datetime.timedelta(milliseconds=total)
+    return total
+
+def _subtract(left, right):
+    if left is None or right is None:
+        return None
+    if isinstance(left, datetime.datetime):
+        if isinstance(right, datetime.datetime):
+            return int((left - right).total_seconds() * 1000)
+        return left - datetime.timedelta(milliseconds=right)
+    return left - right
+
+def _multiply(*args):
+    if any(arg is None for arg in args):
+        return None
+    result = 1
+    for arg in args:
+        result *= arg
+    return result
+
+def _null_safe(function):
+    return lambda *args: None if any(arg is None for arg in args) else function(*args)
+
+def _compare(compare):
+    return lambda left, right: compare(order_key(left), order_key(right))
+
+def _cmp(left, right):
+    left, right = order_key(left), order_key(right)
+    return (left > right) - (left < right)
+
+def _concat(*args):
+    if any(arg is None for arg in args):
+        return None
+    return ''.join(args)
+
+def _string(value):
+    '''
+    Converts <value> to a string for the string operators: null (or missing) is ''.
+    '''
+    if value is None:
+        return ''
+    return value if isinstance(value, str) else str(value)
+
+def _strcasecmp(left, right):
+    left, right = _string(left).upper(), _string(right).upper()
+    return (left > right) - (left < right)
+
+def _substr(string, start, length):
+    string = _string(string)
+    return string[start:] if length < 0 else string[start:start + length]
+
+def _date_part(function):
+    return lambda value: None if value is None else function(value)
+
+FUNCTIONS = {'$add': _add,
+             '$subtract': _subtract,
+             '$multiply': _multiply,
+             '$divide': _null_safe(lambda left, right: left / right),
+             '$mod': _null_safe(mongo_mod),
+             '$eq': _compare(lambda a, b: a == b),
+             '$ne': _compare(lambda a, b: a != b),
+             '$gt': _compare(lambda a, b: a > b),
+             '$gte': _compare(lambda a, b: a >= b),
+             '$lt': _compare(lambda a, b: a < b),
+             '$lte': _compare(lambda a, b: a <= b),
+             '$cmp': _cmp,
+             '$and': lambda *args: all(map(truth, args)),
+             '$or': lambda *args: any(map(truth, args)),
+             '$not': lambda value: not truth(value),
+             '$cond': lambda test, then, otherwise: then if truth(test) else otherwise,
+             '$ifnull': lambda value, replacement: replacement if value is None else value,
+             '$concat': _concat,
+             '$strcasecmp': _strcasecmp,
+             '$substr': _substr,
+             '$toLower': lambda value: _string(value).lower(),
+             '$toUpper': lambda value: _string(value).upper(),
+             '$dayOfYear': _date_part(lambda date: date.timetuple().tm_yday),
+             '$dayOfMonth': _date_part(lambda date: date.day),
+             '$dayOfWeek': _date_part(lambda date: (date.weekday() + 1) % 7 + 1),
+             '$year': _date_part(lambda date: date.year),
+             '$month': _date_part(lambda date: date.month),
+             '$week': _date_part(lambda date: int(date.strftime('%U'))),
+             '$hour': _date_part(lambda date: date.hour),
+             '$minute': _date_part(lambda date: date.minute),
+             '$second': _date_part(lambda date: date.second),
+             '$millisecond': _date_part(lambda date: date.microsecond // 1000)}
+
+def compile_expression(expression, missing=None):
+    '''
+    Compiles a translated aggregation <expression> to a function of a document.
+    A field reference to a missing field evaluates to <missing>.
+    '''
+    if isinstance(expression, str) and not is_literal(expression):
+        path = expression[1:]
+        return lambda document: get_path(document, path, missing)
+    if isinstance(expression, dict):
+        if len(expression) == 1 and next(iter(expression)).startswith('$'):
+            (operator, args), = expression.items()
+            if operator == '$literal':
+                return lambda document: args
+            try:
+                function = FUNCTIONS[operator]
+            except KeyError:
+                raise _unsupported(operator)
+            args = [compile_expression(arg) for arg in (args if isinstance(args, list) else [args])]
+            return lambda document: function(*[arg(document) for arg in args])
+        fields = [(key, compile_expression(value)) for key, value in expression.items()]
+        return lambda document: dict((key, value(document)) for key, value in fields)
+    return lambda document: expression
+
+#---Accumulators---#
+
+class Accumulator(object):
+    '''
+    The base of the $group accumulators: subclasses define add(value), called with the
+    argument's value for each document (MISSING for a missing field if SKIPS_MISSING, else None).
+    '''
+    __slots__ = ('value',)
+    SKIPS_MISSING = False
+    def __init__(self):
+        self.value = None
+    def result(self):
+        return self.value
+
+class Sum(Accumulator):
+    __slots__ = ()
+    def __init__(self):
+        self.value = 0
+    def add(self, value):
+        if is_number(value):
+            self.value += value
+
+class Avg(Accumulator):
+    __slots__ = ('count',)
+    def __init__(self):
+        self.value = 0
+        self.count = 0
+    def add(self, value):
+        if is_number(value):
+            self.value += value
+            self.count += 1
+    def result(self):
+        return self.value / self.count if self.count else None
+
+class Min(Accumulator):
+    __slots__ = ()
+    def add(self, value):
+        if value is not None and (self.value is None or order_key(value) < order_key(self.value)):
+            self.value = value
+
+class Max(Accumulator):
+    __slots__ = ()
+    def add(self, value):
+        if value is not None and (self.value is None or order_key(value) > order_key(self.value)):
+            self.value = value
+
+class First(Accumulator):
+    __slots__ = ('seen',)
+    def __init__(self):
+        self.value = None
+        self.seen = False
+    def add(self, value):
+        if not self.seen:
+            self.value, self.seen = value, True
+
+class Last(Accumulator):
+    __slots__ = ()
+    def add(self, value):
+        self.value = value
+
+class Push(Accumulator):
+    __slots__ = ()
+    SKIPS_MISSING = True # explicit nulls are pushed
+    def __init__(self):
+        self.value = []
+    def add(self, value):
+        if value is not MISSING:
+            self.value.append(value)
+
+class AddToSet(Accumulator):
+    __slots__ = ('seen',)
+    SKIPS_MISSING = True
+    def __init__(self):
+        self.value = []
+        self.seen = set()
+    def add(self, value):
+        if value is not MISSING:
+            key = freeze(value)
+            if key not in self.seen:
+                self.seen.add(key)
+                self.value.append(value)
+
+ACCUMULATORS = {'$sum': Sum, '$avg': Avg, '$min': Min, '$max': Max,
+                '$first': First, '$last': Last, '$push': Push, '$addToSet': AddToSet}
+
+#---Stages---#
+
+def _match(documents, query, following):
+    test = compile_query(query)
+    return (document for document in documents if test(document))
+
+def _project(documents, projection, following):
+    included = [key for key, value in projection.items() if value is True or value == 1]
+    excluded = [key for key, value in projection.items() if value is False or
+                (is_number(value) and value == 0)]
+    computed = [(key, compile_expression(value, MISSING)) for key, value in projection.items()
+                if key not in included and key not in excluded]
+    if excluded and not included and not computed:
+        def project(document):
+            document = dict(document)
+            for key in excluded:
+                document.pop(key, None)
+            return document
+    else:
+        keep_id = '_id' not in excluded and '_id' not in projection
+        def project(document):
+            result = {}
+            if keep_id and '_id' in document:
+                result['_id'] = document['_id']
+            for key in included:
+                value = get_path(document, key, MISSING)
+                if value is not MISSING:
+                    set_path(result, key, value)
+            for key, expression in computed:
+                value = expression(document)
+                if value is not MISSING:
+                    set_path(result, key, value)
+            return result
+    return map(project, documents)
+
+def _group(documents, group, following):
+    group_id = compile_expression(group['_id'])
+    accumulators = []
+    for key, value in group.items():
+        if key == '_id':
+            continue
+        (name, argument), = value.items()
+        try:
+            cls = ACCUMULATORS[name]
+        except KeyError:
+            raise _unsupported(name)
+        accumulators.append((key, cls, compile_expression(argument, MISSING if cls.SKIPS_MISSING else None)))
+    return _grouped(documents, group_id, accumulators)
+
+def _grouped(documents, group_id, accumulators):
+    groups = {}
+    for document in documents:
+        value = group_id(document)
+        key = freeze(value)
+        try:
+            _, states = groups[key]
+        except KeyError:
+            states = [cls() for _, cls, _ in accumulators]
+            groups[key] = (value, states)
+        for state, (_, _, expression) in zip(states, accumulators):
+            state.add(expression(document))
+    for value, states in groups.values():
+        result = {'_id': value}
+        for state, (key, _, _) in zip(states, accumulators):
+            result[key] = state.result()
+        yield result
+
+def _sort(documents, fields, following):
+    fields = list(fields.items())
+    def key(document):
+        return tuple(order_key(get_path(document, field)) if direction > 0 else
+                     _Descending(order_key(get_path(document, field)))
+                     for field, direction in fields)
+    # a generator, so the documents are only read (and sorted) on the first next()
+    if following and next(iter(following)) == '$limit':
+        yield from heapq.nsmallest(following['$limit'], documents, key=key)
+    else:
+        yield from sorted(documents, key=key)
+
+def _skip(documents, number, following):
+    return itertools.islice(documents, number, None)
+
+def _limit(documents, number, following):
+    return itertools.islice(documents, number)
+
+def _unwind(documents, path, following):
+    path = path[1:]
+    parts = path.split('.')
+    for document in documents:
+        values = get_path(document, path)
+        if values is None or values == []:
+            continue
+        if not isinstance(values, list):
+            yield document
+            continue
+        parent = document
+        for part in parts[:-1]:
+            parent = parent[part]
+            if not isinstance(parent, dict):
+                raise _unsupported('$unwind through the array {0}'.format(part))
+        for value in values:
+            result = dict(document)
+            container = result
+            for part in parts[:-1]: # copy the documents along the path before replacing the array
+                container[part] = dict(container[part])
+                container = container[part]
+            container[parts[-1]] = value
+            yield result
+
+STAGES = {'$match': _match,
+          '$project': _project,
+          '$group': _group,
+          '$sort': _sort,
+          '$skip': _skip,
+          '$limit': _limit,
+          '$unwind': _unwind}
+
+def run(pipeline, documents):
+    '''
+    Lazily runs the aggregation <pipeline> (a list of stages) over an iterable of <documents>.
+    '''
+    documents = iter(documents)
+    for index, stage in enumerate(pipeline):
+        (name, argument), = stage.items()
+        try:
+            function = STAGES[name]
+        except KeyError:
+            raise _unsupported(name)
+        following = pipeline[index + 1] if index + 1 < len(pipeline) else None
+        documents = function(documents, argument, following)
+    return documents
@@ -0,0 +1,261 @@
+"""
+Recommends compound indexes for a corpus of translated find() queries:
+
+  >>> advisor = IndexAdvisor()
+  >>> advisor.add(pql.find('model == "kia" and price > 3'), sort='-made_on', frequency=10)
+  >>> advisor.advise().recommendations
+  [IndexRecommendation(keys=[('model', 1), ('made_on', -1), ('price', 1)], queries=[...], frequency=10)]
+
+Every field predicate is classified as equality, $in, range, regex prefix, geo
+(GeoJSON, for a 2dsphere index), legacy geo (coordinate pairs and $box, $polygon
+or $center shapes, for a 2d index) or unindexable ($ne, $nin, $not, unanchored
+or case insensitive regex...).
+Keys follow the Equality-Sort-Range rule: equality fields first (the ones most
+queries share leading, so indexes can be shared as prefixes), then the sort
+fields, then ranges. $in counts as an equality unless the query sorts, since
+an index can't return the merged $in ranges in sort order.
+$or branches need an index each. Recommendations that are a prefix of another
+recommendation are merged into it. Queries no index can serve are reported
+separately.
+"""
+import itertools
+import re
+from collections import namedtuple
+from .optimizer import optimize
+
+EQUALITY = 'equality'
+IN = 'in'
+GEO = 'geo'
+LEGACY_GEO = 'legacy geo'
+PREFIX = 'prefix'
+RANGE = 'range'
+UNINDEXABLE = 'unindexable'
+
+KIND_RANK = {EQUALITY: 0, IN: 1, GEO: 2, LEGACY_GEO: 2, PREFIX: 3, RANGE: 4, UNINDEXABLE: 5}
+
+GEO_INDEXES = {GEO: '2dsphere', LEGACY_GEO: '2d'}
+
+IndexRecommendation = namedtuple('IndexRecommendation', ['keys', 'queries', 'frequency'])
+UnindexableQuery = namedtuple('UnindexableQuery', ['query', 'reasons', 'frequency'])
+IndexAdvice = namedtuple('IndexAdvice', ['recommendations', 'unindexable'])
+
+RANGE_OPERATORS = ('$gt', '$gte', '$lt', '$lte')
+GEO_OPERATORS = ('$near', '$nearSphere', '$geoWithin', '$geoIntersects')
+EQUALITY_OPERATORS = ('$eq', '$all', '$elemMatch')
+LEGACY_SHAPES = ('$box', '$polygon', '$center')
+
+REGEX_PREFIX = re.compile(r'^(\^|\\A)[^.*+?()\[\]{}|\\^$]')
+
+def _classify_regex(pattern, options):
+    if 'i' in options:
+        return UNINDEXABLE, 'case insensitive regex'
+    if not REGEX_PREFIX.match(pattern):
+        return UNINDEXABLE, 'unanchored regex'
+    return PREFIX, None
+
+def _classify_geo(argument):
+    '''
+    Legacy coordinate pairs (near([1, 2])) and shapes (box, polygon, center) need a 2d
+    index, GeoJSON ($geometry) a 2dsphere one.
+    '''
+    if isinstance(argument, list) or isinstance(argument, dict) and any(shape in argument
+                                                                        for shape in LEGACY_SHAPES):
+        return LEGACY_GEO
+    return GEO
+
+def _classify_operator(operator, argument, condition):
+    '''
+    Returns the (kind, reason) of a single <operator> applied to a field.
+    '''
+    if operator in EQUALITY_OPERATORS:
+        return EQUALITY, None
+    if operator == '$in':
+        return IN, None
+    if operator in RANGE_OPERATORS:
+        return RANGE, None
+    if operator in GEO_OPERATORS:
+        return _classify_geo(argument), None
+    if operator == '$regex':
+        return _classify_regex(argument, condition.get('$options', ''))
+    if operator == '$exists':
+        return (RANGE if argument else EQUALITY), None
+    return UNINDEXABLE, '{0} can\'t use an index efficiently'.format(operator)
+
+def classify_condition(condition):
+    '''
+    Returns the (kind, reason) of the <condition> applied to a field: the best
+    kind among its operators (the rest is filtered after the index scan).
+    '''
+    if not (isinstance(condition, dict) and condition and
+            all(key.startswith('$') for key in condition)):
+        return EQUALITY, None
+    kinds = [_classify_operator(operator, argument, condition)
+             for operator, argument in condition.items()
+             if operator not in ('$options', '$maxDistance')]
+    return min(kinds, key=lambda kind: KIND_RANK[kind[0]])
+
+def _plans(query):
+    '''
+    Returns the conjunctions of field predicates a translated <query> is made of:
+    one list of (field, kind, reason) per $or branch (or a single list without $or).
+    '''
+    plans = [[]]
+    for key, value in query.items():
+        if key == '$and':
+            children = [_plans(clause) for clause in value]
+        elif key == '$or':
+            children = [[plan for clause in value for plan in _plans(clause)]]
+        elif key.startswith('$'):
+            children = [[[(key, UNINDEXABLE, '{0} can\'t use an index'.format(key))]]]
+        else:
+            kind, reason = classify_condition(value)
+            children = [[[(key, kind, reason)]]]
+        for child in children:
+            plans = [plan + branch for plan, branch in itertools.product(plans, child)]
+    return plans
+
+def classify(query):
+    '''
+    Returns the list of (field, kind) predicates of a translated <query>
+    (one list per $or branch).
+    '''
+    return [[(field, kind) for field, kind, _ in plan] for plan in _plans(optimize(query))]
+
+def sort_keys(sort):
+    '''
+    Normalizes a <sort> spec: a field name or list of field names ('-' prefix
+    for descending, as in pql.sort), a pql.sort() stage or a mapping of fields
+    to directions. Returns a list of (field, direction) pairs.
+    '''
+    if not sort:
+        return []
+    if isinstance(sort, list) and len(sort) == 1 and isinstance(sort[0], dict) and '$sort' in sort[0]:
+        sort = sort[0]['$sort']
+    elif isinstance(sort, dict) and '$sort' in sort:
+        sort = sort['$sort']
+    if isinstance(sort, dict):
+        return list(sort.items())
+    if isinstance(sort, str):
+        sort = [sort]
+    keys = []
+    for field in sort:
+        if not isinstance(field, str):
+            field, direction = field
+            keys.append((field, direction))
+        elif field.startswith('-'):
+            keys.append((field[1:], -1))
+        else:
+            keys.append((field.lstrip('+'), 1))
+    return keys
+
+class _Candidate(object):
+    __slots__ = ('keys', 'equalities', 'queries', 'frequency')
+
+    def __init__(self, keys, equalities):
+        self.keys = keys
+        self.equalities = equalities
+        self.queries = []
+        self.frequency = 0
+
+    def served_by(self, other):
+        '''
+        Whether the index <other> serves every query of this index: the equality
+        fields (in any order) followed by the remaining keys are a prefix of it.
+        '''
+        if len(other.keys) < len(self.keys):
+            return False
+        if set(other.keys[:self.equalities]) != set(self.keys[:self.equalities]):
+            return False
+        return other.keys[self.equalities:len(self.keys)] == self.keys[self.equalities:]
+
+class IndexAdvisor(object):
+
+    def __init__(self):
+        self._queries = []
+
+    def add(self, query, sort=None, frequency=1, label=None):
+        '''
+        Adds a translated find <query> executed <frequency> times (e.g. per day),
+        with an optional <sort> spec (see sort_keys). <label> identifies the query
+        in the results (defaults to the query itself).
+        '''
+        self._queries.append((optimize(query), sort_keys(sort), frequency,
+                              query if label is None else label))
+
+    def advise(self):
+        '''
+        Returns an IndexAdvice: the recommended indexes (by total frequency) and
+        the queries no index can serve.
+        '''
+        equality_counts = {}
+        planned = []
+        unindexable = []
+        for query, sort, frequency, label in self._queries:
+            plans = []
+            for plan in _plans(query):
+                predicates = self._merge_predicates(plan)
+                indexable = [(field, kind) for field, (kind, _) in predicates.items() if kind != UNINDEXABLE]
+                if not indexable and not sort:
+                    reasons = [reason for kind, reason in predicates.values() if reason] or ['no predicates']
+                    unindexable.append(UnindexableQuery(label, reasons, frequency))
+                    plans = []
+                    break
+                plans.append(indexable)
+            for indexable in plans:
+                for field, kind in indexable:
+                    if kind == EQUALITY or kind == IN and not sort:
+                        equality_counts[field] = equality_counts.get(field, 0) + frequency
+                planned.append((indexable, sort, frequency, label))
+
+        candidates = {}
+        for indexable, sort, frequency, label in planned:
+            keys, equalities = self._index_keys(indexable, sort, equality_counts)
+            candidate = candidates.get(tuple(keys))
+            if candidate is None:
+                candidate = candidates[tuple(keys)] = _Candidate(keys, equalities)
+            if label not in candidate.queries:
+                candidate.queries.append(label)
+            candidate.frequency += frequency
+        return IndexAdvice(self._merge_candidates(list(candidates.values())), unindexable)
+
+    @staticmethod
+    def _merge_predicates(plan):
+        predicates = {}
+        for field, kind, reason in plan:
+            if field not in predicates or KIND_RANK[kind] < KIND_RANK[predicates[field][0]]:
+                predicates[field] = (kind, reason)
+        return predicates
+
+    @staticmethod
+    def _index_keys(indexable, sort, equality_counts):
+        '''
+        Orders the keys of an index Equality-Sort-Range.
+        Returns the keys and the number of leading equality keys.
+        '''
+        kinds = dict(indexable)
+        equalities = [field for field, kind in indexable if kind == EQUALITY or kind == IN and not sort]
+        equalities.sort(key=lambda field: (-equality_counts.get(field, 0), field))
+        keys = [(field, 1) for field in equalities]
+        keys.extend((field, GEO_INDEXES[kind]) for field, kind in indexable if kind in GEO_INDEXES)
+        sorted_keys = [(field, direction) for field, direction in sort if field not in equalities]
+        keys.extend(sorted_keys)
+        sorted_fields = set(field for field, _ in sorted_keys)
+        keys.extend((field, 1) for field, kind in indexable
+                    if kind in (RANGE, PREFIX, IN) and field not in equalities and field not in sorted_fields)
+        return keys, len(equalities)
+
+    @staticmethod
+    def _merge_candidates(candidates):
+        candidates.sort(key=lambda candidate: -len(candidate.keys))
+        kept = []
+        for candidate in candidates:
+            for other in kept:
+                if candidate.served_by(other):
+                    other.queries.extend(query for query in candidate.queries if query not in other.queries)
+                    other.frequency += candidate.frequency
+                    break
+            else:
+                kept.append(candidate)
+        kept.sort(key=lambda candidate: -candidate.frequency)
+        return [IndexRecommendation(candidate.keys, candidate.queries, candidate.frequency)
+                for candidate in kept]
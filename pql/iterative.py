@@ -0,0 +1,336 @@
+"""
+Translates huge machine generated expressions (hundreds of thousands of
+and/or terms, thousands of nested parentheses) without recursion:
+
+  >>> pql.find(' or '.join('a == {0}'.format(i) for i in range(100000)), iterative=True)
+  {'$or': [{'a': 0}, {'a': 1}, ...]}
+
+The boolean structure (and, or, not, parentheses) is scanned with a regex and
+assembled with an explicit operator stack (shunting-yard) in linear time. Only
+the comparisons between the boolean operators are parsed with ast (all at once,
+as the items of a list) and translated by the regular (schema-free or
+schema-aware) parser, so they get the same handlers and validation.
+
+Chains of the same boolean operator are flattened across parentheses:
+(a == 1 or b == 1) or c == 1 -> {'$or': [{'a': 1}, {'b': 1}, {'c': 1}]}.
+
+Expressions with few parentheses and nots can't nest deep enough to overflow
+python's parser or the recursion limit, so they're translated recursively
+(which is faster on wide expressions) and only their chains are flattened.
+
+Parenthesized operands of comparisons are supported but with the explicit stack
+a comparison can't start with a parenthesis ((a) == 1).
+"""
+import ast
+import re
+from . import limits, profiling
+from .matching import ParseError
+
+PRECEDENCE = {'or': 1, 'and': 2, 'not': 3}
+OPERATORS = {'or': '$or', 'and': '$and'}
+SHALLOW = 50 # parentheses and nots, far below what overflows ast.parse or the recursive parser
+
+class _Chain(object):
+    '''
+    An and/or of <children>, flattened into a single list by _build.
+    '''
+    __slots__ = ('key', 'children')
+
+    def __init__(self, key, children):
+        self.key = key
+        self.children = children
+
+class _Not(object):
+    __slots__ = ('operand',)
+
+    def __init__(self, operand):
+        self.operand = operand
+
+_END = object()
+
+def _build(root, queries):
+    '''
+    Converts a tree of _Chain, _Not and atom indices (into <queries>) to a query,
+    inlining nested chains of the same operator.
+    '''
+    result = []
+    stack = [(iter([root]), None, result, None)]
+    while stack:
+        children, key, values, done = stack[-1]
+        child = next(children, _END)
+        if child is _END:
+            stack.pop()
+            if done is not None:
+                done()
+        elif isinstance(child, int):
+            values.append(queries[child])
+        elif isinstance(child, _Chain):
+            if child.key == key:
+                stack.append((iter(child.children), key, values, None))
+            else:
+                nested = []
+                values.append({child.key: nested})
+                stack.append((iter(child.children), child.key, nested, None))
+        else:
+            operand = []
+            values.append(None)
+            def negate(values=values, index=len(values) - 1, operand=operand):
+                field, value = list(operand[0].items())[0] # as Parser.handle_UnaryOp
+                values[index] = {field: {'$not': value}}
+            stack.append((iter([child.operand]), None, operand, negate))
+    return result[0]
+
+def _flatten(query):
+    '''
+    Inlines the nested chains of the same operator of a recursively translated query, as _build does.
+    '''
+    if not (isinstance(query, dict) and len(query) == 1):
+        return query
+    (key, children), = query.items()
+    if key not in ('$and', '$or'):
+        return query
+    values = []
+    for child in map(_flatten, children):
+        if isinstance(child, dict) and len(child) == 1 and key in child:
+            values.extend(child[key])
+        else:
+            values.append(child)
+    return {key: values}
+
+@profiling.timed('parse')
+def _parse(string):
+    return ast.parse(string, mode='eval').body
+
+@profiling.timed('translate')
+def _translate(parser, node):
+    return parser.translate(node)
+
+def _branches(chain):
+    '''
+    Returns the children of <chain> once its nested chains of the same operator are inlined.
+    '''
+    branches = 0
+    stack = list(chain.children)
+    while stack:
+        child = stack.pop()
+        if isinstance(child, _Chain) and child.key == chain.key:
+            stack.extend(child.children)
+        else:
+            branches += 1
+    return branches
+
+def _charge(root):
+    '''
+    Charges the boolean structure of <root> to the limits (see pql.limits) before any
+    comparison is translated. Nested chains of the same operator count as deeper, but
+    the branches of an or are counted once flattened (as pql.limits.check does).
+    '''
+    stack = [(root, 1, None)]
+    while stack:
+        node, depth, parent = stack.pop()
+        if isinstance(node, _Chain):
+            branches = _branches(node) if node.key == '$or' and parent != '$or' else 0
+            limits.boolean(None, depth, branches)
+            stack.extend((child, depth + 1, node.key) for child in node.children)
+        elif isinstance(node, _Not):
+            limits.boolean(None, depth, 0)
+            stack.append((node.operand, depth + 1, None))
+
+# the tokens that matter for the boolean structure; strings and comments are matched
+# so their contents aren't mistaken for keywords or brackets. other names, numbers
+# and operators are skipped by the regex engine instead of the scanning loop.
+STRING = r'[rRbBuUfF]{0,2}(?:' + '|'.join([r"'''(?:[^'\\]|\\.|'(?!''))*'''",
+                                            r'"""(?:[^"\\]|\\.|"(?!""))*"""',
+                                            r"'(?:[^'\\\n]|\\.)*'",
+                                            r'"(?:[^"\\\n]|\\.)*"']) + ')'
+TOKENS = re.compile('|'.join([STRING,
+                              r'\#[^\n]*',
+                              r'(?P<name>\b(?:and|or|not)\b)',
+                              r'(?P<bracket>[()\[\]{}])']))
+
+class _Translator(object):
+
+    def __init__(self, parser, string, memo=None):
+        self._parser = parser
+        self._string = string
+        self._memo = memo # comparison source -> query, reused across translations (see pql.session)
+        self._atoms = [] # (start, end) offsets of the comparisons
+        self._operands = []
+        self._operators = [] # (operator, offset)
+
+    def _column(self, offset):
+        return offset - self._string.rfind('\n', 0, offset) - 1
+
+    def _error(self, message, offset):
+        return ParseError(message, col_offset=None if offset is None else self._column(offset))
+
+    @profiling.timed('parse')
+    def _parse_atoms(self, atoms):
+        '''
+        Parses all the comparisons at once as the items of a list (one per line).
+        '''
+        sources = [self._string[start:end] for start, end in atoms]
+        try:
+            items = ast.parse('[\n{0}\n]'.format(',\n'.join(sources)), mode='eval').body.elts
+            if len(items) == len(sources):
+                return items
+        except SyntaxError:
+            pass
+        items = [] # parse one by one to report the right error
+        for source, (start, _) in zip(sources, atoms):
+            try:
+                items.append(ast.parse(source, mode='eval').body)
+            except SyntaxError as e:
+                raise self._error('Invalid syntax: {0}'.format(e.msg), start + (e.offset or 1) - 1)
+        return items
+
+    @profiling.timed('translate')
+    def _translate_atoms(self, nodes, atoms):
+        queries = []
+        checked = limits.active
+        for node, (start, end) in zip(nodes, atoms):
+            try:
+                if checked:
+                    limits.check(node)
+                queries.append(self._parser.handle(node))
+            except ParseError as e:
+                if e.col_offset is not None and '\n' not in self._string[start:end]:
+                    e.col_offset += self._column(start)
+                raise
+        return queries
+
+    def _queries(self, atoms):
+        nodes = self._parse_atoms(atoms)
+        if profiling.active:
+            profiling.count_nodes(nodes)
+        return self._translate_atoms(nodes, atoms)
+
+    def _memoized_queries(self):
+        '''
+        Translates only the comparisons missing from the memo.
+        '''
+        memo = self._memo
+        sources = [self._string[start:end] for start, end in self._atoms]
+        missing = dict((source, atom) for source, atom in zip(sources, self._atoms) if source not in memo)
+        for source in sources:
+            if source not in missing:
+                memo.move_to_end(source) # a hit: the memo evicts the least recently used
+        if missing:
+            memo.update(zip(missing, self._queries(list(missing.values()))))
+        return [memo[source] for source in sources]
+
+    def _reduce(self):
+        operator, offset = self._operators.pop()
+        if operator == 'not':
+            self._operands.append(_Not(self._operands.pop()))
+            return
+        right = self._operands.pop()
+        left = self._operands.pop()
+        key = OPERATORS[operator]
+        if isinstance(left, _Chain) and left.key == key:
+            left.children.append(right)
+            self._operands.append(left)
+        else:
+            self._operands.append(_Chain(key, [left, right]))
+
+    def _reduce_while(self, precedence):
+        while self._operators and self._operators[-1][0] != '(' and \
+              PRECEDENCE[self._operators[-1][0]] >= precedence:
+            self._reduce()
+
+    def _end_atom(self, start, end):
+        source = self._string[start:end]
+        start += len(source) - len(source.lstrip())
+        end -= len(source) - len(source.rstrip())
+        if start >= end:
+            raise self._error('Invalid syntax (missing comparison).', start)
+        self._operands.append(len(self._atoms))
+        self._atoms.append((start, end))
+
+    def translate(self):
+        string = self._string
+        expect_operand = True
+        atom_start = None # offset of the current comparison
+        boundary = 0 # end of the last boolean operator, parenthesis or comparison
+        depth = 0 # brackets opened inside the current comparison
+        for match in TOKENS.finditer(string):
+            kind = match.lastgroup
+            if kind is None:
+                continue
+            name = bracket = None
+            if kind == 'name':
+                name = match.group()
+            else:
+                bracket = match.group()
+            if atom_start is None and expect_operand and string[boundary:match.start()].strip():
+                atom_start = boundary # e.g. -(a) == 1
+            if atom_start is not None:
+                if depth > 0 or not (name in OPERATORS or bracket == ')'):
+                    if bracket is not None:
+                        depth += 1 if bracket in '([{' else -1
+                    continue
+                self._end_atom(atom_start, match.start())
+                atom_start = None
+                boundary = match.start()
+                expect_operand = False
+            if expect_operand:
+                if bracket == '(' or name == 'not':
+                    self._operators.append((name or bracket, match.start()))
+                elif bracket == ')' or name in OPERATORS:
+                    raise self._error('Invalid syntax (missing comparison).', match.start())
+                else:
+                    atom_start = match.start()
+                    depth = 1 if bracket is not None and bracket in '[{' else 0
+                    continue
+            elif string[boundary:match.start()].strip():
+                raise self._error('Invalid syntax.', boundary)
+            elif name in OPERATORS:
+                self._reduce_while(PRECEDENCE[name])
+                self._operators.append((name, match.start()))
+                expect_operand = True
+            elif bracket == ')':
+                self._close(match.start())
+            else:
+                raise self._error('Invalid syntax ({0}).'.format(match.group()), match.start())
+            boundary = match.end()
+        rest = string[boundary:].strip()
+        if atom_start is not None or expect_operand and rest:
+            if depth > 0:
+                raise self._error('Unbalanced brackets.', atom_start)
+            self._end_atom(boundary if atom_start is None else atom_start, len(string))
+        elif expect_operand:
+            raise self._error('Invalid syntax (unexpected end of expression).', None)
+        elif rest:
+            raise self._error('Invalid syntax.', boundary)
+        self._reduce_while(0)
+        if self._operators:
+            raise self._error('Unbalanced parentheses.', self._operators[-1][1])
+        root = self._operands.pop()
+        if limits.active:
+            _charge(root)
+        queries = self._queries(self._atoms) if self._memo is None else self._memoized_queries()
+        return _build(root, queries)
+
+    def _close(self, offset):
+        self._reduce_while(0)
+        if not self._operators:
+            raise self._error('Unbalanced parentheses.', offset)
+        self._operators.pop()
+
+def parse(parser, string, memo=None):
+    '''
+    Translates <string> with <parser> (a matching.Parser), walking and/or/not iteratively.
+    The queries of comparisons found in the OrderedDict <memo> (by source) are reused and
+    moved to its end and the others are added to it, so it's in least recently used order.
+    Without a <memo>, shallow expressions (see SHALLOW) are translated recursively.
+    '''
+    if memo is None and string.count('(') + string.count('not') < SHALLOW:
+        try:
+            node = _parse(string)
+        except SyntaxError:
+            pass # the explicit stack reports it as a ParseError
+        else:
+            if profiling.active:
+                profiling.count_nodes([node])
+            return _flatten(_translate(parser, node))
+    return _Translator(parser, string, memo).translate()
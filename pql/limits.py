@@ -0,0 +1,366 @@
+"""
+Rejects pathological (e.g. user supplied) expressions while they're translated:
+
+  >>> limits = pql.Limits(max_in=100, anchored_regex=True)
+  >>> pql.find('model in ["kia", "fiat"] and name == regex("^a")', limits=limits)
+  {'$and': [{'model': {'$in': ['kia', 'fiat']}}, {'name': {'$regex': '^a'}}]}
+  >>> pql.find('name == regex("a")', limits=limits)
+  LimitExceeded: Limit exceeded: unanchored regex (a). options: ['^a']
+  >>> pql.cost('model in ["kia", "fiat"] and name == regex("^a")')
+  Cost(nodes=6, depth=1, values=2, branches=0, vertices=0, regexes=1)
+
+A Limits policy bounds:
+- max_length: the length of the expression (checked before it's parsed).
+- max_nodes: the nodes of the query: boolean operators, comparisons, function
+  calls, the values of lists (including shapes' coordinates) and the entries of
+  documents.
+- max_depth: the nesting of and/or/not.
+- max_in: the values of a list, e.g. of an `in` (or `not in`) or all([...]).
+- max_or: the branches of an `or`, including those of the ors nested in it
+  ((a or b) or c has 3) since iterative=True and the optimizer flatten them.
+- max_vertices: the vertices of a geo shape.
+- max_regex_length, safe_regex (no nested unbounded quantifiers such as (a+)+,
+  no alternation repeated without bound such as (a|ab)* since its branches
+  could overlap (use a character class: [ab]*) and no backreferences, which
+  backtrack catastrophically) and anchored_regex
+  (regexes start with ^ or \\A, so an index can serve them).
+None (or False) disables a limit.
+
+The parsed expression is checked in a single walk before it's translated (so
+the handlers translating it have no hooks) and a violation stops right away:
+e.g. a 1M values `in` list isn't converted and the branches of a huge `or`
+aren't visited. Violations raise LimitExceeded, a ParseError with the limit,
+the value, the maximum and the Cost so far.
+
+A prepared query (pql.prepare(..., limits=limits)) is checked when it's
+prepared and the values bound to its regex and list (e.g. `in :ids`)
+parameters are checked on every bind.
+"""
+import ast
+import re
+import threading
+from collections import namedtuple
+
+active = 0 # the number of translations being checked (in any thread)
+_lock = threading.Lock()
+_local = threading.local()
+
+Cost = namedtuple('Cost', ['nodes', 'depth', 'values', 'branches', 'vertices', 'regexes'])
+
+DESCRIPTIONS = {'max_length': 'expression length',
+                'max_nodes': 'nodes',
+                'max_depth': 'depth',
+                'max_in': 'values in a list',
+                'max_or': 'branches of an or',
+                'max_vertices': 'vertices of a shape',
+                'max_regex_length': 'regex length'}
+
+SHAPES = {'LineString': 1, 'Polygon': 2, 'box': 1, 'polygon': 1} # calls -> the nesting of their points
+
+class Limits(object):
+    '''
+    A policy of translation limits (see the module's documentation).
+    '''
+    __slots__ = ('max_length', 'max_nodes', 'max_depth', 'max_in', 'max_or', 'max_vertices',
+                 'max_regex_length', 'safe_regex', 'anchored_regex')
+
+    def __init__(self, max_length=10000, max_nodes=10000, max_depth=20, max_in=1000, max_or=100,
+                 max_vertices=1000, max_regex_length=1000, safe_regex=True, anchored_regex=False):
+        self.max_length = max_length
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.max_in = max_in
+        self.max_or = max_or
+        self.max_vertices = max_vertices
+        self.max_regex_length = max_regex_length
+        self.safe_regex = safe_regex
+        self.anchored_regex = anchored_regex
+
+    def key(self):
+        '''
+        Returns the limits as a tuple (e.g. for cache keys).
+        '''
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def translate(self, parse, expression):
+        '''
+        Returns the query of parse(<expression>) and its Cost, checking the limits
+        while it's translated. Raises LimitExceeded.
+        '''
+        global active
+        budget = _Budget(self)
+        budget.check('max_length', len(expression), None)
+        previous = getattr(_local, 'budget', None)
+        _local.budget = budget
+        with _lock:
+            active += 1
+        try:
+            query = parse(expression)
+        finally:
+            with _lock:
+                active -= 1
+            _local.budget = previous
+        return query, budget.cost()
+
+    def check_bound(self, cost, operator, value, col_offset):
+        '''
+        Checks a <value> bound to a $regex or list (e.g. $in) parameter of a prepared query
+        whose expression had <cost>. Raises LimitExceeded.
+        '''
+        budget = _Budget(self, cost)
+        if operator == '$regex':
+            _regex(budget, col_offset, value)
+        else:
+            _values(budget, col_offset, len(value))
+
+    def check_query(self, query, cost):
+        '''
+        Checks the branches of the ors of the translated <query> (e.g. once optimizing
+        flattened nested ors), whose translation had <cost>. Raises LimitExceeded.
+        '''
+        if self.max_or is None:
+            return
+        branches = _max_branches(query)
+        if branches > self.max_or:
+            _exceeded(self, 'max_or', branches, None, cost)
+
+    def __repr__(self):
+        return 'Limits({0})'.format(', '.join('{0}={1!r}'.format(name, getattr(self, name))
+                                              for name in self.__slots__))
+
+UNLIMITED = Limits(**dict((name, None) for name in Limits.__slots__))
+
+class _Budget(object):
+    '''
+    The cost of a translation so far, checked against its limits.
+    '''
+    __slots__ = ('limits', 'nodes', 'max_depth', 'values', 'branches', 'vertices', 'regexes')
+
+    def __init__(self, limits, cost=None):
+        self.limits = limits
+        if cost is None:
+            self.nodes = self.max_depth = self.values = self.branches = self.vertices = self.regexes = 0
+        else:
+            (self.nodes, self.max_depth, self.values, self.branches, self.vertices,
+             self.regexes) = cost
+
+    def cost(self):
+        return Cost(self.nodes, self.max_depth, self.values, self.branches, self.vertices, self.regexes)
+
+    def exceeded(self, limit, value, col_offset, message=None, options=()):
+        _exceeded(self.limits, limit, value, col_offset, self.cost(), message, options)
+
+    def check(self, limit, value, col_offset):
+        maximum = getattr(self.limits, limit)
+        if maximum is not None and value > maximum:
+            self.exceeded(limit, value, col_offset)
+
+    def charge(self, col_offset, nodes=1):
+        self.nodes += nodes
+        self.check('max_nodes', self.nodes, col_offset)
+
+    def boolean(self, col_offset, depth, branches):
+        self.charge(col_offset)
+        self.max_depth = max(self.max_depth, depth)
+        self.check('max_depth', depth, col_offset)
+        if branches:
+            self.check('max_or', branches, col_offset)
+            self.branches += branches
+
+def _exceeded(limits, limit, value, col_offset, cost, message=None, options=()):
+    from .matching import LimitExceeded
+    maximum = getattr(limits, limit)
+    if message is None:
+        message = 'Limit exceeded: {0} ({1} > {2}).'.format(DESCRIPTIONS[limit], value, maximum)
+    raise LimitExceeded(message, col_offset, limit, value, maximum, cost, list(options))
+
+def _max_branches(query):
+    '''
+    Returns the branches of the largest $or of the translated <query>.
+    '''
+    branches = 0
+    stack = [query]
+    while stack:
+        for key, value in stack.pop().items():
+            if key in ('$and', '$or', '$nor') and isinstance(value, list):
+                if key == '$or':
+                    branches = max(branches, len(value))
+                stack.extend(clause for clause in value if isinstance(clause, dict))
+    return branches
+
+def _budget():
+    return getattr(_local, 'budget', None)
+
+def _col_offset(node):
+    return getattr(node, 'col_offset', None)
+
+#---Hooks---#
+# called once per translation when (and only when) `active` is set
+
+def boolean(col_offset, depth, branches):
+    '''
+    Charges an and/or/not at <depth> with <branches> (for an or).
+    '''
+    budget = _budget()
+    if budget is not None:
+        budget.boolean(col_offset, depth, branches)
+
+def check(tree, depth=0):
+    '''
+    Charges and checks the parsed expression <tree> (at boolean <depth>) before it's
+    translated, walking it in the order it's translated.
+    '''
+    budget = _budget()
+    if budget is None:
+        return
+    stack = [(tree, depth)]
+    nested = set() # the ors whose branches were counted with an enclosing or's
+    while stack:
+        node, depth = stack.pop()
+        kind = node.__class__.__name__
+        if kind == 'BoolOp' or (kind == 'UnaryOp' and node.op.__class__.__name__ == 'Not'):
+            depth += 1
+            branches = _or_branches(node, nested) if _is_or(node) and id(node) not in nested else 0
+            budget.boolean(_col_offset(node), depth, branches)
+        elif kind == 'Compare':
+            budget.charge(_col_offset(node))
+        elif kind == 'Call':
+            budget.charge(_col_offset(node))
+            name = getattr(node.func, 'id', None)
+            if node.args and name == 'regex':
+                _regex(budget, _col_offset(node), getattr(node.args[0], 's', None))
+            elif node.args and name in SHAPES:
+                _vertices(budget, node, _count_points(node.args[0], SHAPES[name]))
+        elif kind in ('List', 'Tuple', 'Set'):
+            _values(budget, _col_offset(node), len(node.elts))
+        elif kind == 'Dict':
+            budget.charge(_col_offset(node), len(node.keys))
+        stack.extend((child, depth) for child in reversed(list(ast.iter_child_nodes(node))))
+
+def _is_or(node):
+    return node.__class__.__name__ == 'BoolOp' and node.op.__class__.__name__ == 'Or'
+
+def _or_branches(node, nested):
+    '''
+    Returns the branches of the or <node> with the ors nested in it flattened, adding those to <nested>.
+    '''
+    branches = 0
+    stack = list(node.values)
+    while stack:
+        value = stack.pop()
+        if _is_or(value):
+            nested.add(id(value))
+            stack.extend(value.values)
+        else:
+            branches += 1
+    return branches
+
+def _values(budget, col_offset, count):
+    '''
+    Charges the <count> values of a list (e.g. of an `in`) at <col_offset>.
+    '''
+    budget.check('max_in', count, col_offset)
+    budget.values += count
+    budget.charge(col_offset, count)
+
+def _count_points(node, depth):
+    elts = getattr(node, 'elts', None)
+    if elts is None:
+        return 0
+    if depth == 1:
+        return len(elts)
+    return sum(_count_points(elt, depth - 1) for elt in elts)
+
+def _vertices(budget, node, count):
+    '''
+    Checks the <count> vertices of the shape call <node>. Their coordinates are
+    charged as list values.
+    '''
+    budget.check('max_vertices', count, _col_offset(node))
+    budget.vertices += count
+
+UNBOUNDED_QUANTIFIER = re.compile(r'[*+]|\{\d*,\}')
+
+def _repeated_alternation(pattern):
+    '''
+    Returns whether a group of <pattern> containing a | is repeated without bound. It's
+    checked on the source since sre_parse turns e.g. (a|a) into a character class.
+    '''
+    groups = [False] # whether each open group (and the whole pattern) contains a |
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == '\\':
+            index += 1
+        elif char == '[':
+            index += 1
+            if pattern.startswith('^', index):
+                index += 1
+            if pattern.startswith(']', index): # a leading ] is literal
+                index += 1
+            while index < len(pattern) and pattern[index] != ']':
+                index += 2 if pattern[index] == '\\' else 1
+        elif char == '(':
+            groups.append(False)
+        elif char == ')' and len(groups) > 1:
+            alternation = groups.pop()
+            if alternation and UNBOUNDED_QUANTIFIER.match(pattern, index + 1):
+                return True
+            groups[-1] = groups[-1] or alternation
+        elif char == '|':
+            groups[-1] = True
+        index += 1
+    return False
+
+def _unsafe_regex(pattern):
+    '''
+    Returns why backtracking on <pattern> could explode (or None): a quantifier
+    applied to an unbounded quantifier, a repeated alternation or a backreference.
+    '''
+    try:
+        from re import _parser as sre_parse # python 3.11
+    except ImportError:
+        import sre_parse
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception as e: # re.error, or e.g. RecursionError
+        return 'invalid regex: {0}'.format(e)
+    repeats = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+    stack = [(parsed, False)] # (items, inside a repeat)
+    while stack:
+        items, repeated = stack.pop()
+        for op, av in items:
+            if op in repeats:
+                low, high, sub = av
+                if repeated and high == sre_parse.MAXREPEAT:
+                    return 'nested quantifiers'
+                stack.append((sub, repeated or high > 1))
+            elif op == sre_parse.GROUPREF or op == sre_parse.GROUPREF_EXISTS:
+                return 'backreference'
+            elif op == sre_parse.SUBPATTERN:
+                stack.append((av[-1], repeated))
+            elif op == sre_parse.BRANCH:
+                stack.extend((branch, repeated) for branch in av[1])
+            elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+                stack.append((av[1], repeated))
+    if _repeated_alternation(pattern):
+        return 'repeated alternation'
+    return None
+
+def _regex(budget, col_offset, pattern):
+    '''
+    Checks the <pattern> of a regex call at <col_offset>.
+    '''
+    if not isinstance(pattern, str): # e.g. a prepared query's parameter, checked when bound
+        return
+    limits = budget.limits
+    budget.regexes += 1
+    budget.check('max_regex_length', len(pattern), col_offset)
+    if limits.anchored_regex and not pattern.startswith(('^', '\\A')):
+        budget.exceeded('anchored_regex', pattern, col_offset,
+                        'Limit exceeded: unanchored regex ({0}).'.format(pattern), ['^' + pattern])
+    if limits.safe_regex:
+        reason = _unsafe_regex(pattern)
+        if reason is not None:
+            budget.exceeded('safe_regex', pattern, col_offset,
+                            'Limit exceeded: unsafe regex, {0} ({1}).'.format(reason, pattern))
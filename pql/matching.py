@@ -19,42 +19,161 @@ currently unsupported:
 2. geospatial
 """
 import ast
-import bson
 import datetime
-import dateutil.parser
-from calendar import timegm
-
-
+import functools
+import re
+from . import limits, profiling
+# bson, dateutil and calendar are imported on first use to keep `import pql` fast
+
+# YYYY-M-D[( |T)HH:MM[:SS[.ffffff]]], without a timezone
+DATE_PATTERN = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})'
+                          r'(?:[ T](\d{1,2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?)?$')
+
+@functools.lru_cache(maxsize=1024)
+def parse_date_string(string):
+    '''
+    Parses the common (documented and naive ISO-8601) forms with a regex and
+    anything else with dateutil. Results are memoized (datetimes are immutable).
+    '''
+    match = DATE_PATTERN.match(string)
+    if match is not None:
+        year, month, day, hour, minute, second, fraction = match.groups()
+        try:
+            return datetime.datetime(int(year), int(month), int(day),
+                                     int(hour or 0), int(minute or 0), int(second or 0),
+                                     int((fraction or '0').ljust(6, '0')))
+        except ValueError:
+            pass # let dateutil report the error
+    import dateutil.parser
+    return dateutil.parser.parse(string)
+
+@profiling.hooked('dates')
 def parse_date(node):
     if hasattr(node, 'n'): # it's a number!
         return datetime.datetime.fromtimestamp(node.n)
     try:
-        return dateutil.parser.parse(node.s)
+        return parse_date_string(node.s)
     except Exception as e:
         raise ParseError('Error parsing date: ' + str(e), col_offset=node.col_offset)
 
-class AstHandler(object):
+@profiling.hooked('dates')
+def parse_date_value(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.datetime.fromtimestamp(value)
+    if isinstance(value, str):
+        return parse_date_string(value)
+    raise TypeError('expected a date, got {0}'.format(value.__class__.__name__))
+
+@profiling.hooked('ids')
+def object_id(string):
+    from bson import ObjectId
+    return ObjectId(string)
+
+@profiling.hooked('ids')
+def object_ids(strings):
+    from bson import ObjectId
+    return [ObjectId(string) for string in strings]
+
+class Parameter(ast.AST):
+    '''
+    A `:name` placeholder of a prepared expression (see pql.prepare).
+    '''
+    _fields = ('id',)
+    _attributes = ('lineno', 'col_offset')
+
+class Placeholder(object):
+    '''
+    Stands for a parameter value in a translated query until it's bound.
+    <field> validates and converts the bound value.
+    '''
+    __slots__ = ('name', 'field', 'col_offset')
+
+    def __init__(self, name, field, col_offset=None):
+        self.name = name
+        self.field = field
+        self.col_offset = col_offset
+
+    def bind(self, values):
+        try:
+            value = values[self.name]
+        except KeyError:
+            raise ParseError('Missing value for parameter :{0}'.format(self.name),
+                             col_offset=self.col_offset)
+        try:
+            return self.field.coerce(value)
+        except (TypeError, ValueError) as e:
+            raise ParseError('Invalid value for parameter :{0}: {1}'.format(self.name, e),
+                             col_offset=self.col_offset)
+
+    def __repr__(self):
+        return '<Placeholder :{0}>'.format(self.name)
+
+class HandlerTable(type):
+    '''
+    Collects the handle_<name> methods of a handler class (including inherited ones)
+    into a dispatch table when the class is created, so dispatching a node costs
+    a single dict lookup instead of building a method name and calling getattr.
+    '''
+    PREFIX = 'handle_'
+    BULK_PREFIX = 'bulk_'
+    HIDDEN = frozenset(['Parameter']) # dispatched, but placeholders are not offered as options
+
+    def __init__(cls, name, bases, namespace):
+        super(HandlerTable, cls).__init__(name, bases, namespace)
+        cls._handlers = dict((attr[len(cls.PREFIX):], getattr(cls, attr))
+                             for attr in dir(cls) if attr.startswith(cls.PREFIX))
+        cls._options = sorted(name for name in cls._handlers if name not in cls.HIDDEN)
+        # bulk_<name> converts a list of <name> nodes at once. it's ignored when a subclass
+        # overrides handle_<name> without overriding bulk_<name>, so the two never disagree.
+        cls._bulk_handlers = dict((node_type, getattr(cls, cls.BULK_PREFIX + node_type))
+                                  for node_type in cls._handlers
+                                  if hasattr(cls, cls.BULK_PREFIX + node_type) and
+                                  issubclass(cls._owner(cls.BULK_PREFIX + node_type),
+                                             cls._owner(cls.PREFIX + node_type)))
+
+    def _owner(cls, attr):
+        return next(klass for klass in cls.__mro__ if attr in klass.__dict__)
+
+class AstHandler(object, metaclass=HandlerTable):
+    __slots__ = ()
 
     def get_options(self):
-        return [f.replace('handle_', '') for f in dir(self) if f.startswith('handle_')]
+        return list(self._options)
+
+    def unsupported(self, thing):
+        raise ParseError('Unsupported syntax ({0}).'.format(thing.__class__.__name__),
+                         col_offset=thing.col_offset if hasattr(thing, 'col_offset') else None,
+                         options=self.get_options())
 
     def resolve(self, thing):
-        thing_name = thing.__class__.__name__
         try:
-            handler = getattr(self, 'handle_' + thing_name)
-        except AttributeError:
-            raise ParseError('Unsupported syntax ({0}).'.format(thing_name,
-                                                              self.get_options()),
-                             col_offset=thing.col_offset if hasattr(thing, 'col_offset') else None,
-                             options=self.get_options())
-        return handler
+            handler = self._handlers[thing.__class__.__name__]
+        except KeyError:
+            self.unsupported(thing)
+        return handler.__get__(self)
 
     def handle(self, thing):
-        return self.resolve(thing)(thing)
+        try:
+            handler = self._handlers[thing.__class__.__name__]
+        except KeyError:
+            self.unsupported(thing)
+        return handler(self, thing)
 
     def parse(self, string):
+        if profiling.active and profiling.enabled():
+            return profiling.translate(self.__class__.__name__, string, profiling.parse, self, string)
         ex = ast.parse(string, mode='eval')
-        return self.handle(ex.body)
+        return self.translate(ex.body)
+
+    def translate(self, node):
+        '''
+        Translates a parsed expression, checking it first if limits are enforced (see pql.limits).
+        '''
+        if limits.active:
+            limits.check(node)
+        return self.handle(node)
 
 class ParseError(Exception):
     def __init__(self, message, col_offset, options=[]):
@@ -62,12 +181,31 @@ class ParseError(Exception):
         self.message = message
         self.col_offset = col_offset
         self.options = options
+    def __reduce__(self): # picklable, e.g. to come back from pql.batch's worker processes
+        return (ParseError, (self.message, self.col_offset, list(self.options)))
     def __str__(self):
         if self.options:
             return '{0} options: {1}'.format(self.message, self.options)
         return self.message
 
+class LimitExceeded(ParseError):
+    '''
+    An expression exceeding a <limit> of a pql.Limits policy: its <value>, the <maximum>
+    allowed and the <cost> (a pql.limits.Cost) of the translation until it was stopped.
+    '''
+    def __init__(self, message, col_offset, limit, value, maximum, cost, options=[]):
+        super(LimitExceeded, self).__init__(message, col_offset, options)
+        self.limit = limit
+        self.value = value
+        self.maximum = maximum
+        self.cost = cost
+    def __reduce__(self):
+        return (LimitExceeded, (self.message, self.col_offset, self.limit, self.value, self.maximum,
+                                self.cost, list(self.options)))
+
 class Parser(AstHandler):
+    __slots__ = ('_operator_map',)
+
     def __init__(self, operator_map):
         self._operator_map = operator_map
 
@@ -103,14 +241,19 @@ class Parser(AstHandler):
                                          right=compare.comparators[0])
 
 class SchemaFreeParser(Parser):
+    __slots__ = ()
     def __init__(self):
         super(SchemaFreeParser, self).__init__(SchemaFreeOperatorMap())
 
 class SchemaAwareParser(Parser):
-    def __init__(self, *a, **k):
-        super(SchemaAwareParser, self).__init__(SchemaAwareOperatorMap(*a, **k))
+    __slots__ = ()
+    def __init__(self, field_to_type):
+        if not isinstance(field_to_type, OperatorMap): # compiled schemas (pql.Schema) are operator maps
+            field_to_type = SchemaAwareOperatorMap(field_to_type)
+        super(SchemaAwareParser, self).__init__(field_to_type)
 
 class FieldName(AstHandler):
+    __slots__ = ()
     def handle_Str(self, node):
         return node.s
     def handle_Name(self, name):
@@ -119,21 +262,25 @@ class FieldName(AstHandler):
         return '{0}.{1}'.format(self.handle(attr.value), attr.attr)
 
 class OperatorMap(object):
+    __slots__ = ()
+    def get_options(self):
+        return None
     def resolve_field(self, node):
-        return FieldName().handle(node)
+        return FIELD_NAME.handle(node)
     def handle(self, operator, left, right):
         field = self.resolve_field(left)
         return {field: self.resolve_type(field).handle_operator_and_right(operator, right)}
 
 class SchemaFreeOperatorMap(OperatorMap):
-    def get_options(self):
-        return None
+    __slots__ = ()
     def resolve_type(self, field):
-        return GenericField()
+        return GENERIC_FIELD
 
 class SchemaAwareOperatorMap(OperatorMap):
+    __slots__ = ('_field_to_type',)
     def __init__(self, field_to_type):
         self._field_to_type = field_to_type
+    @profiling.hooked('schema')
     def resolve_field(self, node):
         field = super(SchemaAwareOperatorMap, self).resolve_field(node)
         try:
@@ -150,6 +297,7 @@ class SchemaAwareOperatorMap(OperatorMap):
 #---Function-Handlers---#
 
 class Func(AstHandler):
+    __slots__ = ()
 
     @staticmethod
     def get_arg(node, index):
@@ -164,86 +312,97 @@ class Func(AstHandler):
 
     def handle(self, node):
         try:
-            handler = getattr(self, 'handle_' + node.func.id)
-        except AttributeError:
+            handler = self._handlers[node.func.id]
+        except KeyError:
             raise ParseError('Unsupported function ({0}).'.format(node.func.id),
                              col_offset=node.col_offset,
                              options=self.get_options())
-        return handler(node)
+        return handler(self, node)
 
     def handle_exists(self, node):
-        return {'$exists': self.parse_arg(node, 0, BoolField())}
+        return {'$exists': self.parse_arg(node, 0, BOOL_FIELD)}
 
     def handle_type(self, node):
-        return {'$type': self.parse_arg(node, 0, IntField())}
+        return {'$type': self.parse_arg(node, 0, INT_FIELD)}
 
 class StringFunc(Func):
+    __slots__ = ()
     def handle_regex(self, node):
-        result = {'$regex': self.parse_arg(node, 0, StringField())}
+        result = {'$regex': self.parse_arg(node, 0, STRING_FIELD)}
         try:
-            result['$options'] = self.parse_arg(node, 1, StringField())
+            result['$options'] = self.parse_arg(node, 1, STRING_FIELD)
         except ParseError:
             pass
         return result
 
 class IntFunc(Func):
+    __slots__ = ()
     def handle_mod(self, node):
-        return {'$mod': [self.parse_arg(node, 0, IntField()),
-                         self.parse_arg(node, 1, IntField())]}
+        return {'$mod': [self.parse_arg(node, 0, INT_FIELD),
+                         self.parse_arg(node, 1, INT_FIELD)]}
 
 class ListFunc(Func):
+    __slots__ = ()
     def handle_size(self, node):
-        return {'$size': self.parse_arg(node, 0, IntField())}
+        return {'$size': self.parse_arg(node, 0, INT_FIELD)}
 
     def handle_all(self, node):
-        return {'$all': self.parse_arg(node, 0, ListField())}
+        return {'$all': self.parse_arg(node, 0, LIST_FIELD)}
 
     def handle_match(self, node):
-        return {'$elemMatch': self.parse_arg(node, 0, DictField())}
+        return {'$elemMatch': self.parse_arg(node, 0, DICT_FIELD)}
 
 class DateTimeFunc(Func):
+    __slots__ = ()
     def handle_date(self, node):
-        return parse_date(self.get_arg(node, 0))
+        arg = self.get_arg(node, 0)
+        if isinstance(arg, Parameter): # the bound value is converted as a date
+            return DATETIME_FIELD.handle_Parameter(arg)
+        return parse_date(arg)
 
 class IdFunc(Func):
+    __slots__ = ()
     def handle_id(self, node):
-        return self.parse_arg(node, 0, IdField())
+        return self.parse_arg(node, 0, ID_FIELD)
 
 class EpochFunc(Func):
+    __slots__ = ()
     def handle_epoch(self, node):
-        return self.parse_arg(node, 0, EpochField())
+        return self.parse_arg(node, 0, EPOCH_FIELD)
 
 class EpochUTCFunc(Func):
+    __slots__ = ()
     def handle_epoch_utc(self, node):
-        return self.parse_arg(node, 0, EpochUTCField())
+        return self.parse_arg(node, 0, EPOCH_UTC_FIELD)
 
 class GeoShapeFuncParser(Func):
+    __slots__ = ()
 
     def handle_Point(self, node):
         return {'$geometry':
                 {'type': 'Point',
-                 'coordinates': [self.parse_arg(node, 0, IntField()),
-                                                  self.parse_arg(node, 1, IntField())]}}
+                 'coordinates': [self.parse_arg(node, 0, INT_FIELD),
+                                                  self.parse_arg(node, 1, INT_FIELD)]}}
 
     def handle_LineString(self, node):
         return {'$geometry':
                 {'type': 'LineString',
-                 'coordinates': self.parse_arg(node, 0, ListField(ListField(IntField())))}}
+                 'coordinates': self.parse_arg(node, 0, INT_LIST_LIST_FIELD)}}
 
     def handle_Polygon(self, node):
         return {'$geometry':
                 {'type': 'Polygon',
-                'coordinates': self.parse_arg(node, 0, ListField(ListField(ListField(IntField()))))}}
+                'coordinates': self.parse_arg(node, 0, INT_LIST_LIST_LIST_FIELD)}}
 
     def handle_box(self, node):
-        return {'$box': self.parse_arg(node, 0, ListField(ListField(IntField())))}
+        return {'$box': self.parse_arg(node, 0, INT_LIST_LIST_FIELD)}
 
     def handle_polygon(self, node):
-        return {'$polygon': self.parse_arg(node, 0, ListField(ListField(IntField())))}
+        return {'$polygon': self.parse_arg(node, 0, INT_LIST_LIST_FIELD)}
 
     def _any_center(self, node, center_name):
-        return {center_name: [self.parse_arg(node, 0, ListField(IntField())),
-                              self.parse_arg(node, 1, IntField())]}
+        return {center_name: [self.parse_arg(node, 0, INT_LIST_FIELD),
+                              self.parse_arg(node, 1, INT_FIELD)]}
 
     def handle_center(self, node):
         return self._any_center(node, '$center')
@@ -252,20 +411,23 @@ class GeoShapeFuncParser(Func):
         return self._any_center(node, '$centerSphere')
 
 class GeoShapeParser(AstHandler):
+    __slots__ = ()
     def handle_Call(self, node):
-        return GeoShapeFuncParser().handle(node)
+        return GEO_SHAPE_FUNC_PARSER.handle(node)
     def handle_List(self, node):
         '''
         This is a legacy coordinate pair. consider supporting box, polygon, center, centerSphere
         '''
-        return ListField(IntField()).handle(node)
+        return INT_LIST_FIELD.handle(node)
 
 class GeoFunc(Func):
+    __slots__ = ()
     def _any_near(self, node, near_name):
-        shape = GeoShapeParser().handle(self.get_arg(node, 0))
-        result = bson.SON({near_name: shape}) # use SON because mongo expects the command before the arguments
+        from bson import SON
+        shape = GEO_SHAPE_PARSER.handle(self.get_arg(node, 0))
+        result = SON({near_name: shape}) # use SON because mongo expects the command before the arguments
         if len(node.args) > 1:
-            distance = self.parse_arg(node, 1, IntField()) # meters
+            distance = self.parse_arg(node, 1, INT_FIELD) # meters
             if isinstance(shape, list): # legacy coordinate pair
                 result['$maxDistance'] = distance
             else:
@@ -279,18 +441,19 @@ class GeoFunc(Func):
         return self._any_near(node, '$nearSphere')
 
     def handle_geoIntersects(self, node):
-        return {'$geoIntersects': GeoShapeParser().handle(self.get_arg(node, 0))}
+        return {'$geoIntersects': GEO_SHAPE_PARSER.handle(self.get_arg(node, 0))}
 
     def handle_geoWithin(self, node):
-        return {'$geoWithin': GeoShapeParser().handle(self.get_arg(node, 0))}
+        return {'$geoWithin': GEO_SHAPE_PARSER.handle(self.get_arg(node, 0))}
 
 class GenericFunc(StringFunc, IntFunc, ListFunc, DateTimeFunc,
                   IdFunc, EpochFunc, EpochUTCFunc, GeoFunc):
-    pass
+    __slots__ = ()
 
 #---Operators---#
 
 class Operator(AstHandler):
+    __slots__ = ('field',)
     def __init__(self, field):
         self.field = field
     def handle_Eq(self, node):
@@ -301,22 +464,27 @@ class Operator(AstHandler):
         return {'$ne': self.field.handle(node)}
     def handle_In(self, node):
         '''in'''
+        if isinstance(node, Parameter):
+            return {'$in': Placeholder(node.id, ListField(self.field), node.col_offset)}
         try:
             elts = node.elts
         except AttributeError:
             raise ParseError('Invalid value type for `in` operator: {0}'.format(node.__class__.__name__),
                              col_offset=node.col_offset)
-        return {'$in': list(map(self.field.handle, elts))}
+        return {'$in': self.field.translate_elements(elts)}
     def handle_NotIn(self, node):
         '''not in'''
+        if isinstance(node, Parameter):
+            return {'$nin': Placeholder(node.id, ListField(self.field), node.col_offset)}
         try:
             elts = node.elts
         except AttributeError:
             raise ParseError('Invalid value type for `not in` operator: {0}'.format(node.__class__.__name__),
                              col_offset=node.col_offset)
-        return {'$nin': list(map(self.field.handle, elts))}
+        return {'$nin': self.field.translate_elements(elts)}
 
 class AlgebricOperator(Operator):
+    __slots__ = ()
     def handle_Gt(self, node):
         '''>'''
         return {'$gt': self.field.handle(node)}
@@ -333,7 +501,10 @@ class AlgebricOperator(Operator):
 #---Field-Types---#
 
 class Field(AstHandler):
+    __slots__ = ('_field', '_operator') # _field is the element type of container fields
     OP_CLASS = Operator
+    FUNC_CLASS = None # the Func translating calls (the handle_Call of the field)
+    VALUE_TYPES = ()
 
     SPECIAL_VALUES = {'None': None,
                       'null': None}
@@ -350,29 +521,115 @@ class Field(AstHandler):
         except KeyError:
             raise ParseError('Invalid name: {0}'.format(node.id), node.col_offset, options=list(self.SPECIAL_VALUES))
 
+    def handle_Parameter(self, node):
+        return Placeholder(node.id, self, node.col_offset)
+
+    def translate_elements(self, nodes):
+        '''
+        Translates the elements of a list. A list of literals of a single node type
+        (e.g. 50k numbers or ids) is converted at once by the bulk_<node type> method
+        instead of dispatching every element.
+        '''
+        node_types = set(map(type, nodes))
+        if len(node_types) == 1:
+            bulk = self._bulk_handlers.get(node_types.pop().__name__)
+            if bulk is not None:
+                return bulk(self, nodes)
+        return list(map(self.handle, nodes))
+
+    def get_operator(self):
+        try:
+            return self._operator
+        except AttributeError:
+            op = self._operator = self.OP_CLASS(self)
+            return op
+
+    def get_operators(self):
+        '''
+        Returns the comparison operators the field supports (e.g. ['==', 'in', ...]).
+        '''
+        return [self.OP_CLASS._handlers[name].__doc__ for name in self.OP_CLASS._options]
+
+    def get_functions(self):
+        '''
+        Returns the names of the functions the field can be compared to (e.g. ['exists', 'regex', 'type']).
+        '''
+        if self.FUNC_CLASS is None or 'Call' not in self._handlers:
+            return []
+        return list(self.FUNC_CLASS._options)
+
     def handle_operator_and_right(self, operator, right):
-        return self.OP_CLASS(self).resolve(operator)(right)
+        op = self.get_operator()
+        try:
+            handler = op._handlers[operator.__class__.__name__]
+        except KeyError:
+            op.unsupported(operator)
+        return handler(op, right)
+
+    def accepts(self, value_type):
+        if value_type is type(None):
+            return True
+        return issubclass(value_type, self.VALUE_TYPES) and \
+               (bool in self.VALUE_TYPES or not issubclass(value_type, bool))
+
+    def coerce(self, value):
+        '''
+        Validates and converts a bound python <value> (see Placeholder).
+        '''
+        if self.accepts(value.__class__):
+            return value
+        raise TypeError('{0} does not accept {1}'.format(self.__class__.__name__,
+                                                         value.__class__.__name__))
+
+    def coerce_elements(self, values):
+        '''
+        Validates and converts a sequence of bound values. Fields that only check
+        the value type (the default coerce) check every distinct type once.
+        '''
+        if self.__class__.coerce is not Field.coerce:
+            return list(map(self.coerce, values))
+        values = list(values)
+        for value_type in set(map(type, values)):
+            if not self.accepts(value_type):
+                raise TypeError('{0} does not accept {1}'.format(self.__class__.__name__,
+                                                                 value_type.__name__))
+        return values
 
 class GeoField(Field):
+    __slots__ = ()
+    FUNC_CLASS = GeoFunc
     def handle_Call(self, node):
-        return GeoFunc().handle(node)
+        return GEO_FUNC.handle(node)
 
 class AlgebricField(Field):
+    __slots__ = ()
     OP_CLASS = AlgebricOperator
 
 class StringField(AlgebricField):
+    __slots__ = ()
+    FUNC_CLASS = StringFunc
+    VALUE_TYPES = (str,)
     def handle_Call(self, node):
-        return StringFunc().handle(node)
+        return STRING_FUNC.handle(node)
     def handle_Str(self, node):
         return node.s
+    def bulk_Str(self, nodes):
+        return [node.s for node in nodes]
 
 class IntField(AlgebricField):
+    __slots__ = ()
+    FUNC_CLASS = IntFunc
+    VALUE_TYPES = (int, float)
     def handle_Num(self, node):
         return node.n
+    def bulk_Num(self, nodes):
+        return [node.n for node in nodes]
     def handle_Call(self, node):
-        return IntFunc().handle(node)
+        return INT_FUNC.handle(node)
 
 class BoolField(Field):
+    __slots__ = ()
+    VALUE_TYPES = (bool,)
     SPECIAL_VALUES = dict(Field.SPECIAL_VALUES,
                           **{'False': False,
                              'True': True,
@@ -380,50 +637,149 @@ class BoolField(Field):
                              'true': True})
 
 class ListField(Field):
+    __slots__ = ()
+    FUNC_CLASS = ListFunc
     def __init__(self, field=None):
         self._field = field
+    def coerce(self, value):
+        if isinstance(value, (str, bytes, dict)) or not hasattr(value, '__iter__'):
+            raise TypeError('ListField does not accept {0}'.format(value.__class__.__name__))
+        if self._field is None:
+            return list(value)
+        return self._field.coerce_elements(value)
     def handle_List(self, node):
-        return list(map((self._field or GenericField()).handle, node.elts))
+        return (self._field or GENERIC_FIELD).translate_elements(node.elts)
     def handle_Call(self, node):
-        return ListFunc().handle(node)
+        return LIST_FUNC.handle(node)
 
 class DictField(Field):
+    __slots__ = ()
     def __init__(self, field=None):
         self._field = field
+    def coerce(self, value):
+        if not isinstance(value, dict):
+            raise TypeError('DictField does not accept {0}'.format(value.__class__.__name__))
+        if self._field is None:
+            return dict(value)
+        return dict((key, self._field.coerce(item)) for key, item in value.items())
     def handle_Dict(self, node):
-        return dict((StringField().handle(key), (self._field or GenericField()).handle(value))
+        return dict((STRING_FIELD.handle(key), (self._field or GENERIC_FIELD).handle(value))
                     for key, value in zip(node.keys, node.values))
 
 class DateTimeField(AlgebricField):
+    __slots__ = ()
+    FUNC_CLASS = DateTimeFunc
+    def coerce(self, value):
+        return parse_date_value(value)
     def handle_Str(self, node):
         return parse_date(node)
+    def bulk_Str(self, nodes):
+        return list(map(parse_date, nodes))
     def handle_Num(self, node):
         return parse_date(node)
     def handle_Call(self, node):
-        return DateTimeFunc().handle(node)
+        return DATETIME_FUNC.handle(node)
 
 class EpochField(AlgebricField):
+    __slots__ = ()
+    FUNC_CLASS = EpochFunc
+    def coerce(self, value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+        return float(parse_date_value(value).strftime('%s.%f'))
     def handle_Str(self, node):
         return float(parse_date(node).strftime('%s.%f'))
     def handle_Num(self, node):
         return node.n
     def handle_Call(self, node):
-        return EpochFunc().handle(node)
+        return EPOCH_FUNC.handle(node)
 
 class EpochUTCField(AlgebricField):
+    __slots__ = ()
+    FUNC_CLASS = EpochUTCFunc
+    def coerce(self, value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+        from calendar import timegm
+        return timegm(parse_date_value(value).timetuple())
     def handle_Str(self, node):
+        from calendar import timegm
         return timegm(parse_date(node).timetuple())
     def handle_Num(self, node):
         return node.n
     def handle_Call(self, node):
-        return EpochUTCFunc().handle(node)
+        return EPOCH_UTC_FUNC.handle(node)
 
 class IdField(AlgebricField):
+    __slots__ = ()
+    FUNC_CLASS = IdFunc
+    @profiling.hooked('ids')
+    def coerce(self, value):
+        from bson import ObjectId
+        from bson.errors import InvalidId
+        if isinstance(value, ObjectId):
+            return value
+        if isinstance(value, str):
+            try:
+                return ObjectId(value)
+            except InvalidId as e:
+                raise ValueError(str(e))
+        raise TypeError('IdField does not accept {0}'.format(value.__class__.__name__))
+    @profiling.hooked('ids')
+    def coerce_elements(self, values):
+        from bson import ObjectId
+        from bson.errors import InvalidId
+        values = list(values)
+        if not set(map(type, values)) <= set([ObjectId, str]):
+            return list(map(self.coerce, values))
+        try:
+            return [value if value.__class__ is ObjectId else ObjectId(value) for value in values]
+        except InvalidId as e:
+            raise ValueError(str(e))
     def handle_Str(self, node):
-        return bson.ObjectId(node.s)
+        return object_id(node.s)
+    def bulk_Str(self, nodes):
+        return object_ids([node.s for node in nodes])
     def handle_Call(self, node):
-        return IdFunc().handle(node)
+        return ID_FUNC.handle(node)
 
 class GenericField(IntField, BoolField, StringField, ListField, DictField, GeoField):
+    __slots__ = ()
+    FUNC_CLASS = GenericFunc
+    def coerce(self, value):
+        return value
+    def coerce_elements(self, values):
+        return list(values)
     def handle_Call(self, node):
-        return GenericFunc().handle(node)
+        return GENERIC_FUNC.handle(node)
+
+#---Shared-Handlers---#
+# handlers keep no per-translation state, so all translations share these instances
+
+FIELD_NAME = FieldName()
+
+BOOL_FIELD = BoolField()
+INT_FIELD = IntField()
+STRING_FIELD = StringField()
+LIST_FIELD = ListField()
+DICT_FIELD = DictField()
+ID_FIELD = IdField()
+DATETIME_FIELD = DateTimeField()
+EPOCH_FIELD = EpochField()
+EPOCH_UTC_FIELD = EpochUTCField()
+GENERIC_FIELD = GenericField()
+INT_LIST_FIELD = ListField(INT_FIELD)
+INT_LIST_LIST_FIELD = ListField(INT_LIST_FIELD)
+INT_LIST_LIST_LIST_FIELD = ListField(INT_LIST_LIST_FIELD)
+
+STRING_FUNC = StringFunc()
+INT_FUNC = IntFunc()
+LIST_FUNC = ListFunc()
+DATETIME_FUNC = DateTimeFunc()
+ID_FUNC = IdFunc()
+EPOCH_FUNC = EpochFunc()
+EPOCH_UTC_FUNC = EpochUTCFunc()
+GEO_FUNC = GeoFunc()
+GENERIC_FUNC = GenericFunc()
+GEO_SHAPE_FUNC_PARSER = GeoShapeFuncParser()
+GEO_SHAPE_PARSER = GeoShapeParser()
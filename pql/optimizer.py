@@ -0,0 +1,216 @@
+"""
+optimize normalizes translated find() queries:
+
+1. flattens nested $and/$or.
+2. merges operators applied to the same field: a > 1 and a < 5 -> {'a': {'$gt': 1, '$lt': 5}}
+3. collapses equality checks of the same field: a == 1 or a == 2 -> {'a': {'$in': [1, 2]}}
+4. removes duplicate clauses.
+
+Conjunctions are emitted as a single document when the fields don't collide.
+
+optimize_pipeline rewrites aggregation pipelines:
+
+1. moves $match before $project/$unwind stages that don't rewrite the fields it uses.
+2. merges adjacent $match stages.
+3. coalesces consecutive $skip and consecutive $limit stages.
+4. moves $limit before $project so it follows $sort (allowing a top-k sort).
+
+Inputs are never mutated.
+"""
+from . import profiling
+from .aggregation import AGGREGATION_PARSER
+
+@profiling.timed('optimize')
+def optimize(query):
+    '''
+    Returns an equivalent, normalized version of a translated find <query>.
+    '''
+    return _conjunction(_and_clauses([query]))
+
+def freeze(value):
+    '''
+    Returns a hashable representation of <value>, used to detect duplicates.
+    Scalars keep their type so 1, 1.0 and True stay distinct (as in mongo).
+    '''
+    if isinstance(value, dict):
+        return (dict, tuple(sorted(((key, freeze(item)) for key, item in value.items()),
+                                   key=lambda pair: pair[0])))
+    if isinstance(value, list):
+        return (list, tuple(map(freeze, value)))
+    try:
+        hash(value)
+    except TypeError:
+        return (value.__class__, repr(value))
+    return (value.__class__, value)
+
+def _unique(values):
+    seen = set()
+    result = []
+    for value in values:
+        key = freeze(value)
+        if key not in seen:
+            seen.add(key)
+            result.append(value)
+    return result
+
+def _is_operator_document(value):
+    return isinstance(value, dict) and len(value) > 0 and all(key.startswith('$') for key in value)
+
+def _and_clauses(queries):
+    '''
+    Splits <queries> into single key clauses, flattening nested $and and optimizing $or.
+    '''
+    clauses = []
+    for query in queries:
+        for key, value in query.items():
+            if key == '$and':
+                clauses.extend(_and_clauses(value))
+            elif key == '$or':
+                clauses.extend({k: v} for k, v in _disjunction(value).items())
+            else:
+                clauses.append({key: value})
+    return clauses
+
+def _conjunction(clauses):
+    merged = []
+    operators_by_field = {}
+    for clause in _unique(clauses):
+        (field, value), = clause.items()
+        index = operators_by_field.get(field)
+        if _is_operator_document(value) and not field.startswith('$'):
+            if index is not None and not set(merged[index][field]) & set(value):
+                operators = merged[index][field].copy()
+                operators.update(value)
+                merged[index] = {field: operators}
+                continue
+            operators_by_field[field] = len(merged)
+        merged.append(clause)
+
+    fields = [next(iter(clause)) for clause in merged]
+    if len(set(fields)) == len(fields):
+        return dict((field, clause[field]) for field, clause in zip(fields, merged))
+    return {'$and': merged}
+
+def _is_equality(field, value):
+    if field.startswith('$'):
+        return False
+    return not isinstance(value, dict) or list(value) == ['$in']
+
+def _disjunction(queries):
+    clauses = []
+    for query in queries:
+        query = optimize(query)
+        if list(query) == ['$or']:
+            clauses.extend(query['$or'])
+        else:
+            clauses.append(query)
+    clauses = _unique(clauses)
+
+    equalities = {}
+    for index, clause in enumerate(clauses):
+        if len(clause) == 1:
+            (field, value), = clause.items()
+            if _is_equality(field, value):
+                equalities.setdefault(field, []).append(index)
+
+    collapsed = {}
+    for field, indices in equalities.items():
+        if len(indices) > 1:
+            values = []
+            for index in indices:
+                value = clauses[index][field]
+                if isinstance(value, dict):
+                    values.extend(value['$in'])
+                else:
+                    values.append(value)
+            collapsed[indices[0]] = {field: {'$in': _unique(values)}}
+            collapsed.update((index, None) for index in indices[1:])
+    result = []
+    for index, clause in enumerate(clauses):
+        clause = collapsed.get(index, clause)
+        if clause is not None:
+            result.append(clause)
+
+    if len(result) == 1:
+        return result[0]
+    return {'$or': result}
+
+#---Pipelines---#
+
+def optimize_pipeline(stages):
+    '''
+    Returns an equivalent, optimized list of aggregation <stages>.
+    '''
+    stages = [_optimize_stage(stage) for stage in stages]
+    changed = True
+    while changed:
+        changed = False
+        for index in range(len(stages) - 1):
+            replacement = _rewrite(stages[index], stages[index + 1])
+            if replacement is not None:
+                stages[index:index + 2] = replacement
+                changed = True
+                break
+    return stages
+
+def _optimize_stage(stage):
+    (name, value), = stage.items()
+    if name == '$match':
+        return {name: optimize(value)}
+    if name == '$project': # a value folded to a constant must not become an inclusion flag
+        return {name: value.__class__((key, AGGREGATION_PARSER.fold(item)) for key, item in value.items())}
+    if name == '$group':
+        return {name: AGGREGATION_PARSER.optimize(value)}
+    return stage
+
+def _query_fields(query):
+    '''
+    Returns the fields a find <query> uses, or None if it can't tell ($where, $text, $expr...).
+    '''
+    fields = set()
+    for key, value in query.items():
+        if key in ('$and', '$or', '$nor'):
+            for clause in value:
+                clause_fields = _query_fields(clause)
+                if clause_fields is None:
+                    return None
+                fields |= clause_fields
+        elif key.startswith('$'):
+            return None
+        else:
+            fields.add(key)
+    return fields
+
+def _passes_through(projection, field):
+    '''
+    Whether <projection> keeps <field> unchanged.
+    '''
+    root = field.split('.')[0]
+    if root not in projection:
+        # excluding projections and _id keep everything they don't mention
+        return root == '_id' or all(value == 0 for value in projection.values())
+    value = projection[root]
+    return value == 1 or value == '$' + root
+
+def _rewrite(first, second):
+    (first_name, first_value), = first.items()
+    (second_name, second_value), = second.items()
+    if second_name == '$match':
+        if first_name == '$match':
+            return [{'$match': optimize({'$and': [first_value, second_value]})}]
+        fields = _query_fields(second_value)
+        if fields is None:
+            return None
+        if first_name == '$project' and all(_passes_through(first_value, field) for field in fields):
+            return [second, first]
+        if first_name == '$unwind':
+            unwound = first_value[1:]
+            if not any(field == unwound or field.startswith(unwound + '.') for field in fields):
+                return [second, first]
+    if first_name == second_name == '$skip':
+        return [{'$skip': first_value + second_value}]
+    if first_name == second_name == '$limit':
+        return [{'$limit': min(first_value, second_value)}]
+    if first_name == '$project' and second_name == '$limit':
+        return [second, first]
+    return None
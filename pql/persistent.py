@@ -0,0 +1,230 @@
+"""
+A cache of translated queries in a sqlite file, shared by processes (e.g.
+pre-forked workers) and surviving restarts:
+
+  >>> cache = pql.PersistentCache('/var/cache/myapp/pql.sqlite')
+  >>> pql.find('a > 1', schema=schema, cache=cache)
+
+Entries are keyed by the expression, a fingerprint of the schema (its fields'
+classes, not its identity), find's options and the pql version. Queries are
+stored as tagged JSON so ObjectIds, datetimes, SON documents (e.g. of near
+queries, in their order) and geo documents come back as they were translated;
+encoded outputs are stored as they are.
+
+Entries are read when they're needed (opening the cache doesn't load the file)
+and a small in-memory LRU (a QueryCache) is kept in front of the file. The
+file holds about <maxsize> entries: the least recently used are evicted. The
+cache is a best effort: translations that can't be stored or a file that
+can't be used fall back to translating.
+"""
+import datetime
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from . import __version__
+from .cache import QueryCache, CacheStats
+from .schema import Schema, describe_field
+
+TAG = '__pql__'
+
+UTC_OFFSET = re.compile(r'([+-])(\d\d):(\d\d)(?::(\d\d)(?:\.(\d{6}))?)?$')
+
+EVICT_EVERY = 64 # stores (per process) between size checks
+TOUCH_AFTER = 60 # seconds before a hit refreshes the entry's last use (so most hits don't write)
+FINGERPRINTS = 64 # schemas (per cache) whose fingerprints are kept
+
+def _encode(value):
+    if isinstance(value, dict):
+        if value.__class__ is dict and TAG not in value:
+            return dict((key, _encode(item)) for key, item in value.items())
+        kind = 'son' if value.__class__.__name__ == 'SON' else 'dict' # a dict looking like a tag
+        return {TAG: kind, 'items': [[key, _encode(item)] for key, item in value.items()]}
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    if isinstance(value, datetime.datetime):
+        return {TAG: 'datetime', 'value': value.isoformat()}
+    if value.__class__.__name__ == 'ObjectId':
+        return {TAG: 'oid', 'value': str(value)}
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    raise TypeError("can't store {0}".format(value.__class__.__name__))
+
+def _parse_datetime(value):
+    '''
+    Parses the output of datetime.isoformat() (datetime.fromisoformat needs python 3.7).
+    '''
+    offset = UTC_OFFSET.search(value)
+    if offset is not None:
+        value = value[:offset.start()]
+    result = datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f' if '.' in value else '%Y-%m-%dT%H:%M:%S')
+    if offset is None:
+        return result
+    sign, hours, minutes, seconds, microseconds = offset.groups()
+    delta = datetime.timedelta(hours=int(hours), minutes=int(minutes), seconds=int(seconds or 0),
+                               microseconds=int(microseconds or 0))
+    return result.replace(tzinfo=datetime.timezone(-delta if sign == '-' else delta))
+
+def _decode_tag(document):
+    kind = document.get(TAG)
+    if kind is None:
+        return document
+    if kind == 'datetime':
+        return _parse_datetime(document['value'])
+    if kind == 'oid':
+        from bson import ObjectId
+        return ObjectId(document['value'])
+    if kind == 'son':
+        from bson import SON
+        return SON(document['items'])
+    return dict(document['items'])
+
+def dumps(query):
+    '''
+    Serializes a translated <query> to tagged JSON. Raises TypeError for values that can't be stored.
+    '''
+    return json.dumps(_encode(query), separators=(',', ':'))
+
+def loads(string):
+    return json.loads(string, object_hook=_decode_tag)
+
+def schema_fingerprint(schema):
+    '''
+    Returns a stable hash of a <schema> (a dict or a pql.Schema), the same in every process.
+    '''
+    if schema is None:
+        return None
+    if isinstance(schema, Schema):
+        description = schema.describe()
+    else:
+        description = dict((name, describe_field(field)) for name, field in schema.items())
+    return hashlib.sha1(json.dumps(description, sort_keys=True).encode('utf-8')).hexdigest()
+
+class PersistentCache(object):
+    '''
+    Caches translations in the sqlite file <path> (created if needed), keeping about
+    <maxsize> entries, behind an in-memory LRU of <memory_maxsize> entries.
+    Pass it as find's cache.
+    '''
+
+    def __init__(self, path, maxsize=100000, memory_maxsize=1024, timeout=5.0):
+        self.path = path
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.memory = QueryCache(memory_maxsize)
+        self._local = threading.local() # sqlite connections can't be shared by threads (or processes)
+        self._lock = threading.Lock()
+        self._fingerprints = OrderedDict() # (id(schema), schema_version) -> (schema, fingerprint), an LRU
+        self._hits = self._misses = self._evictions = self._stores = 0
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid(): # a new thread or a forked process
+            import sqlite3
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL') # readers don't block the writer
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS queries (key TEXT PRIMARY KEY, value, used REAL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS queries_used ON queries (used)')
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def _fingerprint(self, schema_key, schema, schema_version):
+        key = (schema_key, schema_version)
+        with self._lock:
+            try:
+                _, fingerprint = self._fingerprints[key]
+            except KeyError:
+                pass
+            else:
+                self._fingerprints.move_to_end(key)
+                return fingerprint
+        fingerprint = schema_fingerprint(schema)
+        with self._lock:
+            self._fingerprints[key] = (schema, fingerprint) # keeps the schema so its id isn't reused
+            while len(self._fingerprints) > FINGERPRINTS:
+                self._fingerprints.popitem(last=False)
+        return fingerprint
+
+    def _digest(self, key, schema):
+        expression, schema_key, schema_version = key[:3] # find's key: (expression, id(schema), schema_version, options...)
+        fingerprint = self._fingerprint(schema_key, schema, schema_version)
+        parts = [__version__, expression, fingerprint, schema_version] + list(key[3:])
+        return hashlib.sha1(json.dumps(parts).encode('utf-8')).hexdigest()
+
+    def _load(self, digest):
+        connection = self._connection()
+        row = connection.execute('SELECT value, used FROM queries WHERE key = ?', (digest,)).fetchone()
+        if row is None:
+            return None
+        value, used = row
+        now = time.time()
+        if now - used > TOUCH_AFTER:
+            connection.execute('UPDATE queries SET used = ? WHERE key = ?', (now, digest))
+        return value
+
+    def _store(self, digest, value):
+        connection = self._connection()
+        connection.execute('INSERT OR REPLACE INTO queries (key, value, used) VALUES (?, ?, ?)',
+                           (digest, value, time.time()))
+        with self._lock:
+            self._stores += 1
+            check = self._stores % EVICT_EVERY == 1
+        if check:
+            self._evict(connection)
+
+    def _evict(self, connection):
+        size, = connection.execute('SELECT COUNT(*) FROM queries').fetchone()
+        excess = size - self.maxsize
+        if excess > 0:
+            excess += self.maxsize // 10 # evict in batches
+            connection.execute('DELETE FROM queries WHERE key IN '
+                               '(SELECT key FROM queries ORDER BY used LIMIT ?)', (excess,))
+            with self._lock:
+                self._evictions += excess
+
+    def _load_or_translate(self, key, schema, translate):
+        import sqlite3
+        try:
+            digest = self._digest(key, schema)
+            value = self._load(digest)
+        except sqlite3.Error:
+            return translate()
+        if value is not None:
+            with self._lock:
+                self._hits += 1
+            return value if isinstance(value, bytes) else loads(value)
+        with self._lock:
+            self._misses += 1
+        result = translate()
+        try:
+            self._store(digest, result if isinstance(result, bytes) else dumps(result))
+        except (TypeError, sqlite3.Error):
+            pass
+        return result
+
+    def get_or_translate(self, key, schema, translate):
+        '''
+        Returns the query of <key> from memory, from the file or from <translate>().
+        '''
+        return self.memory.get_or_translate(key, schema, lambda: self._load_or_translate(key, schema, translate))
+
+    def stats(self):
+        '''
+        Returns the CacheStats of the file (hits and misses of this process). See .memory for the LRU's.
+        '''
+        with self._lock:
+            hits, misses, evictions = self._hits, self._misses, self._evictions
+        return CacheStats(hits=hits, misses=misses, evictions=evictions, size=len(self), maxsize=self.maxsize)
+
+    def clear(self):
+        self.memory.clear()
+        self._connection().execute('DELETE FROM queries')
+        with self._lock:
+            self._hits = self._misses = self._evictions = 0
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM queries').fetchone()[0]
@@ -0,0 +1,265 @@
+"""
+Compiles expressions to python predicates for filtering documents in memory:
+
+  >>> is_cheap_kia = pql.compile_predicate('model == "kia" and price < 5')
+  >>> is_cheap_kia({'model': 'kia', 'price': 4})
+  True
+  >>> list(is_cheap_kia.filter(cars))
+
+The expression is translated by find() (so it gets the same handlers, validation
+and values) and the resulting query is compiled once to nested closures that
+follow mongo's matching semantics: dotted paths traverse arrays, equality and
+comparisons match array elements, null matches missing fields etc.
+"""
+import datetime
+import math
+import re
+from .aggregation import is_number, mongo_mod
+from .matching import ParseError
+
+MISSING = object()
+
+TYPE_CODES = {1: (float,),
+              2: (str,),
+              3: (dict,),
+              4: (list,),
+              8: (bool,),
+              9: (datetime.datetime,),
+              10: (type(None),),
+              16: (int,),
+              18: (int,)}
+
+REGEX_FLAGS = {'i': re.IGNORECASE,
+               'm': re.MULTILINE,
+               's': re.DOTALL,
+               'x': re.VERBOSE}
+
+def resolve_path(document, parts, index=0):
+    '''
+    Returns the values found at the dotted path <parts> of <document>.
+    Arrays along the path are traversed (mongo style); missing values are MISSING.
+    '''
+    if index == len(parts):
+        return [document]
+    part = parts[index]
+    if isinstance(document, dict):
+        if part in document:
+            return resolve_path(document[part], parts, index + 1)
+        return [MISSING]
+    if isinstance(document, list):
+        values = []
+        if part.isdigit() and int(part) < len(document):
+            values.extend(resolve_path(document[int(part)], parts, index + 1))
+        for element in document:
+            if isinstance(element, dict):
+                values.extend(resolve_path(element, parts, index))
+        return values or [MISSING]
+    return [MISSING]
+
+def _equals(value, target):
+    if value is MISSING:
+        return target is None
+    if isinstance(value, bool) != isinstance(target, bool):
+        return False
+    return value == target
+
+def _element_equals(value, target):
+    '''
+    Equality that also matches elements of array values.
+    '''
+    if _equals(value, target):
+        return True
+    return isinstance(value, list) and any(_equals(element, target) for element in value)
+
+def _elements(value):
+    if isinstance(value, list):
+        return value
+    return [value]
+
+def _comparable(value, target):
+    if is_number(value) and is_number(target):
+        return True
+    return value.__class__ is target.__class__
+
+def _comparison(compare):
+    def compile_comparison(target, operators):
+        def test(values):
+            for value in values:
+                for element in _elements(value):
+                    if _comparable(element, target):
+                        try:
+                            if compare(element, target):
+                                return True
+                        except TypeError: # e.g. naive and aware datetimes
+                            pass
+            return False
+        return test
+    return compile_comparison
+
+def _compile_eq(target, operators):
+    return lambda values: any(_element_equals(value, target) for value in values)
+
+def _compile_ne(target, operators):
+    eq = _compile_eq(target, operators)
+    return lambda values: not eq(values)
+
+def _compile_in(targets, operators):
+    return lambda values: any(_element_equals(value, target)
+                              for value in values for target in targets)
+
+def _compile_nin(targets, operators):
+    in_ = _compile_in(targets, operators)
+    return lambda values: not in_(values)
+
+def _compile_exists(exists, operators):
+    if exists:
+        return lambda values: any(value is not MISSING for value in values)
+    return lambda values: all(value is MISSING for value in values)
+
+def _compile_regex(pattern, operators):
+    flags = 0
+    for option in operators.get('$options', ''):
+        flags |= REGEX_FLAGS.get(option, 0)
+    search = re.compile(pattern, flags).search
+    return lambda values: any(isinstance(element, str) and search(element) is not None
+                              for value in values for element in _elements(value))
+
+def _compile_options(options, operators):
+    return lambda values: True # consumed by $regex
+
+def _compile_size(size, operators):
+    return lambda values: any(isinstance(value, list) and len(value) == size for value in values)
+
+def _compile_all(targets, operators):
+    def test(values):
+        for value in values:
+            elements = _elements(value)
+            if targets and all(any(_equals(element, target) for element in elements)
+                               for target in targets):
+                return True
+        return False
+    return test
+
+def _compile_elemMatch(condition, operators):
+    if all(key.startswith('$') and key not in ('$and', '$or', '$nor') for key in condition):
+        element_test = compile_condition(condition)
+        matches = lambda element: element_test([element])
+    else:
+        query_test = compile_query(condition)
+        matches = lambda element: isinstance(element, dict) and query_test(element)
+    return lambda values: any(isinstance(value, list) and any(map(matches, value))
+                              for value in values)
+
+def _compile_mod(divisor_and_remainder, operators):
+    divisor, remainder = divisor_and_remainder
+    if divisor == 0:
+        raise ParseError('Invalid $mod divisor (0).', col_offset=None)
+    return lambda values: any(is_number(element) and math.isfinite(element) and
+                              mongo_mod(int(element), divisor) == remainder
+                              for value in values for element in _elements(value))
+
+def _compile_type(code, operators):
+    types = TYPE_CODES.get(code, ())
+    def test(values):
+        for value in values:
+            for element in [value] + (value if isinstance(value, list) else []):
+                if element is not MISSING and element.__class__ in types:
+                    return True
+        return False
+    return test
+
+def _compile_not(condition, operators):
+    test = compile_condition(condition)
+    return lambda values: not test(values)
+
+OPERATORS = {'$eq': _compile_eq,
+             '$ne': _compile_ne,
+             '$gt': _comparison(lambda a, b: a > b),
+             '$gte': _comparison(lambda a, b: a >= b),
+             '$lt': _comparison(lambda a, b: a < b),
+             '$lte': _comparison(lambda a, b: a <= b),
+             '$in': _compile_in,
+             '$nin': _compile_nin,
+             '$exists': _compile_exists,
+             '$regex': _compile_regex,
+             '$options': _compile_options,
+             '$size': _compile_size,
+             '$all': _compile_all,
+             '$elemMatch': _compile_elemMatch,
+             '$mod': _compile_mod,
+             '$type': _compile_type,
+             '$not': _compile_not}
+
+def _all(tests):
+    if len(tests) == 1:
+        return tests[0]
+    return lambda value: all(test(value) for test in tests)
+
+def compile_condition(condition):
+    '''
+    Compiles the <condition> applied to a field (a value or an operator document)
+    to a function of the list of values found at the field's path.
+    '''
+    if not (isinstance(condition, dict) and condition and
+            all(key.startswith('$') for key in condition)):
+        return _compile_eq(condition, None)
+    tests = []
+    for operator, argument in condition.items():
+        try:
+            compile_operator = OPERATORS[operator]
+        except KeyError:
+            raise ParseError('Unsupported operator for in-memory matching ({0}).'.format(operator),
+                             col_offset=None,
+                             options=sorted(OPERATORS))
+        tests.append(compile_operator(argument, condition))
+    return _all(tests)
+
+def _compile_field(field, condition):
+    parts = field.split('.')
+    test = compile_condition(condition)
+    return lambda document: test(resolve_path(document, parts))
+
+def compile_query(query):
+    '''
+    Compiles a translated find <query> to a function of a document returning a bool.
+    '''
+    tests = []
+    for key, value in query.items():
+        if key == '$and':
+            tests.append(_all([compile_query(clause) for clause in value]))
+        elif key == '$or':
+            clauses = [compile_query(clause) for clause in value]
+            tests.append(lambda document, clauses=clauses: any(clause(document) for clause in clauses))
+        elif key == '$nor':
+            clauses = [compile_query(clause) for clause in value]
+            tests.append(lambda document, clauses=clauses: not any(clause(document) for clause in clauses))
+        elif key.startswith('$'):
+            raise ParseError('Unsupported operator for in-memory matching ({0}).'.format(key),
+                             col_offset=None)
+        else:
+            tests.append(_compile_field(key, value))
+    if not tests:
+        return lambda document: True
+    return _all(tests)
+
+class Predicate(object):
+    __slots__ = ('query', '_test')
+
+    def __init__(self, query):
+        self.query = query
+        self._test = compile_query(query)
+
+    def __call__(self, document):
+        return self._test(document)
+
+    def filter(self, documents):
+        '''
+        Lazily yields the matching <documents>.
+        '''
+        test = self._test
+        for document in documents:
+            if test(document):
+                yield document
+
+    def __repr__(self):
+        return '<Predicate {0!r}>'.format(self.query)
@@ -0,0 +1,161 @@
+"""
+Prepared queries:
+
+  >>> query = pql.prepare('price > :min and model in :models')
+  >>> query.bind(min=3, models=['kia', 'fiat'])
+  {'$and': [{'price': {'$gt': 3}}, {'model': {'$in': ['kia', 'fiat']}}]}
+
+The expression is parsed, translated and validated against the schema once.
+Placeholders are left in the translated query and bind() only walks that query,
+converting each value with the field type the placeholder was found on.
+
+With limits (see pql.limits) the expression is checked when it's prepared and
+the values bound to regex and list parameters (e.g. `in :ids`) on every bind.
+"""
+import ast
+import copy
+import io
+import keyword
+import tokenize
+from functools import partial
+from .matching import (SchemaFreeParser, SchemaAwareParser, ParseError,
+                       Parameter, Placeholder)
+
+IMMUTABLE_TYPES = (str, bytes, int, float, bool, type(None))
+CHECKED_OPERATORS = ('$regex', '$in', '$nin', '$all') # whose bound values the limits check
+
+def _is_parameter_start(previous):
+    '''
+    A `:` starts a parameter unless it follows an operand (a dict key or a slice bound).
+    '''
+    if previous is None:
+        return True
+    if previous.type in (tokenize.STRING, tokenize.NUMBER):
+        return False
+    if previous.type == tokenize.NAME:
+        return keyword.iskeyword(previous.string)
+    return previous.string not in (')', ']', '}')
+
+def _tokens(expression):
+    ignored = (tokenize.NL, tokenize.NEWLINE, tokenize.COMMENT, tokenize.ENDMARKER)
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(expression).readline):
+            if token.type not in ignored:
+                yield token
+    except (tokenize.TokenError, IndentationError):
+        pass # let ast.parse report the syntax error
+
+def _find_parameters(expression):
+    '''
+    Returns the source with every `:name` replaced by `_name` (so offsets are kept)
+    and a dict mapping the (lineno, col_offset) of every parameter to its name.
+    '''
+    lines = expression.splitlines(True) or ['']
+    positions = {}
+    before = previous = None
+    for token in _tokens(expression):
+        if previous is not None and previous.string == ':' and token.type == tokenize.NAME and \
+           token.start == previous.end and _is_parameter_start(before):
+            row, col = previous.start
+            line = lines[row - 1]
+            lines[row - 1] = line[:col] + '_' + line[col + 1:]
+            positions[(row, len(line[:col].encode('utf-8')))] = token.string
+        before, previous = previous, token
+    return ''.join(lines), positions
+
+class _ParameterTransformer(ast.NodeTransformer):
+    def __init__(self, positions):
+        self._positions = positions
+
+    def visit_Name(self, node):
+        try:
+            name = self._positions[(node.lineno, node.col_offset)]
+        except KeyError:
+            return node
+        return ast.copy_location(Parameter(id=name), node)
+
+def _checked(placeholder, operator, check):
+    def bind(values):
+        value = placeholder.bind(values)
+        check(operator, value, placeholder.col_offset)
+        return value
+    return bind
+
+def _compile_binder(template, check=None):
+    '''
+    Returns a function that builds a fresh copy of <template> with its placeholders bound.
+    check(operator, value, col_offset) is called with the values bound to the placeholders
+    of CHECKED_OPERATORS.
+    '''
+    if isinstance(template, Placeholder):
+        return template.bind
+    if isinstance(template, dict):
+        items = [(key, _checked(value, key, check) if check is not None and key in CHECKED_OPERATORS and
+                  isinstance(value, Placeholder) else _compile_binder(value, check))
+                 for key, value in template.items()]
+        if any(binder is not None for _, binder in items):
+            cls = template.__class__
+            items = [(key, binder or _compile_binder_constant(template[key])) for key, binder in items]
+            return lambda values: cls((key, binder(values)) for key, binder in items)
+        return None
+    if isinstance(template, list):
+        binders = [_compile_binder(value, check) for value in template]
+        if any(binder is not None for binder in binders):
+            binders = [binder or _compile_binder_constant(value)
+                       for binder, value in zip(binders, template)]
+            return lambda values: [binder(values) for binder in binders]
+    return None
+
+def _compile_binder_constant(value):
+    if isinstance(value, IMMUTABLE_TYPES):
+        return lambda values: value
+    return lambda values: copy.deepcopy(value)
+
+def _collect_placeholders(template):
+    if isinstance(template, Placeholder):
+        yield template
+    elif isinstance(template, dict):
+        for value in template.values():
+            for placeholder in _collect_placeholders(value):
+                yield placeholder
+    elif isinstance(template, list):
+        for value in template:
+            for placeholder in _collect_placeholders(value):
+                yield placeholder
+
+class PreparedQuery(object):
+
+    def __init__(self, expression, schema=None, limits=None):
+        self.expression = expression
+        source, positions = _find_parameters(expression)
+        tree = _ParameterTransformer(positions).visit(ast.parse(source, mode='eval'))
+        parser = SchemaFreeParser() if schema is None else SchemaAwareParser(schema)
+        check = None
+        if limits is None:
+            self._template = parser.handle(tree.body)
+        else:
+            self._template, cost = limits.translate(lambda expression: parser.translate(tree.body), expression)
+            check = partial(limits.check_bound, cost)
+        self.parameters = frozenset(placeholder.name for placeholder in
+                                    _collect_placeholders(self._template))
+        binder = _compile_binder(self._template, check)
+        self._binder = binder or _compile_binder_constant(self._template)
+
+    def bind(self, **values):
+        unknown = set(values) - self.parameters
+        if unknown:
+            raise ParseError('Unknown parameters: {0}'.format(', '.join(sorted(unknown))),
+                             col_offset=None,
+                             options=sorted(self.parameters))
+        return self._binder(values)
+
+    def __repr__(self):
+        return '<PreparedQuery {0!r}>'.format(self.expression)
+
+def prepare(expression, schema=None, limits=None):
+    '''
+    Gets an <expression> with `:name` placeholders, an optional <schema> and optional <limits>
+    (a pql.Limits, also checked on the values bound to regex and list parameters).
+    Returns a PreparedQuery whose bind(**values) returns the translated query.
+    '''
+    return PreparedQuery(expression, schema, limits)
@@ -0,0 +1,233 @@
+"""
+Times each phase of translations, to tell whether a slow request spent its
+time in pql or in the database:
+
+  >>> with pql.profiling.profile() as records:
+  ...     pql.find('_id == id("5f0000000000000000000000") and made_on > date("2020-1-1")', schema=schema)
+  >>> records[0]
+  <Record find '_id == id("5f0000000000000000000000") and made_on > date("2020-1-1")'
+          seconds=4.1e-05 phases={'parse': 1.2e-05, 'translate': 2.3e-05, 'schema': 1.4e-06,
+                                  'ids': 4.8e-06, 'dates': 2.2e-06} nodes=13 size=46 cached=False>
+
+profile() collects the Records of the translations made by the current thread;
+subscribe(callback) calls <callback> with the Record of every translation (in
+the thread that made it), e.g. to feed metrics.
+
+A Record is made for each pql.find and for each expression parsed by another
+parser (e.g. by the pipeline helpers; its kind is the parser's class name).
+Its phases are (in seconds):
+  parse      python's ast.parse
+  translate  walking the tree, including the dates, ids and schema phases
+  dates      parsing date strings
+  ids        constructing ObjectIds
+  schema     looking fields up and validating them against the schema
+  optimize   pql.optimizer (with optimize=True)
+  encode     BSON encoding (with find's output='bytes' or 'raw')
+nodes counts the ast nodes (only the comparisons' when iterative=True walks a
+deeply nested expression with an explicit stack), size is the BSON size of the
+result (None when it can't be encoded) and cached tells a find served from the
+cache.
+
+While nothing is profiling, the hooks of a translation (e.g. of find) cost
+one check of the module's `active` counter; otherwise they check enabled()
+for the current thread, so a profile doesn't slow other threads down (only
+subscribed callbacks are process wide). The functions called for every
+node (dates, ids, schema lookups) run without hooks: their timed versions are
+only installed while something is profiling.
+"""
+import ast
+import functools
+import sys
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+active = 0 # open profiles (of any thread) and subscribed callbacks; the hooks do nothing while it's 0
+
+_lock = threading.Lock()
+_listeners = () # replaced, never mutated, so it's iterated without the lock
+_local = threading.local() # record: the translation being recorded, profiles: lists collecting records
+_hooks = [] # (function, its timed version) of the per-node functions
+
+class Record(object):
+    __slots__ = ('kind', 'expression', 'seconds', 'phases', 'nodes', 'size', 'cached', 'error')
+
+    def __init__(self, kind, expression):
+        self.kind = kind
+        self.expression = expression
+        self.seconds = None
+        self.phases = {}
+        self.nodes = 0
+        self.size = None
+        self.cached = False
+        self.error = None
+
+    def __repr__(self):
+        return '<Record {0} {1!r} seconds={2:.2g} phases={{{3}}} nodes={4} size={5} cached={6}{7}>'.format(
+            self.kind, self.expression, self.seconds,
+            ', '.join('{0!r}: {1:.2g}'.format(name, seconds) for name, seconds in self.phases.items()),
+            self.nodes, self.size, self.cached, '' if self.error is None else ' error={0!r}'.format(self.error))
+
+def _activate(delta):
+    global active
+    with _lock:
+        if active == 0 and delta > 0:
+            _install(True)
+        active += delta
+        if active == 0:
+            _install(False)
+
+def _install(timed):
+    '''
+    Replaces the per-node functions by their timed versions (or restores them).
+    '''
+    for function, decorated in _hooks:
+        owner = sys.modules[function.__module__]
+        path = function.__qualname__.split('.') # e.g. IdField.coerce
+        for name in path[:-1]:
+            owner = getattr(owner, name)
+        setattr(owner, path[-1], decorated if timed else function)
+
+def subscribe(callback):
+    '''
+    Calls <callback> with the Record of every translation until unsubscribe(callback).
+    '''
+    global _listeners
+    with _lock:
+        _listeners += (callback,)
+    _activate(1)
+
+def unsubscribe(callback):
+    global _listeners
+    with _lock:
+        listeners = list(_listeners)
+        listeners.remove(callback)
+        _listeners = tuple(listeners)
+    _activate(-1)
+
+@contextmanager
+def profile():
+    '''
+    Yields the list of Records of the translations the current thread makes in the block.
+    '''
+    records = []
+    profiles = _local.__dict__.setdefault('profiles', [])
+    profiles.append(records)
+    _activate(1)
+    try:
+        yield records
+    finally:
+        _activate(-1)
+        profiles.remove(records)
+
+def enabled():
+    '''
+    Returns whether the translations of the current thread are recorded: it's profiling
+    or callbacks are subscribed.
+    '''
+    return bool(_listeners or getattr(_local, 'profiles', None))
+
+def _report(record):
+    for records in getattr(_local, 'profiles', ()):
+        records.append(record)
+    for listener in _listeners:
+        listener(record)
+
+def _current():
+    return getattr(_local, 'record', None)
+
+def add(phase, seconds):
+    '''
+    Adds <seconds> to a <phase> of the translation being recorded, if any.
+    '''
+    record = _current()
+    if record is not None:
+        record.phases[phase] = record.phases.get(phase, 0.0) + seconds
+
+def count_nodes(trees):
+    record = _current()
+    if record is not None:
+        record.nodes += sum(1 for tree in trees for _ in ast.walk(tree))
+
+def size(result):
+    if isinstance(result, bytes):
+        return len(result)
+    from bson import BSON
+    try:
+        return len(BSON.encode({'': result})) - 7 # the size of <result> when it's a document
+    except Exception: # e.g. the placeholders of prepared queries
+        return None
+
+def timed(phase):
+    '''
+    Decorates a function so its calls add to <phase> of the translation being recorded.
+    Calls made while the phase is already timed (e.g. recursion) aren't counted twice.
+    '''
+    def decorator(function):
+        @functools.wraps(function)
+        def decorated(*args):
+            if not active or _current() is None: # nothing is recorded by this thread
+                return function(*args)
+            timing = _local.__dict__.setdefault('timing', set())
+            if phase in timing:
+                return function(*args)
+            timing.add(phase)
+            start = perf_counter()
+            try:
+                return function(*args)
+            finally:
+                timing.discard(phase)
+                add(phase, perf_counter() - start)
+        return decorated
+    return decorator
+
+def hooked(phase):
+    '''
+    Decorates a function called for every node (e.g. parsing a date) as part of <phase>.
+    It's replaced by its timed version only while something is profiling, so translations
+    don't pay for the hook otherwise. Call it by its module's or class's attribute.
+    '''
+    def decorator(function):
+        _hooks.append((function, timed(phase)(function)))
+        return function
+    return decorator
+
+def translate(kind, expression, function, *args):
+    '''
+    Returns function(*args), recorded as a translation of <expression> unless it's
+    part of a translation already being recorded (e.g. the parse of a find).
+    '''
+    if _current() is not None:
+        return function(*args)
+    record = _local.record = Record(kind, expression)
+    start = perf_counter()
+    try:
+        result = function(*args)
+        record.seconds = perf_counter() - start
+        record.size = size(result)
+        record.cached = kind == 'find' and 'translate' not in record.phases
+        return result
+    except Exception as e:
+        record.seconds = perf_counter() - start
+        record.error = e
+        raise
+    finally:
+        _local.record = None
+        _report(record)
+
+@timed('parse')
+def _parse(string):
+    tree = ast.parse(string, mode='eval')
+    return tree.body
+
+@timed('translate')
+def _translate(handler, node):
+    return handler.translate(node)
+
+def parse(handler, string):
+    '''
+    AstHandler.parse, timing the parse and translate phases.
+    '''
+    node = _parse(string)
+    count_nodes([node])
+    return _translate(handler, node)
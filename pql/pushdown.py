@@ -0,0 +1,162 @@
+"""
+Splits a translated find() query into a part for the server and a residual
+predicate filtering the returned documents in python:
+
+  >>> split = split_query(pql.find('model == "kia" and name == regex("son")'), indexed=['model'])
+  >>> split.query
+  {'model': 'kia'}
+  >>> split.residual
+  <Predicate {'name': {'$regex': 'son'}}>
+  >>> list(split.filter(collection.find(split.query)))
+
+The query's conjunctions are split clause by clause (and the operators of a
+field one by one: documents matching {a: {op1, op2}} are the ones matching both
+{a: {op1}} and {a: {op2}}). Every predicate is classified as in pql.indexes and
+costs COSTS[kind], plus SCAN_COST if its field isn't indexed. Predicates costing
+at most <max_cost> are sent to the server, the others are kept for the residual.
+The defaults send what an index (or a cheap filter) serves and keep unanchored
+or case insensitive regexes, $ne, $nin, $not etc. local; max_cost=1 only sends
+the predicates of indexed fields, a large max_cost sends everything.
+
+The split is always safe: the server's query matches a superset of the documents
+and the server's query and the residual together match exactly the original ones.
+An $or sends the $or of its branches' server parts (when every branch has
+one) and keeps the whole $or in the residual. Operators python can't evaluate
+(e.g. geo queries) are always sent.
+"""
+from .indexes import EQUALITY, IN, GEO, PREFIX, RANGE, UNINDEXABLE, _classify_operator
+from .matching import ParseError
+from .predicate import OPERATORS as EVALUABLE, Predicate
+
+COSTS = {EQUALITY: 0, IN: 0, GEO: 0, PREFIX: 1, RANGE: 1, UNINDEXABLE: 10}
+SCAN_COST = 2 # filtering on a field no index serves
+MAX_COST = COSTS[RANGE] + SCAN_COST
+
+class Split(object):
+    '''
+    The <query> to send to the server and the <residual> Predicate (None if there's nothing left).
+    '''
+    __slots__ = ('query', 'residual')
+
+    def __init__(self, query, residual):
+        self.query = query
+        self.residual = residual
+
+    def filter(self, documents):
+        '''
+        Lazily yields the <documents> returned by the server's query that match the residual.
+        '''
+        if self.residual is None:
+            return iter(documents)
+        return self.residual.filter(documents)
+
+    def __repr__(self):
+        return '<Split {0!r} {1!r}>'.format(self.query, self.residual)
+
+def _conjuncts(query):
+    for key, value in query.items():
+        if key == '$and':
+            for clause in value:
+                for conjunct in _conjuncts(clause):
+                    yield conjunct
+        else:
+            yield key, value
+
+def _combine(clauses):
+    '''
+    Returns the conjunction of the single key <clauses> (None for none).
+    '''
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    if len(set(key for clause in clauses for key in clause)) < len(clauses): # repeated fields or $ors
+        return {'$and': clauses}
+    query = {}
+    for clause in clauses:
+        query.update(clause)
+    return query
+
+def _evaluable(query):
+    try:
+        Predicate(query)
+    except ParseError:
+        return False
+    return True
+
+class _Splitter(object):
+    __slots__ = ('indexed', 'max_cost')
+
+    def __init__(self, indexed, max_cost):
+        self.indexed = frozenset(indexed)
+        self.max_cost = max_cost
+
+    def cost(self, field, kind):
+        if kind == UNINDEXABLE or field not in self.indexed:
+            return COSTS[kind] + SCAN_COST
+        return COSTS[kind]
+
+    def split(self, query):
+        '''
+        Returns the (pushed, residual) queries of <query> (None when empty).
+        '''
+        pushed, residual = [], []
+        for key, value in _conjuncts(query):
+            if key == '$or':
+                clause_pushed, clause_residual = self.split_or(value)
+            elif key.startswith('$'): # e.g. $nor, $where
+                clause = {key: value}
+                if self.cost(key, UNINDEXABLE) <= self.max_cost or not _evaluable(clause):
+                    clause_pushed, clause_residual = clause, None
+                else:
+                    clause_pushed, clause_residual = None, clause
+            else:
+                clause_pushed, clause_residual = self.split_field(key, value)
+            if clause_pushed is not None:
+                pushed.append(clause_pushed)
+            if clause_residual is not None:
+                residual.append(clause_residual)
+        return _combine(pushed), _combine(residual)
+
+    def split_or(self, branches):
+        clause = {'$or': branches}
+        splits = [self.split(branch) for branch in branches]
+        if all(residual is None for _, residual in splits) or not _evaluable(clause):
+            return clause, None
+        if all(pushed is not None for pushed, _ in splits):
+            return {'$or': [pushed for pushed, _ in splits]}, clause # the pushed $or is looser
+        return None, clause # a branch would match everything: nothing to send
+
+    def split_field(self, field, condition):
+        if not (isinstance(condition, dict) and condition and
+                all(key.startswith('$') for key in condition)):
+            if self.cost(field, EQUALITY) <= self.max_cost:
+                return {field: condition}, None
+            return None, {field: condition}
+        sides = {}
+        for operator, argument in condition.items():
+            if operator == '$options':
+                continue
+            kind, _ = _classify_operator(operator, argument, condition)
+            sides[operator] = operator not in EVALUABLE or self.cost(field, kind) <= self.max_cost
+        if '$options' in condition:
+            sides['$options'] = sides.get('$regex', True)
+        if all(sides.values()):
+            return {field: condition}, None
+        # the operators' order (e.g. $near before $maxDistance) and document class (SON) are kept
+        residual = {field: condition.__class__((key, value) for key, value in condition.items() if not sides[key])}
+        if not _evaluable(residual): # e.g. an $elemMatch of a geo query
+            return {field: condition}, None
+        if not any(sides.values()):
+            return None, {field: condition}
+        return {field: condition.__class__((key, value) for key, value in condition.items() if sides[key])}, residual
+
+def split_query(query, indexed=(), max_cost=MAX_COST):
+    '''
+    Splits a translated find <query> given the <indexed> field names. Predicates costing
+    more than <max_cost> are kept for the residual. Returns a Split.
+    '''
+    pushed, residual = _Splitter(indexed, max_cost).split(query)
+    if residual is None:
+        return Split(query, None) # everything is sent as it was
+    return Split({} if pushed is None else pushed, None if residual is None else Predicate(residual))
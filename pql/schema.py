@@ -0,0 +1,337 @@
+"""
+Compiles a schema once, to be shared by every translation (and thread):
+
+  >>> cars = pql.Schema({'model': pql.StringField(),
+  ...                    'owner': {'name': pql.StringField(), 'born': pql.DateTimeField()},
+  ...                    'tags': [pql.StringField()],
+  ...                    'wheels': [{'size': pql.IntField()}],
+  ...                    'specs': {'*': pql.IntField()}})
+  >>> pql.find('owner.name == "alon" and wheels.size > 16 and specs.hp > 100', schema=cars)
+
+A definition is one of:
+1. a dict mapping names (or dotted paths, as in plain schemas) to fields, dicts
+   (embedded documents), single item lists (arrays of the item) or any of the
+   following. The name '*' matches any name.
+2. a class declaring the same as attributes (nested classes are embedded documents).
+3. a mongoengine document class (from its _fields) or a mongokit document
+   class (from its structure, whose python types are mapped to fields).
+
+Paths are resolved on a trie of their segments: an array's path also leads to
+its elements' fields (wheels.size) and a numeric segment to an element
+(wheels.0.size, tags.0). Resolving costs O(path depth) however big the schema
+is, and an unknown field only lists its siblings as options. The operators and
+functions of every path are computed when the schema is compiled.
+"""
+import bisect
+from . import profiling
+from .matching import (OperatorMap, ParseError, FIELD_NAME, Field,
+                       StringField, IntField, BoolField, ListField, DictField,
+                       DateTimeField, IdField, GeoField, GenericField)
+
+WILDCARD = '*'
+
+# mongokit's python types (by name)
+PYTHON_TYPES = {'str': StringField,
+                'unicode': StringField,
+                'basestring': StringField,
+                'int': IntField,
+                'long': IntField,
+                'float': IntField,
+                'bool': BoolField,
+                'datetime': DateTimeField,
+                'ObjectId': IdField,
+                'dict': DictField,
+                'list': ListField}
+
+# mongoengine's scalar fields (by name, subclasses map as their closest base)
+MONGOENGINE_FIELDS = {'StringField': StringField,
+                      'IntField': IntField,
+                      'LongField': IntField,
+                      'FloatField': IntField,
+                      'DecimalField': IntField,
+                      'SequenceField': IntField,
+                      'BooleanField': BoolField,
+                      'DateTimeField': DateTimeField,
+                      'DateField': DateTimeField,
+                      'ObjectIdField': IdField,
+                      'ReferenceField': IdField,
+                      'LazyReferenceField': IdField,
+                      'GenericReferenceField': DictField,
+                      'PointField': GeoField,
+                      'LineStringField': GeoField,
+                      'PolygonField': GeoField,
+                      'MultiPointField': GeoField,
+                      'MultiLineStringField': GeoField,
+                      'MultiPolygonField': GeoField,
+                      'GeoPointField': GeoField}
+
+class _Node(object):
+    '''
+    A path segment: its field, the segments under it and, for arrays, the node of their elements.
+    '''
+    __slots__ = ('field', 'children', 'wildcard', 'elements', 'operators', 'functions', 'sorted_names')
+
+    def __init__(self):
+        self.field = None
+        self.children = {}
+        self.wildcard = None
+        self.elements = None
+        self.operators = self.functions = ()
+        self.sorted_names = () # set when the schema is compiled
+
+    def child(self, name):
+        if name == WILDCARD:
+            if self.wildcard is None:
+                self.wildcard = _Node()
+            return self.wildcard
+        try:
+            return self.children[name]
+        except KeyError:
+            node = self.children[name] = _Node()
+            return node
+
+    def step(self, segment):
+        '''
+        Returns the node of <segment> under this one, or None.
+        '''
+        node = self.children.get(segment)
+        if node is not None:
+            return node
+        if self.elements is not None:
+            return self.elements if segment.isdigit() else self.elements.step(segment)
+        return self.wildcard
+
+    def names(self):
+        '''
+        Returns the sorted names under this node (for arrays, under their elements).
+        '''
+        node = self
+        while node.elements is not None:
+            node = node.elements
+        return node.sorted_names
+
+def _mongoengine_definition(field, classes):
+    names = [klass.__name__ for klass in field.__class__.__mro__]
+    if 'EmbeddedDocumentField' in names:
+        document = field.document_type
+        return DictField() if document in classes else _class_definition(document, classes + (document,))
+    if 'ListField' in names:
+        return [] if field.field is None else [_mongoengine_definition(field.field, classes)]
+    if 'DictField' in names: # and MapField
+        inner = getattr(field, 'field', None)
+        return DictField() if inner is None else {WILDCARD: _mongoengine_definition(inner, classes)}
+    for name in names:
+        if name in MONGOENGINE_FIELDS:
+            return MONGOENGINE_FIELDS[name]()
+    return GenericField()
+
+def _class_definition(cls, classes):
+    '''
+    Returns the dict definition of a declarative, mongoengine or mongokit class
+    (<classes> are the documents it's embedded in, to stop at recursive documents).
+    '''
+    fields = getattr(cls, '_fields', None)
+    if isinstance(fields, dict): # mongoengine
+        return dict((getattr(field, 'db_field', None) or name, _mongoengine_definition(field, classes))
+                    for name, field in fields.items())
+    structure = getattr(cls, 'structure', None)
+    if isinstance(structure, dict): # mongokit
+        return structure
+    definition = {}
+    for klass in reversed(cls.__mro__[:-1]):
+        for name, value in vars(klass).items():
+            if not name.startswith('_') and isinstance(value, (Field, dict, list, type)):
+                definition[name] = value
+    return definition
+
+_descriptions = {} # field class -> (operators, functions)
+
+def _describe(field):
+    try:
+        return _descriptions[field.__class__]
+    except KeyError:
+        description = _descriptions[field.__class__] = (tuple(field.get_operators()),
+                                                        tuple(field.get_functions()))
+        return description
+
+def describe_field(field):
+    '''
+    Returns a json-able description of a <field>: its class and its element field's.
+    '''
+    description = [field.__class__.__module__ + '.' + field.__class__.__qualname__]
+    element = getattr(field, '_field', None)
+    if element is not None:
+        description.append(describe_field(element))
+    return description
+
+def _describe_node(node):
+    description = {}
+    if node.field is not None:
+        description['field'] = describe_field(node.field)
+    if node.children:
+        description['children'] = dict((name, _describe_node(child)) for name, child in node.children.items())
+    if node.wildcard is not None:
+        description[WILDCARD] = _describe_node(node.wildcard)
+    if node.elements is not None:
+        description['elements'] = _describe_node(node.elements)
+    return description
+
+class Schema(OperatorMap):
+    '''
+    A compiled schema (see the module's documentation). It can be passed wherever a schema is expected.
+    '''
+    __slots__ = ('_root',)
+
+    def __init__(self, definition):
+        self._root = _Node()
+        self._add_document(self._root, definition, ())
+        nodes = [self._root]
+        while nodes:
+            node = nodes.pop()
+            node.sorted_names = tuple(sorted(node.children))
+            nodes.extend(child for child in [node.wildcard, node.elements] if child is not None)
+            nodes.extend(node.children.values())
+
+    #---Compilation---#
+
+    def _add_document(self, node, definition, classes):
+        if isinstance(definition, type):
+            if definition in classes: # a recursive document
+                return
+            classes += (definition,)
+            definition = _class_definition(definition, classes)
+        for name, value in definition.items():
+            if isinstance(name, type): # mongokit's {str: int}
+                name = WILDCARD
+            child = node
+            for segment in name.split('.'):
+                child = child.child(segment)
+            self._add(child, value, classes)
+
+    def _add(self, node, value, classes):
+        if isinstance(value, type) and value.__name__ in PYTHON_TYPES:
+            value = PYTHON_TYPES[value.__name__]()
+        if isinstance(value, (dict, type)):
+            if node.field is None:
+                self._set_field(node, DictField())
+            self._add_document(node, value, classes)
+        elif isinstance(value, list):
+            if len(value) > 1:
+                raise ValueError('An array definition has one item (the type of the elements), not {0}'.format(len(value)))
+            if value:
+                node.elements = _Node()
+                self._add(node.elements, value[0], classes)
+                self._set_field(node, ListField(node.elements.field))
+            else:
+                self._set_field(node, ListField())
+        elif isinstance(value, Field):
+            self._set_field(node, value)
+            element = value._field if isinstance(value, (ListField, DictField)) else None
+            if isinstance(value, ListField) and element is not None and node.elements is None:
+                node.elements = _Node()
+                self._add(node.elements, element, classes)
+            elif isinstance(value, DictField) and element is not None and node.wildcard is None:
+                self._add(node.child(WILDCARD), element, classes)
+        else:
+            raise TypeError('Unsupported schema definition: {0!r}'.format(value))
+
+    def _set_field(self, node, field):
+        node.field = field
+        field.get_operator() # built now rather than by the first (maybe concurrent) translations
+        node.operators, node.functions = _describe(field)
+
+    def describe(self):
+        '''
+        Returns a json-able description of the compiled schema (e.g. to fingerprint it).
+        '''
+        return _describe_node(self._root)
+
+    #---Resolution---#
+
+    def _find(self, path):
+        '''
+        Returns the node of <path> (with a field) or raises KeyError with the options.
+        '''
+        node = self._root
+        prefix = ''
+        for segment in path.split('.'):
+            child = node.step(segment)
+            if child is None:
+                raise KeyError([prefix + name for name in node.names()])
+            node = child
+            prefix += segment + '.'
+        if node.field is None: # e.g. 'a' when only 'a.b' is defined
+            raise KeyError([prefix + name for name in node.names()])
+        return node
+
+    def lookup(self, path):
+        '''
+        Returns the field of a dotted <path>. Raises KeyError (with the options at the
+        segment that wasn't found).
+        '''
+        return self._find(path).field
+
+    def operators(self, path):
+        '''
+        Returns the comparison operators the field of <path> supports.
+        '''
+        return list(self._find(path).operators)
+
+    def functions(self, path):
+        '''
+        Returns the functions the field of <path> can be compared to.
+        '''
+        return list(self._find(path).functions)
+
+    def children(self, path=''):
+        '''
+        Returns the paths defined right under <path> (all top level fields by default).
+        '''
+        if not path:
+            return list(self._root.names())
+        node = self._root
+        for segment in path.split('.'):
+            node = node.step(segment)
+            if node is None:
+                raise KeyError(path)
+        return [path + '.' + name for name in node.names()]
+
+    def complete(self, prefix, limit=None):
+        '''
+        Returns the (at most <limit>) sorted paths starting with <prefix>, completing its
+        last segment: 'owner.n' -> ['owner.name', ...].
+        '''
+        parent, dot, partial = prefix.rpartition('.')
+        node = self._root
+        for segment in parent.split('.') if dot else ():
+            node = node.step(segment)
+            if node is None:
+                return []
+        names = node.names()
+        paths = []
+        for index in range(bisect.bisect_left(names, partial), len(names)):
+            name = names[index]
+            if not name.startswith(partial) or len(paths) == limit:
+                break
+            paths.append(parent + dot + name)
+        return paths
+
+    @profiling.hooked('schema')
+    def _resolve(self, node):
+        path = FIELD_NAME.handle(node)
+        try:
+            return path, self._find(path).field
+        except KeyError as e:
+            raise ParseError('Field not found: {0}.'.format(path),
+                             col_offset=node.col_offset,
+                             options=e.args[0])
+
+    def resolve_field(self, node):
+        return self._resolve(node)[0]
+
+    def resolve_type(self, field):
+        return self.lookup(field)
+
+    def handle(self, operator, left, right):
+        field, field_type = self._resolve(left)
+        return {field: field_type.handle_operator_and_right(operator, right)}
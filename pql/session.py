@@ -0,0 +1,132 @@
+"""
+Translates an expression as it's typed (e.g. in a search box) and completes it:
+
+  >>> session = pql.Session(schema)
+  >>> session.translate('model == "kia" and price > 3')
+  {'$and': [{'model': 'kia'}, {'price': {'$gt': 3}}]}
+  >>> session.translate('model == "kia" and price > 30') # only `price > 30` is translated
+  {'$and': [{'model': 'kia'}, {'price': {'$gt': 30}}]}
+  >>> session.autocomplete('model == "kia" and pr')
+  Completion(kind='field', start=19, options=['price', 'produced_on'])
+
+Expressions are translated as with find(..., iterative=True): the boolean
+structure is rescanned on every call but the queries of the comparisons are
+memoized by their source, so an edit only translates the comparisons it touched.
+
+autocomplete tells what's expected at the cursor: a field, an operator, a value
+(the functions and names the field accepts) or a boolean keyword, and the
+options starting with the text before the cursor. A Completion's options replace
+expression[start:cursor]. Fields are completed with the sorted names of the
+compiled schema (see pql.Schema) and operators and functions come from each
+field type's precomputed tables, so a completion takes microseconds however
+many fields the schema has.
+"""
+import re
+from collections import OrderedDict, namedtuple
+from .cache import copy_query
+from .iterative import STRING, parse as iterative_parse
+from .matching import SchemaFreeParser, SchemaAwareParser, GENERIC_FIELD
+from .schema import Schema
+
+Completion = namedtuple('Completion', ['kind', 'start', 'options'])
+
+FIELD = 'field'
+OPERATOR = 'operator'
+VALUE = 'value'
+KEYWORD = 'keyword'
+
+KEYWORDS = ['and', 'or']
+
+GENERIC_OPERATORS = GENERIC_FIELD.get_operators()
+GENERIC_VALUES = GENERIC_FIELD.get_functions() + sorted(GENERIC_FIELD.SPECIAL_VALUES)
+
+TOKENS = re.compile('|'.join([r'(?P<string>' + STRING + ')',
+                              r'(?P<operator>==|!=|<=|>=|<|>)',
+                              r'(?P<name>[^\W\d][\w.]*)',
+                              r'(?P<open>[(\[{])',
+                              r'(?P<close>[)\]}])',
+                              r'(?P<other>[^\s])']))
+PARTIAL = re.compile(r'(?:[=!<>]+|[^\W\d][\w.]*)$')
+QUOTES = re.compile(r'[rRbBuUfF]{0,2}[\'"]')
+
+class Session(object):
+    '''
+    Translates and completes successive versions of expressions with an optional <schema>
+    (a dict is compiled to a pql.Schema once). Up to <maxsize> comparisons are memoized.
+    Not thread-safe: use a session per user.
+    '''
+
+    def __init__(self, schema=None, maxsize=1024):
+        if schema is not None and not isinstance(schema, Schema):
+            schema = Schema(schema)
+        self.schema = schema
+        self.maxsize = maxsize
+        self._parser = SchemaFreeParser() if schema is None else SchemaAwareParser(schema)
+        self._memo = OrderedDict()
+
+    def translate(self, expression):
+        '''
+        Returns the query of <expression>, reusing the comparisons translated by previous calls.
+        '''
+        memo = self._memo
+        query = iterative_parse(self._parser, expression, memo)
+        while len(memo) > self.maxsize: # evict the comparisons used longest ago
+            memo.popitem(last=False)
+        return copy_query(query) # the memo keeps the comparisons' queries
+
+    def _describe(self, path):
+        '''
+        Returns the operators of the field of <path> and the names of its values (functions
+        and names like None), from the tables precomputed by the schema.
+        '''
+        if self.schema is None:
+            return GENERIC_OPERATORS, GENERIC_VALUES
+        try:
+            field = self.schema.lookup(path)
+            return self.schema.operators(path), self.schema.functions(path) + sorted(field.SPECIAL_VALUES)
+        except KeyError:
+            return [], []
+
+    def autocomplete(self, expression, cursor=None, limit=100):
+        '''
+        Returns the Completion at <cursor> (default: the end) of <expression>, with
+        at most <limit> options.
+        '''
+        if cursor is None:
+            cursor = len(expression)
+        before = expression[:cursor]
+        partial = PARTIAL.search(before)
+        start = cursor if partial is None else partial.start()
+        partial = '' if partial is None else partial.group()
+
+        atom = [] # the tokens of the comparison being typed
+        depth = 0 # brackets opened inside the comparison
+        for match in TOKENS.finditer(before, 0, start):
+            kind, token = match.lastgroup, match.group()
+            if kind == 'other' and QUOTES.match(token):
+                return Completion(VALUE, cursor, []) # inside a string
+            if depth > 0:
+                depth += {'open': 1, 'close': -1}.get(kind, 0)
+                atom.append(token)
+            elif kind == 'name' and token in KEYWORDS or kind == 'open' and not atom or \
+                 token == 'not' and not atom:
+                atom = []
+            elif kind == 'close' and not atom:
+                continue
+            else:
+                depth += kind == 'open'
+                atom.append(token)
+        if depth > 0:
+            return Completion(VALUE, start, []) # e.g. inside a list or a function call
+
+        if not atom:
+            options = [] if self.schema is None else self.schema.complete(partial, limit)
+            return Completion(FIELD, start, options)
+        operators, values = self._describe(atom[0])
+        if len(atom) == 1 or atom[1:] == ['not']:
+            prefix = ' '.join(atom[1:] + [partial])
+            return Completion(OPERATOR, start, [operator[len(prefix) - len(partial):] for operator in operators
+                                                if operator.startswith(prefix)][:limit])
+        if len(atom) == 2 or atom[1:] == ['not', 'in']:
+            return Completion(VALUE, start, [value for value in values if value.startswith(partial)][:limit])
+        return Completion(KEYWORD, start, [keyword for keyword in KEYWORDS if keyword.startswith(partial)])
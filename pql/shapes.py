@@ -0,0 +1,112 @@
+"""
+Computes the shape of translated find() queries: the query with every literal
+replaced by a placeholder of its type, fields and clauses in a canonical order
+and nested $and/$or flattened. Queries that only differ in their values share a
+shape:
+
+  >>> pql.fingerprint('price > 3 and model == "kia"')
+  Fingerprint(shape={'model': '?str', 'price': {'$gt': '?int'}}, hash='78a927067f608fce79d443e87cb9a2cb62dbcb50')
+  >>> pql.fingerprint('model == "fiat" and price > 10').hash == _.hash
+  True
+
+Only the structure is normalized: clauses aren't deduplicated and equalities
+aren't collapsed into $in (as pql.optimizer does), since both depend on the
+values (a == 1 or a == 1 and a == 1 or a == 2 share a shape).
+
+The hash is a stable sha1 of the shape (it doesn't depend on python's hash
+randomization) so it can key metrics or be stored.
+"""
+import hashlib
+import json
+from collections import namedtuple
+
+Fingerprint = namedtuple('Fingerprint', ['shape', 'hash'])
+
+LOGICAL_OPERATORS = ('$and', '$or', '$nor')
+
+def placeholder(value):
+    '''
+    Returns the placeholder of a literal <value>: '?<type name>' for scalars,
+    the sorted distinct placeholders of a list's items and documents with
+    placeholders for values.
+    '''
+    if isinstance(value, dict):
+        return dict((key, placeholder(item)) for key, item in sorted(value.items()))
+    if isinstance(value, (list, tuple)):
+        items = dict((_dumps(item), item) for item in map(placeholder, value))
+        return [items[key] for key in sorted(items)]
+    return '?' + value.__class__.__name__
+
+def _dumps(shape):
+    return json.dumps(shape, sort_keys=True, separators=(',', ':'))
+
+def _is_operator_document(value):
+    return isinstance(value, dict) and len(value) > 0 and all(key.startswith('$') for key in value)
+
+def _condition_shape(condition):
+    if not _is_operator_document(condition):
+        return placeholder(condition)
+    shape = {}
+    for operator, argument in sorted(condition.items()):
+        if operator == '$not':
+            shape[operator] = _condition_shape(argument)
+        elif operator == '$elemMatch':
+            shape[operator] = (_condition_shape(argument) if _is_operator_document(argument) and
+                               not any(key in LOGICAL_OPERATORS for key in argument) else
+                               query_shape(argument))
+        else:
+            shape[operator] = placeholder(argument)
+    return shape
+
+def _and_clauses(query):
+    for key, value in query.items():
+        if key == '$and' and isinstance(value, list):
+            for clause in value:
+                for item in _and_clauses(clause):
+                    yield item
+        elif key == '$or' and isinstance(value, list):
+            yield {key: _or_branches(value)}
+        else:
+            yield {key: value}
+
+def _or_branches(branches):
+    result = []
+    for branch in map(flatten, branches):
+        if list(branch) == ['$or']:
+            result.extend(branch['$or'])
+        else:
+            result.append(branch)
+    return result
+
+def flatten(query):
+    '''
+    Returns <query> with its nested $and/$or flattened (and a conjunction of distinct
+    fields as a single document), without looking at the values.
+    '''
+    clauses = list(_and_clauses(query))
+    fields = [next(iter(clause)) for clause in clauses]
+    if len(set(fields)) == len(fields):
+        return dict((field, clause[field]) for field, clause in zip(fields, clauses))
+    return {'$and': clauses}
+
+def query_shape(query):
+    '''
+    Returns the shape of a translated (and flattened) find <query>.
+    '''
+    shape = {}
+    for key, value in sorted(query.items()):
+        if key in LOGICAL_OPERATORS:
+            clauses = [query_shape(clause) for clause in value]
+            shape[key] = sorted(clauses, key=_dumps)
+        elif key.startswith('$'):
+            shape[key] = placeholder(value)
+        else:
+            shape[key] = _condition_shape(value)
+    return shape
+
+def fingerprint(query):
+    '''
+    Returns the Fingerprint (shape and hash) of a translated find <query>.
+    '''
+    shape = query_shape(flatten(query))
+    return Fingerprint(shape, hashlib.sha1(_dumps(shape).encode('utf-8')).hexdigest())
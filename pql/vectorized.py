@@ -0,0 +1,320 @@
+"""
+Evaluates translated queries and aggregation expressions over columnar data
+(a mapping of field names to equally sized numpy arrays) without iterating
+over documents:
+
+  >>> pql.mask('price > 3 and model in ["kia", "fiat"]', columns)
+  array([False,  True,  True])
+  >>> pql.evaluate('price * 3.7', columns)
+  array([11.1, 18.5, 14.8])
+
+Missing values are NaN (float columns), NaT (datetime64 columns), None (object
+columns) or masked entries (numpy.ma masked arrays).
+
+Requires numpy.
+"""
+import datetime
+import functools
+import operator
+import re
+import numpy
+from .aggregation import is_literal, is_number
+from .matching import ParseError
+from .predicate import REGEX_FLAGS
+
+def _unsupported(operator):
+    return ParseError('Unsupported operator for columnar evaluation ({0}).'.format(operator),
+                      col_offset=None)
+
+def _convert(column, value):
+    '''
+    Converts a literal <value> to a type comparable with <column>.
+    '''
+    if isinstance(value, datetime.datetime):
+        return numpy.datetime64(value)
+    if isinstance(value, (list, tuple)):
+        return [_convert(column, item) for item in value]
+    return value
+
+def present(column):
+    '''
+    Returns a mask of the entries of <column> that hold a value.
+    '''
+    if isinstance(column, numpy.ma.MaskedArray):
+        return ~numpy.ma.getmaskarray(column)
+    kind = column.dtype.kind
+    if kind == 'f':
+        return ~numpy.isnan(column)
+    if kind in 'mM':
+        return ~numpy.isnat(column)
+    if kind == 'O':
+        return numpy.not_equal(column, None)
+    return numpy.ones(len(column), dtype=bool)
+
+def _where_present(column, function):
+    '''
+    Applies the elementwise <function> to the present entries of <column> only,
+    so missing entries (None, NaN) never take part in comparisons.
+    '''
+    mask = present(column)
+    result = numpy.zeros(len(column), dtype=bool)
+    values = numpy.ma.getdata(column)[mask]
+    if len(values):
+        result[mask] = function(values)
+    return result
+
+def _bucket(value):
+    '''
+    Returns the type bracket of <value>: numbers compare with each other, other
+    values with values of the same class only (see pql.predicate).
+    '''
+    if is_number(value):
+        return int
+    if isinstance(value, numpy.datetime64):
+        return datetime.datetime
+    return value.__class__
+
+_DTYPE_BUCKETS = {'i': int, 'u': int, 'f': int, 'b': bool, 'M': datetime.datetime, 'U': str, 'S': bytes}
+
+def _where_comparable(column, target, compare):
+    '''
+    Applies compare(values, target) to the present entries of <column> in the
+    type bracket of <target>; entries of other types never match, as in
+    pql.predicate, instead of raising or comparing across types.
+    '''
+    def function(values):
+        if values.dtype.kind != 'O':
+            if _DTYPE_BUCKETS.get(values.dtype.kind) is not _bucket(target):
+                return numpy.zeros(len(values), dtype=bool)
+            return compare(values, _convert(column, target))
+        return numpy.fromiter((_bucket(value) is _bucket(target) and bool(compare(value, target))
+                               for value in values), dtype=bool, count=len(values))
+    return _where_present(column, function)
+
+def _comparison(compare):
+    def compile_comparison(column, target, operators):
+        return _where_comparable(column, target, compare)
+    return compile_comparison
+
+def _equal(column, target, operators=None):
+    if target is None:
+        return ~present(column)
+    if isinstance(target, (list, dict)):
+        raise _unsupported('equality to a document or array')
+    return _where_comparable(column, target, operator.eq)
+
+def _not_equal(column, target, operators):
+    return ~_equal(column, target)
+
+def _in(column, targets, operators):
+    '''
+    Matches the targets per type bracket, so 3 in ["3", 3] holds for an int column
+    and "3" never equals 3.
+    '''
+    buckets = {}
+    for target in targets:
+        if target is not None:
+            buckets.setdefault(_bucket(target), []).append(target)
+    def function(values):
+        if values.dtype.kind != 'O':
+            bucket = buckets.get(_DTYPE_BUCKETS.get(values.dtype.kind), ())
+            return numpy.isin(values, _convert(column, bucket)) if bucket else numpy.zeros(len(values), dtype=bool)
+        return numpy.fromiter((value in buckets.get(_bucket(value), ()) for value in values),
+                              dtype=bool, count=len(values))
+    result = _where_present(column, function)
+    if any(target is None for target in targets):
+        result |= ~present(column)
+    return result
+
+def _not_in(column, targets, operators):
+    return ~_in(column, targets, operators)
+
+def _exists(column, exists, operators):
+    return present(column) if exists else ~present(column)
+
+def _mod(column, divisor_and_remainder, operators):
+    divisor, remainder = divisor_and_remainder
+    if divisor == 0:
+        raise ParseError('Invalid $mod divisor (0).', col_offset=None)
+    return _where_present(column, lambda values: numpy.fmod(numpy.trunc(values), divisor) == remainder)
+
+def _regex(column, pattern, operators):
+    flags = 0
+    for option in operators.get('$options', ''):
+        flags |= REGEX_FLAGS.get(option, 0)
+    search = re.compile(pattern, flags).search
+    return numpy.fromiter((isinstance(value, str) and search(value) is not None
+                           for value in column.tolist()), dtype=bool, count=len(column))
+
+def _options(column, options, operators):
+    return numpy.ones(len(column), dtype=bool)
+
+def _not(column, condition, operators):
+    return ~condition_mask(column, condition)
+
+OPERATORS = {'$eq': _equal,
+             '$ne': _not_equal,
+             '$gt': _comparison(operator.gt),
+             '$gte': _comparison(operator.ge),
+             '$lt': _comparison(operator.lt),
+             '$lte': _comparison(operator.le),
+             '$in': _in,
+             '$nin': _not_in,
+             '$exists': _exists,
+             '$mod': _mod,
+             '$regex': _regex,
+             '$options': _options,
+             '$not': _not}
+
+def condition_mask(column, condition):
+    if not (isinstance(condition, dict) and condition and
+            all(key.startswith('$') for key in condition)):
+        return _equal(column, condition)
+    masks = []
+    for operator, argument in condition.items():
+        try:
+            function = OPERATORS[operator]
+        except KeyError:
+            raise _unsupported(operator)
+        masks.append(function(column, argument, condition))
+    return functools.reduce(numpy.logical_and, masks)
+
+def _length(columns):
+    lengths = set(len(column) for column in columns.values())
+    if len(lengths) != 1:
+        raise ValueError('expected columns of equal (non zero) length, got: {0}'.format(sorted(lengths)))
+    return lengths.pop()
+
+def query_mask(query, columns, length=None):
+    '''
+    Returns a boolean array of the rows of <columns> matching a translated find <query>.
+    Fields without a column are treated as missing.
+    '''
+    if length is None:
+        length = _length(columns)
+    masks = []
+    for key, value in query.items():
+        if key in ('$and', '$or', '$nor'):
+            clauses = [query_mask(clause, columns, length) for clause in value]
+            if key == '$and':
+                masks.append(numpy.logical_and.reduce(clauses))
+            elif key == '$or':
+                masks.append(numpy.logical_or.reduce(clauses))
+            else:
+                masks.append(~numpy.logical_or.reduce(clauses))
+        elif key.startswith('$'):
+            raise _unsupported(key)
+        else:
+            column = columns.get(key)
+            if column is None:
+                column = numpy.full(length, None, dtype=object)
+            masks.append(condition_mask(numpy.asanyarray(column), value))
+    if not masks:
+        return numpy.ones(length, dtype=bool)
+    return numpy.logical_and.reduce(masks)
+
+#---Aggregation-Expressions---#
+
+def _truth(value):
+    '''
+    Mongo truthiness: null, false and 0 are false.
+    '''
+    value = numpy.asanyarray(value)
+    if value.dtype.kind == 'O':
+        return numpy.fromiter((item is not None and item is not False and item != 0
+                               for item in value.tolist()), dtype=bool, count=value.size)
+    if value.dtype.kind == 'f':
+        return (value != 0) & ~numpy.isnan(value)
+    return value.astype(bool)
+
+def _date_part(part):
+    def function(value):
+        value = numpy.asarray(value, dtype='datetime64[ms]')
+        days = value.astype('datetime64[D]')
+        if part == 'year':
+            return value.astype('datetime64[Y]').astype(int) + 1970
+        if part == 'month':
+            return value.astype('datetime64[M]').astype(int) % 12 + 1
+        if part == 'dayOfMonth':
+            return (days - value.astype('datetime64[M]')).astype(int) + 1
+        if part == 'dayOfYear':
+            return (days - value.astype('datetime64[Y]')).astype(int) + 1
+        if part == 'dayOfWeek': # 1 (sunday) to 7 (saturday), 1970-01-01 was a thursday
+            return (days.astype(int) + 4) % 7 + 1
+        if part == 'week': # 0 to 53, weeks start on sunday
+            day_of_year = (days - value.astype('datetime64[Y]')).astype(int)
+            weekday = (days.astype(int) + 4) % 7
+            return (day_of_year + 7 - weekday) // 7
+        milliseconds = (value - days).astype(int)
+        if part == 'hour':
+            return milliseconds // 3600000
+        if part == 'minute':
+            return milliseconds // 60000 % 60
+        if part == 'second':
+            return milliseconds // 1000 % 60
+        return milliseconds % 1000
+    return function
+
+def _cmp(left, right):
+    return numpy.sign(numpy.subtract(left, right)).astype(int)
+
+def _ifnull(value, replacement):
+    value = numpy.asanyarray(value)
+    if value.ndim == 0:
+        return replacement if value.item() is None else value
+    return numpy.where(present(value), value, replacement)
+
+FUNCTIONS = {'$add': lambda *args: functools.reduce(numpy.add, args),
+             '$multiply': lambda *args: functools.reduce(numpy.multiply, args),
+             '$subtract': numpy.subtract,
+             '$divide': numpy.true_divide,
+             '$mod': lambda left, right: numpy.fmod(left, right),
+             '$eq': numpy.equal,
+             '$ne': numpy.not_equal,
+             '$gt': numpy.greater,
+             '$gte': numpy.greater_equal,
+             '$lt': numpy.less,
+             '$lte': numpy.less_equal,
+             '$cmp': _cmp,
+             '$and': lambda *args: numpy.logical_and.reduce([_truth(arg) for arg in args]),
+             '$or': lambda *args: numpy.logical_or.reduce([_truth(arg) for arg in args]),
+             '$not': lambda value: ~_truth(value),
+             '$cond': lambda test, then, otherwise: numpy.where(_truth(test), then, otherwise),
+             '$ifnull': _ifnull,
+             '$concat': lambda *args: functools.reduce(numpy.char.add, [numpy.asarray(arg, dtype=str)
+                                                                        for arg in args]),
+             '$toLower': lambda value: numpy.char.lower(numpy.asarray(value, dtype=str)),
+             '$toUpper': lambda value: numpy.char.upper(numpy.asarray(value, dtype=str))}
+
+FUNCTIONS.update(('$' + part, _date_part(part))
+                 for part in ['year', 'month', 'dayOfMonth', 'dayOfYear', 'dayOfWeek', 'week',
+                              'hour', 'minute', 'second', 'millisecond'])
+
+def evaluate(expression, columns):
+    '''
+    Evaluates a translated aggregation <expression> column-wise.
+    Field references ('$a.b') are looked up in <columns> by their dotted name.
+    '''
+    if isinstance(expression, str) and not is_literal(expression):
+        try:
+            return numpy.asanyarray(columns[expression[1:]])
+        except KeyError:
+            raise ParseError('Column not found: {0}.'.format(expression[1:]),
+                             col_offset=None,
+                             options=sorted(columns))
+    if isinstance(expression, datetime.datetime):
+        return numpy.datetime64(expression)
+    if is_literal(expression):
+        return expression
+    if not (isinstance(expression, dict) and len(expression) == 1):
+        raise _unsupported(expression)
+    (operator, args), = expression.items()
+    if operator == '$literal':
+        return numpy.datetime64(args) if isinstance(args, datetime.datetime) else args
+    try:
+        function = FUNCTIONS[operator]
+    except KeyError:
+        raise _unsupported(operator)
+    if not isinstance(args, list):
+        args = [args]
+    return function(*[evaluate(arg, columns) for arg in args])
@@ -0,0 +1,68 @@
+from datetime import datetime
+from unittest import TestCase
+import bson
+import pql
+
+class PqlPredicateTestCase(TestCase):
+
+    def check(self, expression, matching, not_matching, schema=None):
+        predicate = pql.compile_predicate(expression, schema)
+        for document in matching:
+            self.assertTrue(predicate(document), '{} should match {}'.format(expression, document))
+        for document in not_matching:
+            self.assertFalse(predicate(document), '{} should not match {}'.format(expression, document))
+
+    def test_equal(self):
+        self.check('a == 1', [{'a': 1}, {'a': [2, 1]}], [{'a': 2}, {}, {'a': True}])
+        self.check('a == None', [{}, {'a': None}], [{'a': 1}])
+        self.check('a == [1, 2]', [{'a': [1, 2]}], [{'a': [2, 1]}])
+
+    def test_not_equal(self):
+        self.check('a != 1', [{'a': 2}, {}], [{'a': 1}, {'a': [1, 2]}])
+
+    def test_dotted(self):
+        self.check('a.b == 1', [{'a': {'b': 1}}, {'a': [{'b': 2}, {'b': 1}]}, {'a': {'b': [1]}}],
+                   [{'a': {'b': 2}}, {'a': 1}, {}])
+        self.check('"a.1" == "x"', [{'a': ['w', 'x']}], [{'a': ['x', 'w']}])
+
+    def test_comparison(self):
+        self.check('a > 1 and a <= 3', [{'a': 2}, {'a': 3.0}, {'a': [0, 2]}], [{'a': 1}, {'a': '2'}, {}])
+        self.check('d > date("2012-01-01")', [{'d': datetime(2013, 1, 1)}], [{'d': datetime(2011, 1, 1)}, {'d': 5}])
+
+    def test_in(self):
+        self.check('a in [1, 2]', [{'a': 1}, {'a': [3, 2]}], [{'a': 3}, {}])
+        self.check('a not in [1, 2]', [{'a': 3}, {}], [{'a': 1}, {'a': [3, 2]}])
+
+    def test_boolean_logic(self):
+        self.check('a == 1 or b == 2', [{'a': 1}, {'b': 2}], [{'a': 2, 'b': 1}])
+        self.check('not a > 1', [{'a': 1}, {}], [{'a': 2}])
+
+    def test_functions(self):
+        self.check('a == exists(True)', [{'a': None}], [{}])
+        self.check('a == exists(False)', [{}], [{'a': 1}])
+        self.check('a == regex("^fo+", "i")', [{'a': 'FOO'}, {'a': ['x', 'foo']}], [{'a': 'bar'}, {'a': 1}])
+        self.check('a == size(2)', [{'a': [1, 2]}], [{'a': [1]}, {'a': 'ab'}])
+        self.check('a == all([1, 2])', [{'a': [2, 3, 1]}], [{'a': [1, 3]}, {'a': []}])
+        self.check('a == match({"b": 1})', [{'a': [{'b': 1}, {'b': 2}]}], [{'a': [{'b': 2}]}, {'a': {'b': 1}}])
+        self.check('a == mod(3, 1)', [{'a': 4}, {'a': 7.5}],
+                   [{'a': 3}, {'a': 'x'}, {'a': float('nan')}, {'a': float('inf')}])
+        self.check('a == type(2)', [{'a': 'x'}], [{'a': 1}])
+
+    def test_id(self):
+        self.check('_id == id("abcdeabcdeabcdeabcdeabcd")',
+                   [{'_id': bson.ObjectId('abcdeabcdeabcdeabcdeabcd')}],
+                   [{'_id': 'abcdeabcdeabcdeabcdeabcd'}])
+
+    def test_schema(self):
+        self.check('d > "2012-01-01"', [{'d': datetime(2013, 1, 1)}], [{'d': datetime(2011, 1, 1)}],
+                   schema={'d': pql.DateTimeField()})
+
+    def test_filter(self):
+        documents = iter([{'a': 1}, {'a': 2}, {'a': 3}])
+        self.assertEqual(list(pql.compile_predicate('a > 1').filter(documents)), [{'a': 2}, {'a': 3}])
+
+    def test_unsupported(self):
+        with self.assertRaises(pql.ParseError):
+            pql.compile_predicate('location == near([1, 2], 10)')
+        with self.assertRaises(pql.ParseError):
+            pql.compile_predicate('a == mod(0, 1)')
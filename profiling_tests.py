@@ -0,0 +1,86 @@
+import threading
+from unittest import TestCase
+import pql
+from pql import profiling
+
+SCHEMA = {'_id': pql.IdField(), 'made_on': pql.DateTimeField(), 'price': pql.IntField()}
+
+class PqlProfilingTestCase(TestCase):
+
+    def test_phases(self):
+        with profiling.profile() as records:
+            pql.find('_id == id("5f0000000000000000000000") and made_on > date("2020-1-1")',
+                     schema=SCHEMA, cache=None, optimize=True, output='bytes')
+        record, = records
+        self.assertEqual(record.kind, 'find')
+        self.assertEqual(sorted(record.phases),
+                         ['dates', 'encode', 'ids', 'optimize', 'parse', 'schema', 'translate'])
+        self.assertTrue(all(seconds >= 0 for seconds in record.phases.values()))
+        self.assertLessEqual(record.phases['translate'], record.seconds)
+        self.assertEqual(record.nodes, 18)
+        self.assertEqual(record.size, len(pql.find('_id == id("5f0000000000000000000000") and '
+                                                   'made_on > date("2020-1-1")', schema=SCHEMA,
+                                                   optimize=True, output='bytes')))
+        self.assertFalse(record.cached)
+
+    def test_cached(self):
+        cache = pql.QueryCache()
+        with profiling.profile() as records:
+            pql.find('a > 1', cache=cache)
+            pql.find('a > 1', cache=cache)
+        self.assertEqual([record.cached for record in records], [False, True])
+        self.assertEqual(records[1].phases, {})
+        self.assertEqual(records[1].size, records[0].size)
+
+    def test_iterative(self):
+        with profiling.profile() as records:
+            pql.find('a == 1 or b == date("2020-1-1")', cache=None, iterative=True)
+            pql.find('a == 1 or b == date("2020-1-1")', cache=None)
+            pql.find(' or '.join(['not a == 1'] * pql.iterative.SHALLOW), cache=None, iterative=True)
+        self.assertEqual(sorted(records[0].phases), ['dates', 'parse', 'translate'])
+        self.assertEqual(records[0].nodes, records[1].nodes) # shallow, translated recursively
+        self.assertEqual(records[2].nodes, 5 * pql.iterative.SHALLOW) # the comparisons' nodes
+
+    def test_pipeline_helpers(self):
+        with profiling.profile() as records:
+            pql.match('price > 1', schema=SCHEMA) | pql.project(total='price * 2')
+        self.assertEqual([(record.kind, record.expression) for record in records],
+                         [('find', 'price > 1'), ('AggregationParser', 'price * 2')])
+
+    def test_errors(self):
+        with profiling.profile() as records:
+            with self.assertRaises(pql.ParseError):
+                pql.find('missing == 1', schema=SCHEMA, cache=None)
+        self.assertIsInstance(records[0].error, pql.ParseError)
+        self.assertIsNone(records[0].size)
+
+    def test_subscribe(self):
+        records = []
+        profiling.subscribe(records.append)
+        try:
+            thread = threading.Thread(target=pql.find, args=('a == 1',), kwargs={'cache': None})
+            thread.start()
+            thread.join()
+        finally:
+            profiling.unsubscribe(records.append)
+        pql.find('b == 1', cache=None)
+        self.assertEqual([record.expression for record in records], ['a == 1'])
+
+    def test_other_threads(self):
+        enabled = []
+        with profiling.profile() as records:
+            thread = threading.Thread(target=lambda: enabled.append(profiling.enabled()) or pql.find('b == 1', cache=None))
+            thread.start()
+            thread.join()
+            self.assertTrue(profiling.enabled())
+        self.assertEqual(enabled, [False]) # the thread isn't profiling
+        self.assertEqual(records, [])
+
+    def test_disabled(self):
+        self.assertEqual(profiling.active, 0)
+        plain = pql.matching.parse_date, pql.matching.IdField.coerce
+        with profiling.profile():
+            self.assertEqual(profiling.active, 1)
+            self.assertNotEqual((pql.matching.parse_date, pql.matching.IdField.coerce), plain)
+        self.assertEqual(profiling.active, 0)
+        self.assertEqual((pql.matching.parse_date, pql.matching.IdField.coerce), plain) # no hooks left
@@ -0,0 +1,70 @@
+import itertools
+from unittest import TestCase
+import bson
+import pql
+
+INDEXED = ['model', 'price']
+
+class PqlPushdownTestCase(TestCase):
+
+    def split(self, expression, **kwargs):
+        split = pql.split(expression, INDEXED, **kwargs)
+        return split.query, None if split.residual is None else split.residual.query
+
+    def test_costly_predicates_stay_local(self):
+        self.assertEqual(self.split('model == "kia" and name == regex("son")'),
+                         ({'model': 'kia'}, {'name': {'$regex': 'son'}}))
+        self.assertEqual(self.split('price > 3 and color != "red" and tags not in ["x"]'),
+                         ({'price': {'$gt': 3}}, {'color': {'$ne': 'red'}, 'tags': {'$nin': ['x']}}))
+        self.assertEqual(self.split('model == regex("^ki") and name == regex("^x", "i")'),
+                         ({'model': {'$regex': '^ki'}}, {'name': {'$regex': '^x', '$options': 'i'}}))
+
+    def test_cheap_predicates_are_sent(self):
+        self.assertEqual(self.split('model == "kia" and year > 2000'),
+                         ({'$and': [{'model': 'kia'}, {'year': {'$gt': 2000}}]}, None))
+        self.assertEqual(self.split('year > 2000 and not name == regex("x")'),
+                         ({'year': {'$gt': 2000}}, {'name': {'$not': {'$regex': 'x'}}}))
+
+    def test_operators_of_a_field(self):
+        self.assertEqual(self.split('price > 3 and price != 5'), ({'price': {'$gt': 3}}, {'price': {'$ne': 5}}))
+
+    def test_cost_knob(self):
+        expression = 'model == "kia" and year > 2000 and name != "x"'
+        self.assertEqual(self.split(expression, max_cost=1), ({'model': 'kia'}, {'year': {'$gt': 2000}, 'name': {'$ne': 'x'}}))
+        self.assertEqual(self.split(expression, max_cost=100), ({'$and': [{'model': 'kia'}, {'year': {'$gt': 2000}},
+                                                                          {'name': {'$ne': 'x'}}]}, None))
+
+    def test_or(self):
+        self.assertEqual(self.split('model == "kia" or price < 3'), ({'$or': [{'model': 'kia'}, {'price': {'$lt': 3}}]}, None))
+        self.assertEqual(self.split('(model == "kia" and name != "x") or price < 3'),
+                         ({'$or': [{'model': 'kia'}, {'price': {'$lt': 3}}]},
+                          {'$or': [{'$and': [{'model': 'kia'}, {'name': {'$ne': 'x'}}]}, {'price': {'$lt': 3}}]}))
+        self.assertEqual(self.split('model == "kia" or name != "x"'),
+                         ({}, {'$or': [{'model': 'kia'}, {'name': {'$ne': 'x'}}]}))
+
+    def test_unevaluable_operators_are_sent(self):
+        query, residual = self.split('location == near([1, 2], 10) and name != "x"')
+        self.assertEqual(query, {'location': bson.SON([('$near', [1, 2]), ('$maxDistance', 10)])})
+        self.assertEqual(residual, {'name': {'$ne': 'x'}})
+        self.assertEqual(self.split('location == near([1, 2]) or name != "x"'),
+                         ({'$or': [{'location': {'$near': [1, 2]}}, {'name': {'$ne': 'x'}}]}, None))
+
+    def test_filter(self):
+        split = pql.split('model == "kia" and name == regex("son")', INDEXED)
+        documents = [{'model': 'kia', 'name': 'jason'}, {'model': 'kia', 'name': 'kim'}]
+        self.assertEqual(list(split.filter(documents)), documents[:1])
+        self.assertEqual(list(pql.split('model == "kia"', INDEXED).filter(documents)), documents)
+
+    def test_equivalence(self):
+        documents = [{'model': model, 'price': price, 'name': name}
+                     for model, price, name in itertools.product(['kia', 'fiat'], [1, 4, 8], ['jason', 'kim', None])]
+        for expression in ['model == "kia" and name != "kim"',
+                           '(model == "kia" and name == regex("so")) or (price > 3 and name != None)',
+                           'not (price > 3) and (name == regex("^j") or model != "fiat")',
+                           'price > 3 and price != 8 or (model == "fiat" and name not in ["kim"])']:
+            original = pql.compile_predicate(expression)
+            for max_cost in [0, 1, pql.pushdown.MAX_COST, 100]:
+                split = pql.split(expression, INDEXED, max_cost=max_cost)
+                sent = pql.Predicate(split.query)
+                self.assertEqual(list(split.filter(sent.filter(documents))), list(original.filter(documents)),
+                                 (expression, max_cost))
@@ -0,0 +1,136 @@
+import datetime
+import pickle
+from unittest import TestCase
+import bson
+import pql
+
+class PqlSchemaTestCase(TestCase):
+
+    def setUp(self):
+        self.schema = pql.Schema({'model': pql.StringField(),
+                                  'owner': {'name': pql.StringField(), 'born': pql.DateTimeField()},
+                                  'tags': [pql.StringField()],
+                                  'wheels': [{'size': pql.IntField()}],
+                                  'specs': {'*': pql.IntField()},
+                                  'scores': pql.DictField(pql.IntField()),
+                                  'ids': pql.ListField(pql.IdField()),
+                                  'a.b.c': pql.IntField()})
+
+    def find(self, expression):
+        return pql.find(expression, schema=self.schema, cache=None)
+
+    def assert_not_found(self, expression, message, options):
+        with self.assertRaises(pql.ParseError) as context:
+            self.find(expression)
+        self.assertEqual(context.exception.message, message)
+        self.assertEqual(context.exception.options, options)
+
+    def test_nested(self):
+        self.assertEqual(self.find('owner.name == "alon" and owner.born > date("2000-1-1")'),
+                         {'$and': [{'owner.name': 'alon'}, {'owner.born': {'$gt': datetime.datetime(2000, 1, 1)}}]})
+        self.assertEqual(self.find('owner == {"name": "alon"}'), {'owner': {'name': 'alon'}})
+
+    def test_flat(self):
+        self.assertEqual(self.find('a.b.c == 1'), {'a.b.c': 1})
+        self.assert_not_found('a.b == 1', 'Field not found: a.b.', ['a.b.c'])
+
+    def test_arrays(self):
+        self.assertEqual(self.find('wheels.size > 16'), {'wheels.size': {'$gt': 16}})
+        self.assertEqual(self.find('"wheels.0.size" == 16'), {'wheels.0.size': 16})
+        self.assertEqual(self.find('"tags.0" == "x"'), {'tags.0': 'x'})
+        self.assertEqual(self.find('tags == ["x"]'), {'tags': ['x']})
+        self.assertEqual(self.find('"ids.2" == id("5f0000000000000000000000")'),
+                         {'ids.2': bson.ObjectId('5f0000000000000000000000')})
+        with self.assertRaises(pql.ParseError):
+            self.find('wheels.size == "x"')
+
+    def test_wildcards(self):
+        self.assertEqual(self.find('specs.hp > 100 and scores.math == 3'),
+                         {'$and': [{'specs.hp': {'$gt': 100}}, {'scores.math': 3}]})
+        with self.assertRaises(pql.ParseError):
+            self.find('specs.hp == "x"')
+
+    def test_not_found_lists_siblings(self):
+        self.assert_not_found('owner.nmae == 1', 'Field not found: owner.nmae.', ['owner.born', 'owner.name'])
+        self.assert_not_found('wheels.diameter == 1', 'Field not found: wheels.diameter.', ['wheels.size'])
+        self.assert_not_found('color == 1', 'Field not found: color.',
+                              ['a', 'ids', 'model', 'owner', 'scores', 'specs', 'tags', 'wheels'])
+
+    def test_introspection(self):
+        self.assertEqual(self.schema.children('owner'), ['owner.born', 'owner.name'])
+        self.assertEqual(self.schema.operators('tags'), ['==', 'in', '!=', 'not in'])
+        self.assertEqual(self.schema.functions('model'), ['exists', 'regex', 'type'])
+        self.assertIsInstance(self.schema.lookup('wheels.3.size'), pql.IntField)
+
+    def test_shared(self):
+        self.assertEqual(pql.prepare('model == :model', schema=self.schema).bind(model='kia'), {'model': 'kia'})
+        schema = pickle.loads(pickle.dumps(self.schema))
+        self.assertEqual(pql.find('wheels.size == 1', schema=schema), {'wheels.size': 1})
+
+    def test_invalid_definitions(self):
+        with self.assertRaises(TypeError):
+            pql.Schema({'a': 1})
+        with self.assertRaises(ValueError):
+            pql.Schema({'a': [pql.IntField(), pql.StringField()]})
+
+class PqlSchemaClassesTestCase(TestCase):
+
+    def test_declarative(self):
+        class Car(object):
+            model = pql.StringField()
+            tags = [pql.StringField()]
+            class owner:
+                name = pql.StringField()
+            def price(self): # not a field
+                pass
+        class Truck(Car):
+            axles = pql.IntField()
+        schema = pql.Schema(Truck)
+        self.assertEqual(schema.children(), ['axles', 'model', 'owner', 'tags'])
+        self.assertEqual(pql.find('owner.name == "x" and axles > 2', schema=schema),
+                         {'$and': [{'owner.name': 'x'}, {'axles': {'$gt': 2}}]})
+
+    def test_mongokit(self):
+        class Car(object):
+            structure = {'model': str,
+                         'made_on': datetime.datetime,
+                         'owner': {'name': str, 'age': int},
+                         'tags': [str],
+                         'prices': {str: float},
+                         'extra': dict}
+        schema = pql.Schema(Car)
+        self.assertEqual(pql.find('owner.age > 1 and prices.eur < 3.5 and made_on > date("2000-1-1")', schema=schema),
+                         {'$and': [{'owner.age': {'$gt': 1}}, {'prices.eur': {'$lt': 3.5}},
+                                   {'made_on': {'$gt': datetime.datetime(2000, 1, 1)}}]})
+        self.assertIsInstance(schema.lookup('tags'), pql.ListField)
+        self.assertIsInstance(schema.lookup('extra'), pql.DictField)
+
+    def test_mongoengine(self):
+        # stand-ins for mongoengine's classes: fields are recognized by their class names
+        class BaseField(object):
+            def __init__(self, db_field=None, field=None, document_type=None):
+                self.db_field = db_field
+                self.field = field
+                self.document_type = document_type
+        class StringField(BaseField): pass
+        class EmailField(StringField): pass
+        class IntField(BaseField): pass
+        class ObjectIdField(BaseField): pass
+        class ListField(BaseField): pass
+        class EmbeddedDocumentField(BaseField): pass
+        class UnknownField(BaseField): pass
+        class Address(object):
+            _fields = {'city': StringField()}
+        class Person(object):
+            _fields = {'id': ObjectIdField(db_field='_id'),
+                       'email': EmailField(),
+                       'age': IntField(db_field='a'),
+                       'addresses': ListField(field=EmbeddedDocumentField(document_type=Address)),
+                       'other': UnknownField()}
+        Person._fields['friend'] = EmbeddedDocumentField(document_type=Person)
+        schema = pql.Schema(Person)
+        self.assertEqual(schema.children(), ['_id', 'a', 'addresses', 'email', 'friend', 'other'])
+        self.assertEqual(pql.find('a > 1 and addresses.city == "x" and email == regex("@")', schema=schema),
+                         {'$and': [{'a': {'$gt': 1}}, {'addresses.city': 'x'}, {'email': {'$regex': '@'}}]})
+        self.assertIsInstance(schema.lookup('_id'), pql.IdField)
+        self.assertIsInstance(schema.lookup('friend'), pql.DictField) # recursive documents stop
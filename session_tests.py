@@ -0,0 +1,89 @@
+import os
+import timeit
+from unittest import TestCase
+import pql
+
+# microseconds per completion, generous enough for slow machines
+AUTOCOMPLETE_BUDGET = int(os.environ.get('PQL_AUTOCOMPLETE_BUDGET', 1000))
+
+SCHEMA = {'model': pql.StringField(),
+          'price': pql.IntField(),
+          'produced_on': pql.DateTimeField(),
+          'owner': {'name': pql.StringField(), 'vip': pql.BoolField()}}
+
+class PqlSessionTestCase(TestCase):
+
+    def setUp(self):
+        self.session = pql.Session(SCHEMA)
+
+    def test_translate(self):
+        self.assertEqual(self.session.translate('model == "kia" and price > 3'),
+                         {'$and': [{'model': 'kia'}, {'price': {'$gt': 3}}]})
+        self.assertEqual(self.session.translate('model == "kia" and (price > 30 or owner.vip == True)'),
+                         {'$and': [{'model': 'kia'}, {'$or': [{'price': {'$gt': 30}}, {'owner.vip': True}]}]})
+        self.assertEqual(list(self.session._memo),
+                         ['price > 3', 'model == "kia"', 'price > 30', 'owner.vip == True']) # least recently used first
+
+    def test_results_are_copies(self):
+        self.session.translate('price > 3')['price']['$gt'] = 4
+        self.assertEqual(self.session.translate('price > 3'), {'price': {'$gt': 3}})
+
+    def test_errors(self):
+        with self.assertRaises(pql.ParseError) as context:
+            self.session.translate('model == "kia" and price > "x"')
+        self.assertEqual(context.exception.col_offset, 27)
+        with self.assertRaises(pql.ParseError):
+            self.session.translate('model == "kia" and')
+        self.assertEqual(list(self.session._memo), [])
+
+    def test_maxsize(self):
+        session = pql.Session(maxsize=2)
+        for i in range(5):
+            session.translate('a == {0}'.format(i))
+        self.assertEqual(list(session._memo), ['a == 3', 'a == 4'])
+        session.translate('a == 3 or b == 1') # a hit keeps a == 3
+        self.assertEqual(list(session._memo), ['a == 3', 'b == 1'])
+
+class PqlAutocompleteTestCase(TestCase):
+
+    def setUp(self):
+        self.session = pql.Session(SCHEMA)
+
+    def complete(self, expression, cursor=None):
+        return tuple(self.session.autocomplete(expression, cursor))
+
+    def test_fields(self):
+        self.assertEqual(self.complete('pr'), ('field', 0, ['price', 'produced_on']))
+        self.assertEqual(self.complete('model == "kia" and (not own'), ('field', 24, ['owner']))
+        self.assertEqual(self.complete('owner.'), ('field', 0, ['owner.name', 'owner.vip']))
+        self.assertEqual(self.complete('pr > 1', cursor=2), ('field', 0, ['price', 'produced_on']))
+
+    def test_operators(self):
+        self.assertEqual(self.complete('owner.vip '), ('operator', 10, ['==', 'in', '!=', 'not in']))
+        self.assertEqual(self.complete('price >'), ('operator', 6, ['>', '>=']))
+        self.assertEqual(self.complete('price not i'), ('operator', 10, ['in']))
+        self.assertEqual(self.complete('color '), ('operator', 6, []))
+
+    def test_values(self):
+        self.assertEqual(self.complete('model == r'), ('value', 9, ['regex']))
+        self.assertEqual(self.complete('owner.vip == T'), ('value', 13, ['True']))
+        self.assertEqual(self.complete('model == "r'), ('value', 11, []))
+        self.assertEqual(self.complete('model in ["kia", '), ('value', 17, []))
+
+    def test_keywords(self):
+        self.assertEqual(self.complete('model == regex("^k") '), ('keyword', 21, ['and', 'or']))
+        self.assertEqual(self.complete('(price > 1) o'), ('keyword', 12, ['or']))
+
+    def test_schema_free(self):
+        self.assertEqual(pql.autocomplete('a '), pql.Completion('operator', 2, pql.IntField().get_operators()))
+        self.assertEqual(pql.autocomplete('a'), pql.Completion('field', 0, []))
+
+    def test_large_schema(self):
+        schema = pql.Schema(dict(('field{0}'.format(i), pql.IntField()) for i in range(10000)))
+        session = pql.Session(schema)
+        self.assertEqual(session.autocomplete('field999').options, ['field999', 'field9990', 'field9991', 'field9992',
+                                                                    'field9993', 'field9994', 'field9995', 'field9996',
+                                                                    'field9997', 'field9998', 'field9999'])
+        for expression in ['field12', 'field1 == 1 and field99', 'field1 > 2 or field5000 ']:
+            seconds = min(timeit.repeat(lambda: session.autocomplete(expression), number=100, repeat=3)) / 100
+            self.assertLess(seconds * 1e6, AUTOCOMPLETE_BUDGET, expression)
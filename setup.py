@@ -1,6 +1,9 @@
+import os
+import re
 from setuptools import setup
 
-__version__ = '0.5.0'
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pql', '__init__.py')) as init:
+    __version__ = re.search(r"^__version__ = '(.*)'$", init.read(), re.M).group(1)
 
 setup(name='pql',
       version=__version__,
@@ -19,4 +22,5 @@ setup(name='pql',
       # require the bson.ObjectId type, It's safe to assume it won't change (famous last words)
       install_requires=['pymongo',
                         'python-dateutil'],
+      extras_require={'numpy': ['numpy']},
       packages=['pql'])
\ No newline at end of file
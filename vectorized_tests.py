@@ -0,0 +1,80 @@
+from datetime import datetime
+from unittest import TestCase, skipIf
+import pql
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+@skipIf(numpy is None, 'numpy is not installed')
+class PqlVectorizedTestCase(TestCase):
+
+    def setUp(self):
+        self.columns = {'price': numpy.array([3, 5, 4, 7]),
+                        'model': numpy.array(['fiat', 'subaru', 'kia', None], dtype=object),
+                        'rating': numpy.array([1.5, numpy.nan, 2.5, 4.0]),
+                        'made_on': numpy.array([datetime(1971, 4, 7), datetime(1980, 10, 19),
+                                                datetime(1983, 2, 27), datetime(1988, 1, 23, 13, 14, 15)],
+                                               dtype='datetime64[ms]')}
+
+    def compare(self, expression, expected):
+        self.assertEqual(pql.mask(expression, self.columns).tolist(), expected)
+
+    def test_comparisons(self):
+        self.compare('price > 3', [False, True, True, True])
+        self.compare('price == 4', [False, False, True, False])
+        self.compare('rating <= 2.5', [True, False, True, False])
+        self.compare('model != "kia"', [True, True, False, True])
+
+    def test_in(self):
+        self.compare('model in ["kia", "fiat"]', [True, False, True, False])
+        self.compare('price not in [3, 7]', [False, True, True, False])
+        self.compare('model in ["kia", None]', [False, False, True, True])
+
+    def test_type_brackets(self):
+        self.compare('price in ["3", 3]', [True, False, False, False])
+        self.compare('price > "a"', [False, False, False, False])
+        self.compare('model > 3', [False, False, False, False])
+        self.compare('model > "g"', [False, True, True, False])
+        self.compare('price == "3"', [False, False, False, False])
+        self.assertEqual(pql.mask('flag in [1, True]', {'flag': numpy.array([1, True, '1'], dtype=object)}).tolist(),
+                         [True, True, False])
+
+    def test_boolean_logic(self):
+        self.compare('price > 3 and not rating > 3', [False, True, True, False])
+        self.compare('price == 3 or model == "kia"', [True, False, True, False])
+
+    def test_exists(self):
+        self.compare('rating == exists(True)', [True, False, True, True])
+        self.compare('model == None', [False, False, False, True])
+        self.compare('missing == exists(False)', [True, True, True, True])
+
+    def test_mod_and_regex(self):
+        self.compare('price == mod(2, 1)', [True, True, False, True])
+        self.compare('model == regex("^s|K", "i")', [False, True, True, False])
+
+    def test_mod_zero_divisor(self):
+        with self.assertRaises(pql.ParseError):
+            pql.mask('price == mod(0, 1)', self.columns)
+
+    def test_dates(self):
+        self.compare('made_on > date("1980-01-01")', [False, True, True, True])
+
+    def test_unsupported(self):
+        with self.assertRaises(pql.ParseError):
+            pql.mask('price == size(2)', self.columns)
+
+    def test_evaluate(self):
+        self.assertEqual(pql.evaluate('price * 2 + 1', self.columns).tolist(), [7, 11, 9, 15])
+        self.assertEqual(pql.evaluate('price if price > 4 else 0', self.columns).tolist(), [0, 5, 0, 7])
+        self.assertEqual(pql.evaluate('year(made_on)', self.columns).tolist(), [1971, 1980, 1983, 1988])
+        self.assertEqual(pql.evaluate('month(made_on)', self.columns).tolist(), [4, 10, 2, 1])
+        self.assertEqual(pql.evaluate('dayOfMonth(made_on)', self.columns).tolist(), [7, 19, 27, 23])
+        self.assertEqual(pql.evaluate('dayOfWeek(made_on)', self.columns).tolist(), [4, 1, 1, 7])
+        self.assertEqual(pql.evaluate('hour(made_on)', self.columns).tolist(), [0, 0, 0, 13])
+        self.assertEqual(pql.evaluate('second(made_on)', self.columns).tolist(), [0, 0, 0, 15])
+        self.assertEqual(pql.evaluate('ifnull(rating, 0)', self.columns).tolist(), [1.5, 0, 2.5, 4.0])
+        self.assertEqual(pql.evaluate('toUpper(model)', {'model': numpy.array(['a', 'b'])}).tolist(), ['A', 'B'])
+        with self.assertRaises(pql.ParseError):
+            pql.evaluate('foo + 1', self.columns)